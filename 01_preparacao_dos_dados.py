@@ -2,65 +2,62 @@
 # Bloco 01: Configuração Inicial e Carregamento dos Dados
 # ==============================================================================
 
-# 1. Importando a biblioteca essencial para manipulação de dados
-import pandas as pd
-
-print("--- Iniciando o script de análise de vendas ---")
-
-# 2. Definindo os caminhos para os arquivos dentro da pasta 'data'
-# Usamos caminhos relativos, que funcionam em qualquer computador
-# desde que a estrutura de pastas seja mantida.
-caminho_treino = 'data/train.csv'
-caminho_lojas = 'data/stores.csv'
-caminho_features = 'data/features.csv'
-
-# 3. Carregando os três dataframes em memória
-# O bloco try-except é uma boa prática para garantir que os arquivos existem
-# antes de tentar lê-los.
-try:
-    df_train = pd.read_csv(caminho_treino)
-    df_stores = pd.read_csv(caminho_lojas)
-    df_features = pd.read_csv(caminho_features)
-
-    print("✅ Arquivos carregados com sucesso!")
-    print(f"   - df_train: {df_train.shape[0]} linhas, {df_train.shape[1]} colunas")
-    print(f"   - df_stores: {df_stores.shape[0]} linhas, {df_stores.shape[1]} colunas")
-    print(f"   - df_features: {df_features.shape[0]} linhas, {df_features.shape[1]} colunas")
+# As etapas da preparação (carregar -> imputar -> unir -> datas -> one_hot) estão
+# em pipeline_preparacao.py, como funções importáveis e com cache em disco.
+# Este script é apenas a linha de comando: por padrão roda só o caminho de
+# produção; a análise exploratória (prints e gráficos) é opcional, com --eda.
+#
+# Exemplos:
+#     python 01_preparacao_dos_dados.py                 # produção (com cache)
+#     python 01_preparacao_dos_dados.py --eda           # também mostra a EDA
+#     python 01_preparacao_dos_dados.py --incremental   # só partições novas
+#     python 01_preparacao_dos_dados.py --lotes 500000  # histórico maior que a memória
+#     python 01_preparacao_dos_dados.py --features-vendas  # + lags e médias móveis por série
+#     python 01_preparacao_dos_dados.py --por-loja --n-processos 8  # lojas em paralelo
+#     python 01_preparacao_dos_dados.py --perfil        # + cProfile da execução inteira
+#
+# Toda execução grava um relatório com o tempo, a CPU, o pico de memória e as
+# linhas de cada etapa em relatorios_execucao/preparacao_<data>.json.
 
-except FileNotFoundError as e:
-    print(f"❌ ERRO: Arquivo não encontrado. Verifique o caminho e a estrutura de pastas.")
-    print(f"   Detalhe do erro: {e}")
-    # Encerra o script se os arquivos não forem encontrados
-    exit()
-
-# 4. Inspeção inicial do dataframe principal (df_train)
-# Isso confirma que os dados foram carregados corretamente e nos dá uma visão inicial.
-print("\n--- Informações sobre os Dados de Treino (df_train) ---")
-df_train.info()
-
-print("\n--- 5 Primeiras Linhas dos Dados de Treino (df_train) ---")
-print(df_train.head())
+# 1. Importando a biblioteca essencial para manipulação de dados
+import argparse
+from esquema_dados import (
+    CAMINHO_INDICE_LOJAS, CAMINHO_PARQUET_WALMART, CAMINHO_PARTICIONADO_WALMART, CAMINHO_POR_LOJA_WALMART,
+    PASTA_AGREGADOS_WALMART, registrar_dados_processados, relatorio_memoria, salvar_agregados,
+    salvar_dados_processados,
+)
+from pipeline_preparacao import (
+    CAMINHO_FEATURES, CAMINHO_HISTORICO_VENDAS, CAMINHO_LOJAS, CAMINHO_TREINO, COLUNAS_MARKDOWN,
+    calcular_agregados, carregar_dados_brutos, executar_pipeline, preparar_em_lotes, preparar_incremental,
+    preparar_por_loja,
+)
+from indice_lojas import gerar_indice_lojas, salvar_indice_lojas
+from instrumentacao import RelatorioExecucao
+from features_vendas import adicionar_features_vendas, salvar_historico_vendas
 
 
 # ==============================================================================
 # Bloco 02: Análise Exploratória de Dados (EDA) - Perfil Inicial
 # ==============================================================================
 
-# Apenas para garantir que esta seção só rode se o Bloco 1 foi bem-sucedido.
-if 'df_train' in locals():
+def analise_exploratoria(df_train, df_stores, df_features):
+    """Mostra o perfil inicial dos dados: dimensões, período e dados faltantes."""
     print("\n\n--- INICIANDO ANÁLISE EXPLORATÓRIA ---")
 
+    # Inspeção inicial do dataframe principal (df_train)
+    print("\n--- Informações sobre os Dados de Treino (df_train) ---")
+    df_train.info()
+
+    print("\n--- 5 Primeiras Linhas dos Dados de Treino (df_train) ---")
+    print(df_train.head())
+
     # Pergunta 1: Quantas lojas e departamentos únicos existem no conjunto de treino?
     num_lojas = df_train['Store'].nunique()
     num_deptos = df_train['Dept'].nunique()
     print(f"\n[INFO] O dataset de treino contém dados de {num_lojas} lojas e {num_deptos} departamentos distintos.")
 
     # Pergunta 2: Qual o período que os dados de treino cobrem?
-    # Para isso, primeiro garantimos que a coluna 'Date' seja do tipo 'datetime' para podermos
-    # fazer cálculos e extrair informações de data facilmente.
-    df_train['Date'] = pd.to_datetime(df_train['Date'])
-    df_features['Date'] = pd.to_datetime(df_features['Date'])
-
+    # A coluna 'Date' já é carregada como 'datetime' pelo pipeline.
     data_inicio = df_train['Date'].min()
     data_fim = df_train['Date'].max()
     print(f"[INFO] O período de análise vai de {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}.")
@@ -68,10 +65,10 @@ if 'df_train' in locals():
     # Pergunta 3: Existem dados faltantes (nulos) em algum dos nossos dataframes?
     # Esta é uma das verificações mais importantes da EDA.
     print("\n--- Verificação de Dados Faltantes (Nulos) ---")
-    
+
     print("\n[ANALYSIS] Dados de Treino (df_train):")
     print(df_train.isnull().sum())
-    
+
     print("\n[ANALYSIS] Dados das Lojas (df_stores):")
     print(df_stores.isnull().sum())
 
@@ -83,43 +80,33 @@ if 'df_train' in locals():
     print("\nPercentual de dados faltantes em df_features:")
     print(percentual_nulos[percentual_nulos > 0].round(2))
 
-else:
-    print("\n❌ ERRO: Dataframes não foram carregados. Execute o Bloco 01 primeiro.")
-
 
 # =============================================================================================
 # Bloco 2.5: Investigação Profunda - A Origem dos Nulos em 'MarkDown'
 # =============================================================================================
 
-# Para a visualização, vamos precisar da biblioteca matplotlib
-import matplotlib.pyplot as plt
+def investigar_markdowns(df_features):
+    """Mostra quando cada MarkDown aparece pela primeira vez e plota a evolução no tempo."""
+    # Para a visualização, vamos precisar da biblioteca matplotlib (só no modo EDA)
+    import matplotlib.pyplot as plt
 
-if 'df_features' in locals():
     print("\n\n--- INVESTIGAÇÃO: PRIMEIRA APARIÇÃO DOS MARKDOWNS ---")
 
     # Para cada coluna MarkDown, encontramos a data mínima onde o valor NÃO é nulo
-    data_md1 = df_features[df_features['MarkDown1'].notnull()]['Date'].min()
-    data_md2 = df_features[df_features['MarkDown2'].notnull()]['Date'].min()
-    data_md3 = df_features[df_features['MarkDown3'].notnull()]['Date'].min()
-    data_md4 = df_features[df_features['MarkDown4'].notnull()]['Date'].min()
-    data_md5 = df_features[df_features['MarkDown5'].notnull()]['Date'].min()
-
-    print(f"\n[EVIDÊNCIA] Primeira data com valor para MarkDown1: {data_md1.strftime('%d/%m/%Y')}")
-    print(f"[EVIDÊNCIA] Primeira data com valor para MarkDown2: {data_md2.strftime('%d/%m/%Y')}")
-    print(f"[EVIDÊNCIA] Primeira data com valor para MarkDown3: {data_md3.strftime('%d/%m/%Y')}")
-    print(f"[EVIDÊNCIA] Primeira data com valor para MarkDown4: {data_md4.strftime('%d/%m/%Y')}")
-    print(f"[EVIDÊNCIA] Primeira data com valor para MarkDown5: {data_md5.strftime('%d/%m/%Y')}")
+    for coluna in COLUNAS_MARKDOWN:
+        primeira_data = df_features[df_features[coluna].notnull()]['Date'].min()
+        print(f"[EVIDÊNCIA] Primeira data com valor para {coluna}: {primeira_data.strftime('%d/%m/%Y')}")
 
     print("\n--- VISUALIZANDO A INTRODUÇÃO DOS MARKDOWNS AO LONGO DO TEMPO ---")
-    
+
     # Vamos contar, para cada semana, quantas entradas de MarkDown não nulas existem
     df_features_plot = df_features.copy()
     # Cria uma coluna que soma quantos MarkDowns não são nulos naquela linha (pode ir de 0 a 5)
-    df_features_plot['Markdown_Count'] = df_features_plot[['MarkDown1','MarkDown2','MarkDown3','MarkDown4','MarkDown5']].notnull().sum(axis=1)
-    
+    df_features_plot['Markdown_Count'] = df_features_plot[COLUNAS_MARKDOWN].notnull().sum(axis=1)
+
     # Agrupa por data e soma a contagem de markdowns disponíveis
     markdown_over_time = df_features_plot.groupby('Date')['Markdown_Count'].sum()
-    
+
     # Plotando o gráfico
     plt.figure(figsize=(15, 6))
     markdown_over_time.plot(kind='line')
@@ -129,179 +116,170 @@ if 'df_features' in locals():
     plt.grid(True)
     plt.show()
 
-else:
-    print("\n❌ ERRO: Dataframe df_features não foi carregado.")
-
 
 # ==============================================================================
-# Bloco 03: Pré-processamento - Tratamento de Dados Faltantes em df_features
+# Blocos 03 a 06: Imputação, Merge, Features de Data e One-Hot Encoding
 # ==============================================================================
 
-if 'df_features' in locals():
-    print("\n\n--- INICIANDO LIMPEZA DE DADOS FALTANTES (df_features) ---")
-
-    # É uma boa prática criar uma cópia para não alterar o dataframe original
-    df_features_tratado = df_features.copy()
-
-    # Estratégia 1: Preencher MarkDowns com 0
-    colunas_markdown = ['MarkDown1', 'MarkDown2', 'MarkDown3', 'MarkDown4', 'MarkDown5']
-    df_features_tratado[colunas_markdown] = df_features_tratado[colunas_markdown].fillna(0)
-    print("\n[OK] Dados faltantes de 'MarkDown' preenchidos com 0.")
-
-    # Estratégia 2: Preencher CPI e Unemployment com a mediana da loja
-    # Usamos groupby('Store') e transform('median') para calcular a mediana por loja
-    # e alinhar os resultados para o preenchimento.
-    df_features_tratado['CPI'] = df_features_tratado['CPI'].fillna(
-        df_features_tratado.groupby('Store')['CPI'].transform('median')
-    )
-    df_features_tratado['Unemployment'] = df_features_tratado['Unemployment'].fillna(
-        df_features_tratado.groupby('Store')['Unemployment'].transform('median')
-    )
-    print("[OK] Dados faltantes de 'CPI' e 'Unemployment' preenchidos com a mediana da respectiva loja.")
-
-    # Verificação Final: Checando se ainda existem nulos no dataframe tratado
-    print("\n--- Verificação Final de Nulos em df_features_tratado ---")
-    nulos_restantes = df_features_tratado.isnull().sum()
-    print(nulos_restantes[nulos_restantes > 0])
-    
+# As regras continuam as mesmas (MarkDowns com 0, CPI/Unemployment com a mediana
+# da loja, inner join por Store e por Store+Date, Ano/Mes/Dia/Semana_do_Ano e
+# Type -> Type_A/B/C) e estão implementadas em pipeline_preparacao.py.
+
+def verificar_dataframe_processado(df_processed, detalhado=False):
+    """Confere se ainda há nulos no resultado e, no modo EDA, mostra sua estrutura."""
+    nulos_restantes = df_processed.isnull().sum()
     if nulos_restantes.sum() == 0:
-        print("\n✅ Sucesso! Não há mais dados faltantes em df_features_tratado.")
+        print("✅ Sucesso! Não há dados faltantes no dataframe processado.")
     else:
-        print("\n⚠️ Atenção! Ainda restam dados faltantes a serem tratados.")
-
-else:
-    print("\n❌ ERRO: Dataframe df_features não foi carregado.")
+        print("⚠️ Atenção! Ainda restam dados faltantes a serem tratados.")
+        print(nulos_restantes[nulos_restantes > 0])
 
+    if detalhado:
+        print("\n\n--- VERIFICAÇÃO FINAL DO DATAFRAME PROCESSADO ---")
+        df_processed.info()
 
-# ==============================================================================
-# Bloco 04: Pré-processamento - Unindo os Dataframes (Merge)
-# ==============================================================================
+        print("\n--- 5 Primeiras Linhas mostrando as novas colunas ---")
+        print(df_processed[['Store', 'Ano', 'Mes', 'Dia', 'Semana_do_Ano', 'Type_A', 'Type_B', 'Type_C']].head())
 
-# Verifica se os dataframes necessários existem antes de prosseguir
-if 'df_train' in locals() and 'df_stores' in locals() and 'df_features_tratado' in locals():
-    print("\n\n--- INICIANDO A UNIÃO DOS DATAFRAMES ---")
-
-    # Etapa 1: Unir df_train com df_stores
-    # A chave para a união é a coluna 'Store', presente em ambos.
-    # Usamos how='inner' para manter apenas as lojas que existem nos dois dataframes.
-    df_merged = pd.merge(df_train, df_stores, on='Store', how='inner')
-    print(f"\n[OK] Merge entre df_train e df_stores concluído.")
-    print(f"   - Shape antes do merge (df_train): {df_train.shape}")
-    print(f"   - Shape após o merge (df_merged):  {df_merged.shape}")
-
-
-    # Etapa 2: Unir o dataframe recém-criado com o df_features_tratado
-    # Agora, a chave da união é composta por 'Store' e 'Date', pois as features
-    # são específicas para uma loja em uma determinada semana.
-    # Note que IsHoliday existe em ambos os dataframes. O merge inteligentemente
-    # cria sufixos (_x, _y) para diferenciá-los. Vamos manter o do df_train.
-    df_final = pd.merge(df_merged, df_features_tratado, on=['Store', 'Date'], how='inner')
-    print(f"\n[OK] Merge final com df_features_tratado concluído.")
-    print(f"   - Shape antes do merge (df_merged):  {df_merged.shape}")
-    print(f"   - Shape do dataframe final (df_final): {df_final.shape}")
-
-    # Verificação Final: Vamos olhar como ficou nosso dataframe final
-    print("\n\n--- VERIFICAÇÃO DO DATAFRAME FINAL ---")
-    df_final.info()
-    
-    print("\n--- 5 Primeiras Linhas do Dataframe Final ---")
-    print(df_final.head())
-    
-    # A coluna IsHoliday ficou duplicada (IsHoliday_x, IsHoliday_y). Vamos remover a _y e renomear a _x.
-    if 'IsHoliday_y' in df_final.columns:
-        df_final = df_final.drop(columns=['IsHoliday_y'])
-        df_final = df_final.rename(columns={'IsHoliday_x': 'IsHoliday'})
-        print("\n[CLEANUP] Coluna 'IsHoliday' duplicada foi tratada.")
-
-else:
-    print("\n❌ ERRO: Um ou mais dataframes necessários para o merge não foram encontrados.")
 
 # ==============================================================================
-# Bloco 05: Engenharia de Features - Extração de Componentes de Data
+# Bloco 07: Execução e Salvamento do Dataframe Processado
 # ==============================================================================
 
-# Verifica se o dataframe final existe antes de prosseguir
-if 'df_final' in locals():
-    print("\n\n--- INICIANDO ENGENHARIA DE FEATURES ---")
-
-    # É uma boa prática criar uma cópia para esta nova fase
-    df_eng = df_final.copy()
-
-    # Extraindo componentes da coluna 'Date' para novas colunas
-    # O acesso a .dt permite usar propriedades de data/hora
-    df_eng['Ano'] = df_eng['Date'].dt.year
-    df_eng['Mes'] = df_eng['Date'].dt.month
-    df_eng['Dia'] = df_eng['Date'].dt.day
-    df_eng['Semana_do_Ano'] = df_eng['Date'].dt.isocalendar().week.astype(int)
-
-    print("[OK] Novas features de data criadas: Ano, Mes, Dia, Semana_do_Ano.")
-
-    # Vamos remover a coluna 'Date' original, pois já extraímos a informação
-    # necessária dela. Manter a data original pode confundir alguns modelos.
-    df_eng = df_eng.drop(columns=['Date'])
-    print("[OK] Coluna 'Date' original removida.")
-
-
-    # Verificação Final: Vamos olhar as novas colunas
-    print("\n\n--- VERIFICAÇÃO DO DATAFRAME APÓS ENGENHARIA DE FEATURES ---")
-    print(df_eng[['Ano', 'Mes', 'Dia', 'Semana_do_Ano']].head())
-    print(df_eng.head())
-
-else:
-    print("\n❌ ERRO: O dataframe df_final não foi encontrado. Execute os blocos anteriores.")
-
-# ================================================================================================
-# Bloco 06: Engenharia de Features - Tratamento de Variáveis Categóricas (One-Hot Encoding)
-# ================================================================================================
+def main():
+    print("--- Iniciando o script de análise de vendas ---")
+
+    # Opções de linha de comando. O resultado principal é sempre o Parquet;
+    # o CSV antigo só é gerado quando pedido explicitamente.
+    parser = argparse.ArgumentParser(description="Preparação dos dados de vendas do Walmart.")
+    parser.add_argument('--exportar-csv', action='store_true',
+                        help="Também salva uma cópia em CSV (walmart_dados_processados.csv).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Processa apenas as partições (Store, Date) novas ou alteradas.")
+    parser.add_argument('--treino', default=str(CAMINHO_TREINO),
+                        help="CSV de vendas a ser lido (ex.: um arquivo só com a semana nova).")
+    parser.add_argument('--eda', action='store_true',
+                        help="Executa também a análise exploratória (prints e gráficos).")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="Ignora o cache das etapas e recalcula tudo.")
+    parser.add_argument('--lotes', type=int, metavar='LINHAS',
+                        help="Lê train.csv em lotes deste tamanho e grava cada lote direto no Parquet.")
+    parser.add_argument('--features-vendas', action='store_true',
+                        help="Adiciona lags e médias/desvios móveis das vendas de cada (Store, Dept).")
+    parser.add_argument('--por-loja', action='store_true',
+                        help="Prepara cada loja em um processo e grava um arquivo por loja em data/walmart_por_loja.")
+    parser.add_argument('--n-processos', type=int, help="Processos do modo --por-loja (padrão: todos os núcleos).")
+    parser.add_argument('--perfil', action='store_true',
+                        help="Registra a execução com o cProfile (.prof ao lado do relatório JSON).")
+    args = parser.parse_args()
+    if args.lotes and args.features_vendas:
+        # Os lotes de train.csv não trazem as semanas anteriores de cada série
+        parser.error("--features-vendas não pode ser usado com --lotes.")
+    if args.por_loja and (args.lotes or args.incremental or args.exportar_csv):
+        parser.error("--por-loja não pode ser usado com --lotes, --incremental ou --exportar-csv.")
+
+    relatorio = RelatorioExecucao('preparacao', perfil=args.perfil)
+
+    def concluir():
+        caminho_relatorio = relatorio.salvar()
+        print(f"[INFO] Relatório da execução (tempo e memória por etapa) salvo em: {caminho_relatorio}")
+
+    try:
+        # Índice (Store, Date) -> features exógenas usado pelo simulador do app.
+        # É pequeno (uma linha por loja e semana) e é refeito em todos os modos.
+        with relatorio.etapa('indice_lojas'):
+            salvar_indice_lojas(gerar_indice_lojas(usar_medianas_salvas=args.incremental))
+        print(f"[OK] Índice de features por loja salvo em: {CAMINHO_INDICE_LOJAS}")
+
+        # Modo EDA (opcional): nunca roda no caminho de produção
+        if args.eda:
+            df_train, df_stores, df_features = carregar_dados_brutos(args.treino, CAMINHO_LOJAS, CAMINHO_FEATURES)
+            analise_exploratoria(df_train, df_stores, df_features)
+            investigar_markdowns(df_features)
+
+        # Modo incremental: reaproveita as medianas por loja e o manifesto de partições
+        # salvos na execução anterior e reescreve só as lojas que mudaram em data/walmart_particionado.
+        if args.incremental:
+            with relatorio.etapa('incremental'):
+                num_particoes = preparar_incremental(caminho_treino=args.treino, features_vendas=args.features_vendas)
+            registrar_dados_processados(CAMINHO_PARTICIONADO_WALMART)
+            if num_particoes == 0:
+                print("✅ Nenhuma partição nova ou alterada. Nada a fazer.")
+            else:
+                print(f"✅ {num_particoes} partições (Store, Date) processadas e salvas em data/walmart_particionado")
+            concluir()
+            return
+
+        # Modo em lotes: memória limitada pelo tamanho do lote, não pelo histórico
+        if args.lotes:
+            with relatorio.etapa('lotes') as medicao:
+                total_linhas = preparar_em_lotes(args.treino, CAMINHO_LOJAS, CAMINHO_FEATURES,
+                                                 CAMINHO_PARQUET_WALMART, tamanho_lote=args.lotes,
+                                                 exportar_csv=args.exportar_csv)
+                medicao['linhas'] = total_linhas
+            registrar_dados_processados(CAMINHO_PARQUET_WALMART)
+            print(f"✅ {total_linhas} linhas processadas em lotes de {args.lotes} e salvas em: {CAMINHO_PARQUET_WALMART}")
+            concluir()
+            return
+
+        # Modo por loja: as lojas são independentes depois da leitura, então cada
+        # uma é preparada em um processo e gravada como um arquivo separado
+        if args.por_loja:
+            with relatorio.etapa('por_loja') as medicao:
+                total_linhas = preparar_por_loja(args.treino, CAMINHO_LOJAS, CAMINHO_FEATURES,
+                                                 n_processos=args.n_processos, features_vendas=args.features_vendas)
+                medicao['linhas'] = total_linhas
+            registrar_dados_processados(CAMINHO_POR_LOJA_WALMART)
+            print(f"✅ {total_linhas} linhas processadas por loja e salvas em: {CAMINHO_POR_LOJA_WALMART}")
+            print(f"✅ Tabelas agregadas para o dashboard salvas em: {PASTA_AGREGADOS_WALMART}")
+            concluir()
+            return
+
+        # Memória de cada etapa resolvida (as que vêm do cache só aparecem se forem lidas)
+        medicoes_memoria = []
+        df_processed = executar_pipeline(args.treino, CAMINHO_LOJAS, CAMINHO_FEATURES,
+                                         usar_cache=not args.sem_cache, medicoes_memoria=medicoes_memoria,
+                                         relatorio=relatorio)
+
+    except FileNotFoundError as e:
+        print(f"❌ ERRO: Arquivo não encontrado. Verifique o caminho e a estrutura de pastas.")
+        print(f"   Detalhe do erro: {e}")
+        # Encerra o script se os arquivos não forem encontrados
+        exit()
+
+    if args.features_vendas:
+        # Calculadas fora do cache das etapas: são operações vetorizadas e rápidas.
+        # O recorte das últimas semanas fica salvo para o modo incremental e para a previsão.
+        df_processed, historico_vendas = relatorio.medir('features_vendas', adicionar_features_vendas, df_processed)
+        salvar_historico_vendas(historico_vendas, CAMINHO_HISTORICO_VENDAS)
+        print("[OK] Features de histórico de vendas adicionadas.")
+        relatorio_memoria('features de vendas', df_processed, medicoes_memoria)
+
+    print(f"\n[INFO] Dataframe processado: {df_processed.shape[0]} linhas, {df_processed.shape[1]} colunas")
+    verificar_dataframe_processado(df_processed, detalhado=args.eda)
+
+    # Salva o dataframe em Parquet com tipos compactos (int8/int16/float32),
+    # o que reduz o tamanho em disco e o tempo de leitura no treino e no dashboard.
+    # A pasta 'data' é criada se ainda não existir.
+    with relatorio.etapa('salvar_parquet', linhas=len(df_processed)):
+        caminho_arquivo_saida = salvar_dados_processados(
+            df_processed, CAMINHO_PARQUET_WALMART, exportar_csv=args.exportar_csv
+        )
+    # Treino, backtesting, busca, benchmark e app passam a ler este arquivo
+    registrar_dados_processados(caminho_arquivo_saida)
+
+    # Tabelas pequenas (por mês, por tipo de loja e por loja/depto/semana) que o
+    # dashboard lê diretamente, sem reagrupar a tabela completa a cada interação.
+    with relatorio.etapa('agregados', linhas=len(df_processed)):
+        salvar_agregados(calcular_agregados(df_processed))
 
-# Verifica se o dataframe df_eng existe
-if 'df_eng' in locals():
-    print("\n\n--- TRATANDO VARIÁVEIS CATEGÓRICAS ---")
-
-    # A função pd.get_dummies é a forma mais fácil de aplicar One-Hot Encoding.
-    # Ela automaticamente identifica colunas de texto (object) e as converte.
-    # O argumento 'columns' especifica quais colunas queremos transformar.
-    # 'dtype=int' garante que as novas colunas sejam 0s e 1s inteiros.
-    df_processed = pd.get_dummies(df_eng, columns=['Type'], dtype=int)
-
-    print("[OK] Coluna 'Type' convertida para formato numérico via One-Hot Encoding.")
-
-
-    # Verificação Final: Vamos checar a estrutura final do dataframe
-    print("\n\n--- VERIFICAÇÃO FINAL DO DATAFRAME PROCESSADO ---")
-    df_processed.info()
-    
-    print("\n--- 5 Primeiras Linhas mostrando as novas colunas ---")
-    # Mostrando apenas as colunas relevantes para a verificação
-    print(df_processed[['Store', 'Type_A', 'Type_B', 'Type_C']].head())
-
-else:
-    print("\n❌ ERRO: O dataframe df_eng não foi encontrado. Execute os blocos anteriores.")
-
-# ==============================================================================
-# Bloco 07: Salvando o Dataframe Processado para a Próxima Etapa
-# ==============================================================================
-
-# Importando a biblioteca pathlib para lidar com caminhos de forma robusta
-from pathlib import Path
-
-# Verifica se o dataframe df_processed existe
-if 'df_processed' in locals():
-    
-    # Define a pasta de saída
-    pasta_saida = Path('data')
-    
-    # Cria a pasta 'data' se ela não existir (boa prática)
-    pasta_saida.mkdir(parents=True, exist_ok=True)
-    
-    # Constrói o caminho completo do arquivo de forma segura
-    caminho_arquivo_saida = pasta_saida / 'walmart_dados_processados.csv'
-    
-    # Salva o dataframe em um arquivo CSV, sem o índice do pandas
-    df_processed.to_csv(caminho_arquivo_saida, index=False)
-    
     print(f"\n\n--- ETAPA DE PREPARAÇÃO CONCLUÍDA ---")
     print(f"✅ Dataframe final salvo com sucesso em: {caminho_arquivo_saida}")
+    if args.exportar_csv:
+        print(f"✅ Cópia em CSV salva em: {caminho_arquivo_saida.with_suffix('.csv')}")
+    print(f"✅ Tabelas agregadas para o dashboard salvas em: {PASTA_AGREGADOS_WALMART}")
+    concluir()
+
 
-else:
-    print("\n❌ ERRO: O dataframe df_processed não foi encontrado.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -3,34 +3,142 @@
 # Bloco 08: Preparação para Modelagem e Treinamento do Primeiro Modelo
 # ==============================================================================
 
+# Exemplos:
+#     python 02_treinamento_modelo.py                          # modelo global
+#     python 02_treinamento_modelo.py --segmentar loja         # + um modelo por loja
+#     python 02_treinamento_modelo.py --segmentar departamento --min-linhas 5000 --n-processos 8
+#     python 02_treinamento_modelo.py --retreinar              # só as semanas novas (warm start)
+#     python 02_treinamento_modelo.py --backend hist_gradient_boosting
+#     python 02_treinamento_modelo.py --perfil                 # + cProfile da execução inteira
+#
+# Toda execução grava o tempo, a CPU, o pico de memória e as linhas de cada
+# etapa em relatorios_execucao/treinamento_<data>.json.
+
 # 1. Importando as bibliotecas necessárias
+import argparse
 import pandas as pd
-from pathlib import Path
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import numpy as np
+from esquema_dados import (
+    CAMINHO_MODELO_COMPACTO_WALMART, CAMINHO_MODELO_WALMART, carregar_dados_processados, localizar_dados_processados,
+    relatorio_memoria,
+)
+from treinamento import (
+    BACKEND_PADRAO, BACKENDS, avaliar_previsoes, criar_modelo, features_float32, separar_features_alvo,
+)
+from modelos_segmentados import MIN_LINHAS_SEGMENTO, RegistroModelos, treinar_registro
+from features_vendas import datas_das_linhas
+from instrumentacao import RelatorioExecucao
+from versoes_modelo import (
+    JANELA_RETREINO_SEMANAS, NOVAS_ARVORES_PADRAO, ativar_modelo, ler_metadados, publicar_modelo,
+    registrar_versao, retreinar_incremental, ultima_versao,
+)
+from modelo_compacto import ler_modelo_ativo
+
+parser = argparse.ArgumentParser(description="Treinamento do modelo de previsão de vendas.")
+parser.add_argument('--backend', choices=sorted(BACKENDS), default=BACKEND_PADRAO,
+                    help="Algoritmo do modelo (hist_gradient_boosting treina e prevê bem mais rápido).")
+parser.add_argument('--segmentar', choices=['tipo', 'loja', 'departamento'],
+                    help="Também treina um modelo por segmento, com o modelo global como reserva.")
+parser.add_argument('--min-linhas', type=int, default=MIN_LINHAS_SEGMENTO,
+                    help="Segmentos com menos linhas de treino usam o modelo global.")
+parser.add_argument('--n-processos', type=int, help="Segmentos treinados em paralelo (padrão: todos os núcleos).")
+parser.add_argument('--retreinar', action='store_true',
+                    help="Em vez do treino completo, acrescenta árvores treinadas só com as semanas novas.")
+parser.add_argument('--novas-arvores', type=int, default=NOVAS_ARVORES_PADRAO)
+parser.add_argument('--janela-semanas', type=int, default=JANELA_RETREINO_SEMANAS,
+                    help="Semanas recentes (além das novas) usadas para treinar as árvores novas.")
+parser.add_argument('--max-arvores', type=int,
+                    help="Descarta as árvores mais antigas quando a floresta passar deste tamanho.")
+parser.add_argument('--perfil', action='store_true',
+                    help="Registra a execução com o cProfile (.prof ao lado do relatório JSON).")
+args = parser.parse_args()
+if args.backend != 'random_forest' and (args.segmentar or args.retreinar):
+    parser.error("--segmentar e --retreinar só estão disponíveis com --backend random_forest.")
 
 print("--- Iniciando o script de treinamento de modelo ---")
+relatorio = RelatorioExecucao('treinamento', perfil=args.perfil)
+
+def concluir():
+    caminho_relatorio = relatorio.salvar({'backend': args.backend})
+    print(f"[INFO] Relatório da execução (tempo e memória por etapa) salvo em: {caminho_relatorio}")
 
 # 2. Carregando os dados processados
-caminho_dados = Path('data/walmart_dados_processados.csv')
-if caminho_dados.exists():
-    df = pd.read_csv(caminho_dados)
+# O Parquet já vem com tipos compactos; se ele não existir, o CSV antigo é usado.
+# Entre o Parquet único e a pasta particionada (modo incremental), usa o mais recente.
+caminho_dados = localizar_dados_processados()
+try:
+    df = relatorio.medir('carregar', carregar_dados_processados, caminho=caminho_dados)
     print("✅ Dados processados carregados com sucesso!")
     print(f"   - Shape do dataframe: {df.shape}")
-else:
+    relatorio_memoria('dados carregados', df)
+except FileNotFoundError:
     print(f"❌ ERRO: O arquivo {caminho_dados} não foi encontrado.")
     print("   - Por favor, execute o script 01_preparacao_dados.py primeiro.")
     exit()
 
+# ==============================================================================
+# Bloco 08.1: Retreino Incremental (opcional, --retreinar)
+# ==============================================================================
+# A versão mais recente em models/versoes guarda o modelo e a marca d'água (a
+# última semana já treinada). Só as semanas posteriores a ela geram árvores novas.
+if args.retreinar:
+    print("\n--- RETREINO INCREMENTAL (WARM START) ---")
+    pasta_versao_atual = ultima_versao()
+    if pasta_versao_atual is None:
+        print("❌ ERRO: Nenhuma versão do modelo registrada em models/versoes.")
+        print("   - Execute o treino completo (sem --retreinar) primeiro.")
+        exit()
+    versao_atual = ler_metadados(pasta_versao_atual)
+    if versao_atual.get('backend', 'random_forest') != 'random_forest':
+        print(f"❌ ERRO: A versão v{versao_atual['versao']:03d} usa o backend {versao_atual['backend']}; "
+              "o retreino incremental só acrescenta árvores a uma floresta.")
+        print("   - Execute o treino completo (sem --retreinar) com --backend random_forest.")
+        exit()
+    import joblib
+    modelo = joblib.load(pasta_versao_atual / 'modelo.joblib')
+    print(f"[INFO] Versão v{versao_atual['versao']:03d}: {versao_atual['n_estimators']} árvores, "
+          f"dados até {versao_atual['marca_dagua']}")
+
+    with relatorio.etapa('retreino', linhas=len(df)):
+        resultado = retreinar_incremental(modelo, df, versao_atual['marca_dagua'], args.novas_arvores,
+                                          args.janela_semanas, args.max_arvores)
+    if resultado is None:
+        print(f"✅ Nenhuma semana nova desde {versao_atual['marca_dagua']}. Nada a fazer.")
+        concluir()
+        exit()
+
+    modelo, marca_dagua, resumo = resultado
+    metricas_anteriores = resumo['metricas_versao_anterior_semanas_novas']
+    print(f"[INFO] {resumo['semanas_novas']} semanas novas ({resumo['linhas_novas']} linhas); "
+          f"árvores treinadas com {resumo['linhas_treino']} linhas recentes.")
+    print(f"[INFO] MAE da versão anterior nas semanas novas (fora da amostra): ${metricas_anteriores['mae']:,.2f}")
+
+    with relatorio.etapa('salvar'):
+        publicar_modelo(modelo)
+        pasta_versao = registrar_versao(modelo, marca_dagua, 'incremental', versao_base=versao_atual['versao'],
+                                        **resumo)
+    print(f"✅ Modelo atualizado ({len(modelo.estimators_)} árvores, {resumo['arvores_removidas']} removidas) "
+          f"e salvo como {pasta_versao}")
+    # O retreino não troca o modelo ativo (ex.: o registro por segmento continua
+    # ativo); só o aponta para o .joblib se nenhum modelo foi ativado ainda
+    modelo_ativo = ler_modelo_ativo()
+    if modelo_ativo is None:
+        modelo_ativo = ativar_modelo(CAMINHO_MODELO_WALMART, int(pasta_versao.name[1:]),
+                                     caminho_compacto=CAMINHO_MODELO_COMPACTO_WALMART)
+    print(f"[INFO] Modelo ativo: {modelo_ativo['caminho']}")
+    concluir()
+    exit()
+
 # 3. Separando Features (X) e Target (y)
 # Target (y) é a coluna que queremos prever: 'Weekly_Sales'
-y = df['Weekly_Sales']
-
 # Features (X) são todas as outras colunas que usaremos para fazer a previsão
-# Usamos .drop() para remover a coluna target e criar nosso dataframe de features
-X = df.drop('Weekly_Sales', axis=1)
+with relatorio.etapa('features', linhas=len(df)):
+    X, y = separar_features_alvo(df)
+    # Matriz float32 contígua (com os nomes das colunas): o fit e o predict usam o
+    # array diretamente, sem a cópia de conversão a cada chamada
+    X = features_float32(X)
+relatorio_memoria('features float32 (X)', X)
 
 print(f"\n[INFO] Features (X) shape: {X.shape}")
 print(f"[INFO] Target (y) shape: {y.shape}")
@@ -39,41 +147,39 @@ print(f"[INFO] Target (y) shape: {y.shape}")
 # 4. Dividindo os dados em conjuntos de Treino e Teste
 # 80% dos dados para treino, 20% para teste.
 # random_state=42 garante que a divisão seja sempre a mesma, para reprodutibilidade.
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+with relatorio.etapa('train_test_split', linhas=len(X)):
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
 print("\n[INFO] Dados divididos em conjuntos de treino e teste:")
 print(f"   - X_train: {X_train.shape}, y_train: {y_train.shape}")
 print(f"   - X_test: {X_test.shape},  y_test: {y_test.shape}")
 
 
-# 5. Treinando o modelo de Machine Learning (Random Forest)
+# 5. Treinando o modelo de Machine Learning (Random Forest ou Gradient Boosting)
 # ==============================================================================
 # Bloco 16: Criando um Modelo Otimizado para Deploy (Balanço de Tamanho/Performance)
 # ==============================================================================
-print("\n--- Treinando o modelo OTIMIZADO PARA DEPLOY (leve) ---")
-modelo = RandomForestRegressor(
-    n_estimators=50,     # Metade das árvores padrão
-    max_depth=20,        # Limite de profundidade (evita ficheiros gigantes)
-    min_samples_leaf=5,  # Ajuda a podar e a generalizar
-    n_jobs=-1, 
-    random_state=42
-)
+print(f"\n--- Treinando o modelo OTIMIZADO PARA DEPLOY (leve, backend {args.backend}) ---")
+# Parâmetros em treinamento.PARAMETROS_BACKENDS. Random Forest: 50 árvores,
+# max_depth=20, min_samples_leaf=5 (medidos com benchmark_treinamento.py).
+# Gradient boosting: 200 iterações, com as faixas calculadas pelo scikit-learn.
+modelo = criar_modelo(args.backend)
 
 # O comando .fit() é onde a "mágica" acontece: o modelo aprende com os dados de treino
-modelo.fit(X_train, y_train)
+with relatorio.etapa('fit', linhas=len(X_train)):
+    modelo.fit(X_train, y_train)
 print("✅ Modelo treinado com sucesso!")
 
 
 # 6. Fazendo previsões no conjunto de teste
 print("\n--- Fazendo previsões no conjunto de teste ---")
-y_pred = modelo.predict(X_test)
+y_pred = relatorio.medir('predict', modelo.predict, X_test)
 
 
 # 7. Avaliando a performance do modelo
 print("\n--- Avaliação da Performance do Modelo ---")
-mae = mean_absolute_error(y_test, y_pred)
-mse = mean_squared_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
+metricas = avaliar_previsoes(y_test, y_pred)
+mae, mse, r2 = metricas['mae'], metricas['mse'], metricas['r2']
 
 print(f"Mean Absolute Error (MAE): ${mae:,.2f}")
 print(f"Mean Squared Error (MSE): ${mse:,.2f}")
@@ -88,7 +194,7 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 
 # Verifica se o modelo foi treinado
-if 'modelo' in locals() and 'X_train' in locals():
+if 'modelo' in locals() and 'X_train' in locals() and hasattr(modelo, 'feature_importances_'):
     print("\n\n--- ANALISANDO A IMPORTÂNCIA DAS FEATURES ---")
 
     # O modelo Random Forest já calcula a importância de cada feature durante o treino
@@ -112,6 +218,9 @@ if 'modelo' in locals() and 'X_train' in locals():
     plt.tight_layout() # Ajusta o layout para não cortar os nomes
     plt.show()
 
+elif 'modelo' in locals():
+    print("\n[INFO] O backend de gradient boosting não calcula importância das features durante o treino.")
+
 else:
     print("\n❌ ERRO: O modelo ainda não foi treinado. Execute o Bloco 08 primeiro.")
 
@@ -120,22 +229,88 @@ else:
 # Bloco 10: Salvando o Modelo Treinado (Persistência)
 # ==============================================================================
 import joblib
+from esquema_dados import CAMINHO_MODELO_HISTOGRAMA_WALMART
+from modelo_compacto import exportar_floresta
 
-# Verifica se o modelo foi treinado
-if 'modelo' in locals():
+# O gradient boosting é salvo na sua própria pasta, com o backend nos metadados
+# (carregar_modelo escolhe a classe de previsão por ele)
+if 'modelo' in locals() and args.backend == 'hist_gradient_boosting':
+    print("\n\n--- SALVANDO O MODELO TREINADO ---")
+    with relatorio.etapa('salvar'):
+        caminho_histograma = modelo.exportar(CAMINHO_MODELO_HISTOGRAMA_WALMART)
+    tamanho_histograma = sum(arquivo.stat().st_size for arquivo in caminho_histograma.iterdir()) / 1024**2
+    print(f"✅ Modelo salvo com sucesso em: {caminho_histograma} ({tamanho_histograma:,.1f} MB)")
+
+    pasta_versao = registrar_versao(modelo, datas_das_linhas(df).max(), 'completo', metricas=metricas)
+    print(f"✅ Versão registrada em: {pasta_versao}")
+    ativar_modelo(caminho_histograma, int(pasta_versao.name[1:]))
+    print(f"[INFO] Modelo ativo: {caminho_histograma}")
+
+elif 'modelo' in locals():
     print("\n\n--- SALVANDO O MODELO TREINADO ---")
-    
-    # Criando a pasta 'models' se ela não existir
-    caminho_pasta_modelos = Path('models')
-    caminho_pasta_modelos.mkdir(exist_ok=True)
     
     # Definindo o caminho completo para salvar o modelo
-    caminho_modelo = caminho_pasta_modelos / 'random_forest_regressor_v1.joblib'
+    caminho_modelo = CAMINHO_MODELO_WALMART
+
+    # Criando a pasta 'models' se ela não existir
+    caminho_modelo.parent.mkdir(exist_ok=True)
     
     # Usando joblib para salvar o objeto do modelo no arquivo
-    joblib.dump(modelo, caminho_modelo)
+    with relatorio.etapa('salvar'):
+        joblib.dump(modelo, caminho_modelo)
     
     print(f"✅ Modelo salvo com sucesso em: {caminho_modelo}")
 
+    # Exporta também a floresta em arrays planos (float32, memory-mapped). Ela é
+    # bem menor, abre quase instantaneamente e prevê lotes pequenos mais rápido;
+    # é a versão usada pelo app e pelo servidor (ver modelo_compacto.localizar_modelo).
+    with relatorio.etapa('exportar_compacto'):
+        caminho_compacto = exportar_floresta(modelo, CAMINHO_MODELO_COMPACTO_WALMART)
+    tamanho_joblib = caminho_modelo.stat().st_size / 1024**2
+    tamanho_compacto = sum(arquivo.stat().st_size for arquivo in caminho_compacto.iterdir()) / 1024**2
+    print(f"✅ Modelo compacto salvo em: {caminho_compacto} ({tamanho_compacto:,.1f} MB; joblib: {tamanho_joblib:,.1f} MB)")
+
+    # Versão numerada com as métricas e a marca d'água (última semana dos dados),
+    # usada pelo retreino incremental (--retreinar)
+    pasta_versao = registrar_versao(modelo, datas_das_linhas(df).max(), 'completo', metricas=metricas)
+    print(f"✅ Versão registrada em: {pasta_versao}")
+
+    # O treino completo passa a ser o modelo ativo (com --segmentar, o registro
+    # por segmento o substitui no Bloco 17)
+    if not args.segmentar:
+        ativar_modelo(caminho_modelo, int(pasta_versao.name[1:]), caminho_compacto=caminho_compacto)
+        print(f"[INFO] Modelo ativo: {caminho_modelo} (lotes pequenos: {caminho_compacto})")
+
 else:
-    print("\n❌ ERRO: O modelo ainda não foi treinado.")
\ No newline at end of file
+    print("\n❌ ERRO: O modelo ainda não foi treinado.")
+
+# ==============================================================================
+# Bloco 17: Modelos por Segmento (opcional, --segmentar)
+# ==============================================================================
+from esquema_dados import CAMINHO_REGISTRO_SEGMENTOS
+
+if args.segmentar:
+    print(f"\n\n--- TREINANDO UM MODELO POR SEGMENTO ({args.segmentar.upper()}) ---")
+
+    # O modelo global treinado acima entra no registro como reserva, sem novo treino
+    parametros_segmento = {k: v for k, v in modelo.get_params().items()
+                           if k in ('n_estimators', 'max_depth', 'min_samples_leaf', 'random_state')}
+    with relatorio.etapa('segmentos', linhas=len(X_train)):
+        pasta_registro = treinar_registro(
+            pd.concat([X_train, y_train], axis=1), args.segmentar, CAMINHO_REGISTRO_SEGMENTOS,
+            min_linhas=args.min_linhas, n_processos=args.n_processos, parametros=parametros_segmento,
+            modelo_global=modelo,
+        )
+    registro = RegistroModelos.carregar(pasta_registro)
+    print(f"✅ {len(registro.modelos)} modelos por segmento salvos em: {pasta_registro}")
+    ativar_modelo(pasta_registro, int(pasta_versao.name[1:]))
+    print(f"[INFO] Modelo ativo: {pasta_registro}")
+
+    metricas_segmentos = avaliar_previsoes(y_test, registro.predict(X_test))
+    print(f"[INFO] MAE global: ${mae:,.2f}  |  MAE por segmento: ${metricas_segmentos['mae']:,.2f}")
+    print(f"[INFO] R² global: {r2:.2%}  |  R² por segmento: {metricas_segmentos['r2']:.2%}")
+
+# ==============================================================================
+# Relatório da execução (tempo, CPU, pico de memória e linhas por etapa)
+# ==============================================================================
+concluir()
@@ -4,16 +4,41 @@
 # ==============================================================================
 
 # 1. Importando as bibliotecas necessárias
+# O modelo (e o scikit-learn, que leva ~1 s para importar) só é carregado quando
+# o simulador é aberto; cada aba lê apenas os dados e as colunas que exibe.
+import argparse
+import datetime
+import inspect
+import time
 import streamlit as st
+import numpy as np
 import pandas as pd
-import joblib
-from pathlib import Path
+from esquema_dados import CAMINHO_CSV_UK, PASTA_AGREGADOS_UK, carregar_agregado, carregar_dados_processados, memoria_mb
+from pipeline_preparacao import (
+    AGREGACOES, CAMINHO_HISTORICO_VENDAS, COLUNAS_AMOSTRA, calcular_agregados, calcular_amostra, rotular_tipo_loja,
+)
+from indice_lojas import IndiceLojas
+from calendario import ANO_INICIO_PADRAO
+from features_vendas import HORIZONTE_MAXIMO, carregar_historico_vendas, usa_features_vendas, verificar_horizonte
+from cache_previsoes import CachePrevisoes
+from instrumentacao import RelatorioExecucao
+from preparacao_ecommerce import (
+    AGREGACOES_UK, calcular_agregados_uk, carregar_vendas_uk_brutas, limpar_vendas_uk, sortear_amostra_uk,
+)
 # import openpyxl # Não é mais necessário para ler .csv
 
 # ==============================================================================
 # Bloco 11: Configuração Inicial
 # ==============================================================================
 st.set_page_config(page_title="Forecast de Demanda", layout="wide")
+
+# Tempo, CPU e memória de cada carga desta execução do script (um rerun),
+# mostrados no fim da barra lateral. Com 'streamlit run app.py -- --relatorio',
+# cada execução também grava o relatório em relatorios_execucao/app_<data>.json.
+parser = argparse.ArgumentParser(description="Dashboard de previsão de demanda.")
+parser.add_argument('--relatorio', action='store_true', help="Grava o relatório JSON de cada execução.")
+args_app, _ = parser.parse_known_args()
+relatorio = RelatorioExecucao('app', exibir=False)
 st.title("Projeto Integrador III: Forecast de Demanda com IA")
 st.write("""
 Esta aplicação apresenta os resultados da análise de dados e o modelo de previsão de vendas 
@@ -21,77 +46,154 @@ para as lojas da rede Walmart, desenvolvido como parte do Projeto Integrador.
 """)
 
 # ==============================================================================
-# Bloco 12: Carregamento de Dados e Modelo (com Cache)
+# Bloco 12: Carregamento de Dados e Modelo (com Cache, sob demanda)
 # ==============================================================================
 
+ABAS = ["📊 Análise Walmart", "🤖 Simulador de Previsão", "🌍 Comparativo E-commerce"]
+# st.tabs com key/on_change e tab.open só existem em versões recentes do Streamlit
+ABAS_SOB_DEMANDA = 'on_change' in inspect.signature(st.tabs).parameters
+
+# Colunas usadas para recalcular os agregados, se o script 01 ainda não os gravou
+COLUNAS_AGREGADOS_WALMART = ['Store', 'Dept', 'Mes', 'Semana_do_Ano', 'Weekly_Sales', 'Type_A', 'Type_B', 'Type_C']
+
 @st.cache_data
-def carregar_dados_walmart():
-    """Carrega os dados processados do Walmart."""
-    caminho_dados = Path('data/walmart_dados_processados.csv')
-    if caminho_dados.exists():
-        df = pd.read_csv(caminho_dados)
-        # Adiciona a coluna 'Type_Label' para os gráficos
-        def get_type(row):
-            if row['Type_A'] == 1: return 'Tipo A'
-            if row['Type_B'] == 1: return 'Tipo B'
-            if row['Type_C'] == 1: return 'Tipo C'
-        df['Type_Label'] = df.apply(get_type, axis=1)
+def carregar_dados_walmart(colunas=None):
+    """Carrega as colunas pedidas dos dados processados do Walmart (Parquet, com o CSV como alternativa)."""
+    try:
+        df = carregar_dados_processados(colunas)
+    except FileNotFoundError:
+        df = None
+    if df is not None:
+        # Adiciona a coluna categórica 'Type_Label' (calculada de forma vetorizada)
+        df['Type_Label'] = rotular_tipo_loja(df)
         return df
     else:
-        st.error("Arquivo 'walmart_dados_processados.csv' não encontrado na pasta 'data'. Execute o script 01 primeiro.")
+        st.error("Arquivo 'walmart_dados_processados.parquet' não encontrado na pasta 'data'. Execute o script 01 primeiro.")
         return None
 
+@st.cache_data
+def carregar_amostra_walmart():
+    """
+    Carrega a amostra de linhas gravada pelo script 01 junto dos agregados. Só
+    se ela ainda não existe, a amostra é sorteada da tabela de fatos.
+    """
+    try:
+        amostra = carregar_agregado('amostra')
+    except FileNotFoundError:
+        df = carregar_dados_walmart(COLUNAS_AMOSTRA)
+        if df is None:
+            return None
+        amostra = calcular_amostra(df)
+    amostra = amostra[[coluna for coluna in COLUNAS_AMOSTRA if coluna in amostra.columns]].copy()
+    amostra['Type_Label'] = rotular_tipo_loja(amostra)
+    return amostra
+
+@st.cache_data
+def carregar_agregados_walmart():
+    """Carrega as tabelas pré-agregadas geradas pelo script 01 (ou as calcula uma única vez)."""
+    try:
+        return {nome: carregar_agregado(nome) for nome in AGREGACOES}
+    except FileNotFoundError:
+        df = carregar_dados_walmart(COLUNAS_AGREGADOS_WALMART)
+        return calcular_agregados(df) if df is not None else None
+
+@st.cache_resource
+def carregar_indice_lojas():
+    """Carrega o índice (Store, Date) -> features exógenas usado pelo simulador."""
+    return IndiceLojas.carregar()
+
 @st.cache_resource
-def carregar_modelo_walmart():
-    """Carrega o modelo de IA treinado."""
-    caminho_modelo = Path('models/random_forest_regressor_v1.joblib')
-    if caminho_modelo.exists():
-        modelo = joblib.load(caminho_modelo)
+def carregar_historico_vendas_walmart():
+    """Carrega as últimas semanas de vendas de cada série (só para modelos com features de vendas)."""
+    return carregar_historico_vendas(CAMINHO_HISTORICO_VENDAS)
+
+def versao_modelo_walmart():
+    """Versão (caminho e data do arquivo) do modelo de previsão, ou None se não existe."""
+    # Importado aqui: modelo_compacto carrega o scikit-learn, só necessário no simulador
+    from modelo_compacto import versao_modelo
+    return versao_modelo(lotes_pequenos=True)
+
+@st.cache_resource(max_entries=1)
+def carregar_modelo_walmart(versao):
+    """
+    Carrega o modelo de IA escolhido por localizar_modelo (registro por segmento, floresta
+    compacta, gradient boosting ou joblib). A versão (caminho e data do arquivo)
+    faz parte da chave do cache: um modelo regravado é recarregado.
+    """
+    if versao is not None:
+        from modelo_compacto import carregar_modelo
+        modelo = carregar_modelo(lotes_pequenos=True)
         return modelo
     else:
         st.error("Arquivo 'random_forest_regressor_v1.joblib' não encontrado na pasta 'models'. Execute o script 02 primeiro.")
         return None
 
+@st.cache_resource
+def obter_cache_previsoes():
+    """Cache de previsões do simulador, compartilhado por todas as sessões."""
+    return CachePrevisoes()
+
 @st.cache_data
-def carregar_dados_uk():
-    """Carrega os dados brutos do E-commerce UK a partir do CSV."""
-    caminho_dados_uk = Path('data/online_retail_II.csv') # <-- MODIFICADO
-    if caminho_dados_uk.exists():
-        try:
-            # Tenta a leitura com encoding 'latin1', que é comum para este dataset
-            df_uk = pd.read_csv(caminho_dados_uk, encoding='latin1') # <-- MODIFICADO
-        except Exception as e:
-            st.error(f"Erro ao ler 'online_retail_II.csv': {e}")
-            return None
-        return df_uk
-    else:
+def carregar_agregados_uk():
+    """
+    Carrega as tabelas do E-commerce UK geradas por preparacao_ecommerce.py
+    (totais por mês e por país e uma amostra). Sem elas, faz a mesma preparação
+    uma única vez a partir do CSV.
+    """
+    try:
+        return {nome: carregar_agregado(nome, PASTA_AGREGADOS_UK) for nome in (*AGREGACOES_UK, 'amostra')}
+    except FileNotFoundError:
+        pass
+    try:
+        df_uk = carregar_vendas_uk_brutas(CAMINHO_CSV_UK)
+    except FileNotFoundError:
         st.error("Arquivo 'online_retail_II.csv' não encontrado na pasta 'data'.")
         return None
+    except Exception as e:
+        st.error(f"Erro ao ler 'online_retail_II.csv': {e}")
+        return None
+    try:
+        df_limpo = limpar_vendas_uk(df_uk)
+    except ValueError as e:
+        st.error(f"Erro ao preparar 'online_retail_II.csv': {e}")
+        return None
+    # Mesma amostra que preparar_ecommerce grava
+    return {**calcular_agregados_uk(df_limpo), 'amostra': sortear_amostra_uk(df_uk).reset_index(drop=True)}
 
-# --- Executando as funções de carregamento ---
-df_walmart = carregar_dados_walmart()
-modelo_walmart = carregar_modelo_walmart()
-df_uk = carregar_dados_uk()
+def abrir_simulador():
+    """Ao clicar em 'Gerar Previsão', mostra a aba do simulador."""
+    st.session_state['aba_principal'] = ABAS[1]
 
 # ==============================================================================
 # Bloco 13: Formulário Interativo (Sidebar)
 # ==============================================================================
 
-if df_walmart is not None and modelo_walmart is not None:
+# As listas vêm do índice de lojas e das tabelas agregadas, não da tabela de fatos
+try:
+    lojas = relatorio.medir('indice_lojas', carregar_indice_lojas).lojas
+    agregados_wm = relatorio.medir('agregados_walmart', carregar_agregados_walmart)
+except FileNotFoundError:
+    lojas, agregados_wm = None, None
+
+if lojas is not None and agregados_wm is not None:
     st.sidebar.header("🗓️ Fazer Nova Previsão (Walmart)")
 
-    lojas = sorted(df_walmart['Store'].unique())
     loja_selecionada = st.sidebar.selectbox(
         "Selecione a Loja:", lojas, key='input_loja'
     )
 
-    deptos = sorted(df_walmart['Dept'].unique())
+    deptos = sorted(agregados_wm['vendas_loja_depto_semana']['Dept'].unique())
     depto_selecionado = st.sidebar.selectbox(
         "Selecione o Departamento:", deptos, key='input_depto'
     )
 
+    # Com o histórico de vendas salvo, a data sugerida é a semana seguinte a ele
+    # (a última que os modelos com features de vendas conseguem prever)
+    historico_sidebar = carregar_historico_vendas_walmart()
+    data_sugerida = ('today' if historico_sidebar is None
+                     else (historico_sidebar['Date'].max() + pd.Timedelta(weeks=HORIZONTE_MAXIMO)).date())
     data_selecionada = st.sidebar.date_input(
-        "Selecione a Data:", key='input_data'
+        "Selecione a Data:", value=data_sugerida, min_value=datetime.date(ANO_INICIO_PADRAO, 1, 1), key='input_data'
     )
 
     temp_selecionada = st.sidebar.number_input(
@@ -101,120 +203,217 @@ if df_walmart is not None and modelo_walmart is not None:
         "É feriado?", [False, True], key='input_feriado'
     )
     
-    botao_prever = st.sidebar.button("Gerar Previsão", key='btn_prever')
+    botao_prever = st.sidebar.button("Gerar Previsão", key='btn_prever', on_click=abrir_simulador)
 
 # ==============================================================================
 # Bloco 14 & 15: Conteúdo Principal com 3 Abas
 # ==============================================================================
 
-if df_walmart is not None and modelo_walmart is not None:
+if lojas is not None and agregados_wm is not None:
     
-    tab1, tab2, tab3 = st.tabs([
-        "📊 Análise Walmart", 
-        "🤖 Simulador de Previsão", 
-        "🌍 Comparativo E-commerce"
-    ])
+    if ABAS_SOB_DEMANDA:
+        # on_change='rerun': só o conteúdo da aba aberta é executado (tab.open)
+        tab1, tab2, tab3 = st.tabs(ABAS, key='aba_principal', on_change='rerun')
+        aba_aberta = [tab.open for tab in (tab1, tab2, tab3)]
+    else:
+        # Streamlit sem abas sob demanda: um seletor faz o mesmo papel e só a aba escolhida é executada
+        aba_selecionada = st.radio("Aba:", ABAS, horizontal=True, key='aba_principal', label_visibility='collapsed')
+        tab1 = tab2 = tab3 = st.container()
+        aba_aberta = [aba_selecionada == nome for nome in ABAS]
 
     # 2. Conteúdo da Aba 1: Análise Walmart
-    with tab1:
-        st.header("Visão Geral dos Dados Históricos (Walmart)")
-        st.write("Abaixo está uma amostra dos dados que foram usados para treinar o modelo de IA.")
-        st.dataframe(df_walmart.sample(10))
-        st.success("Dados do Walmart e modelo carregados com sucesso!")
-        st.divider()
-
-        st.header("Análise de Vendas (Walmart)")
-        
-        st.subheader("Vendas Totais por Mês")
-        vendas_por_mes_wm = df_walmart.groupby('Mes')['Weekly_Sales'].sum()
-        st.line_chart(vendas_por_mes_wm)
-        st.write("Podemos observar claramente a sazonalidade das vendas, com picos no final do ano (Novembro e Dezembro).")
-
-        st.subheader("Vendas Totais por Tipo de Loja")
-        vendas_por_tipo_wm = df_walmart.groupby('Type_Label')['Weekly_Sales'].sum()
-        st.bar_chart(vendas_por_tipo_wm)
-        st.write("As lojas do 'Tipo A' (supercentros) dominam vastamente o volume de vendas.")
+    if aba_aberta[0]:
+        with tab1:
+            st.header("Visão Geral dos Dados Históricos (Walmart)")
+            st.write("Abaixo está uma amostra dos dados que foram usados para treinar o modelo de IA.")
+            with st.spinner("Carregando os dados do Walmart..."):
+                amostra_walmart = relatorio.medir('amostra_walmart', carregar_amostra_walmart)
+            if amostra_walmart is not None:
+                st.dataframe(amostra_walmart.sample(min(10, len(amostra_walmart))))
+                st.caption(f"Amostra de {len(amostra_walmart):,} linhas gravada pelo script 01 "
+                           f"({memoria_mb(amostra_walmart):,.2f} MB, tipos compactos do esquema).")
+                st.success("Dados do Walmart carregados com sucesso!")
+            st.divider()
+
+            st.header("Análise de Vendas (Walmart)")
+
+            # Os totais vêm das tabelas pré-agregadas: nada é reagrupado a cada interação
+            st.subheader("Vendas Totais por Mês")
+            vendas_por_mes_wm = agregados_wm['vendas_por_mes'].set_index('Mes')['Weekly_Sales']
+            st.line_chart(vendas_por_mes_wm)
+            st.write("Podemos observar claramente a sazonalidade das vendas, com picos no final do ano (Novembro e Dezembro).")
+
+            st.subheader("Vendas Totais por Tipo de Loja")
+            vendas_por_tipo_wm = agregados_wm['vendas_por_tipo'].set_index('Type_Label')['Weekly_Sales']
+            st.bar_chart(vendas_por_tipo_wm)
+            st.write("As lojas do 'Tipo A' (supercentros) dominam vastamente o volume de vendas.")
 
     # 3. Conteúdo da Aba 2: Simulador de Previsão
-    with tab2:
-        st.header("Resultado da Previsão")
-        st.write("Utilize o formulário na barra lateral esquerda para gerar uma nova previsão de vendas.")
-        
-        if botao_prever:
-            ano = data_selecionada.year
-            mes = data_selecionada.month
-            dia = data_selecionada.day
-            semana_do_ano = data_selecionada.isocalendar().week
-
-            dados_loja = df_walmart[df_walmart['Store'] == loja_selecionada].iloc[-1]
-            
-            features_para_prever = {
-                'Store': loja_selecionada, 'Dept': depto_selecionado, 'IsHoliday': feriado_selecionado,
-                'Temperature': temp_selecionada, 'Ano': ano, 'Mes': mes, 'Dia': dia,
-                'Semana_do_Ano': semana_do_ano, 'Size': dados_loja['Size'], 'Fuel_Price': dados_loja['Fuel_Price'],
-                'MarkDown1': dados_loja['MarkDown1'], 'MarkDown2': dados_loja['MarkDown2'],
-                'MarkDown3': dados_loja['MarkDown3'], 'MarkDown4': dados_loja['MarkDown4'],
-                'MarkDown5': dados_loja['MarkDown5'], 'CPI': dados_loja['CPI'],
-                'Unemployment': dados_loja['Unemployment'], 'Type_A': dados_loja['Type_A'],
-                'Type_B': dados_loja['Type_B'], 'Type_C': dados_loja['Type_C']
-            }
-            
-            df_previsao = pd.DataFrame([features_para_prever])
+    if aba_aberta[1]:
+        with tab2:
+            st.header("Resultado da Previsão")
+            st.write("Utilize o formulário na barra lateral esquerda para gerar uma nova previsão de vendas.")
+
+            with st.spinner("Carregando o modelo de previsão..."):
+                versao_modelo_atual = versao_modelo_walmart()
+                modelo_walmart = relatorio.medir('modelo', carregar_modelo_walmart, versao_modelo_atual)
+            if modelo_walmart is None:
+                st.stop()
+            cache_previsoes = obter_cache_previsoes()
+            cache_previsoes.definir_versao(versao_modelo_atual)
+
+            # Importados só aqui: levam o scikit-learn e os módulos do modelo junto
+            from previsao_lote import montar_features_consultas
+            from intervalos_previsao import suporta_intervalos
+            from simulacao_cenarios import COLUNAS_CENARIO, PONTOS_PADRAO, curvas_cenarios, faixa_padrao, simular_cenarios
+
             colunas_modelo = modelo_walmart.feature_names_in_
-            df_previsao = df_previsao[colunas_modelo]
-            
-            previsao_vendas = modelo_walmart.predict(df_previsao)[0]
-            
-            st.metric(
-                label=f"Vendas Semanais para a Loja {loja_selecionada}, Dept {depto_selecionado}",
-                value=f"$ {previsao_vendas:,.2f}"
-            )
-            
-            with st.expander("Ver detalhes dos dados usados na previsão"):
-                st.dataframe(df_previsao)
-        else:
-            st.info("Por favor, preencha os dados na barra lateral e clique em 'Gerar Previsão'.")
+            historico_vendas = None
+            if usa_features_vendas(colunas_modelo):
+                # Lags e médias móveis da série escolhida, a partir do histórico salvo pelo script 01
+                historico_vendas = carregar_historico_vendas_walmart()
+                if historico_vendas is None:
+                    st.error("Histórico de vendas não encontrado. Execute o script 01 com --features-vendas.")
+                    st.stop()
+                # Além da semana seguinte ao histórico, os lags da série não existem
+                try:
+                    verificar_horizonte(historico_vendas, [pd.Timestamp(data_selecionada)])
+                except ValueError as e:
+                    st.warning(f"Data fora do horizonte do modelo. {e}")
+                    st.stop()
+
+            def features_formulario(lojas_consulta):
+                """Features do modelo para o departamento, a data, o feriado e a temperatura da barra lateral."""
+                # Mesma montagem de features do servidor de previsão: as features da loja
+                # em vigor na data vêm do índice, sem filtrar a tabela de fatos inteira
+                df_consulta = pd.DataFrame({
+                    'Store': lojas_consulta, 'Dept': depto_selecionado, 'Date': pd.Timestamp(data_selecionada),
+                    'IsHoliday': feriado_selecionado, 'Temperature': temp_selecionada,
+                })
+                return montar_features_consultas(df_consulta, carregar_indice_lojas(), colunas_modelo,
+                                                 historico_vendas)
+
+            if botao_prever:
+                df_previsao = features_formulario([loja_selecionada])
+
+                # Combinações já consultadas (por qualquer sessão) vêm do cache, sem chamar o modelo.
+                # Nas florestas, a previsão e a faixa entre as árvores saem de um único percurso.
+                intervalo = None
+                with relatorio.etapa('previsao', linhas=1):
+                    if suporta_intervalos(modelo_walmart):
+                        previsao_vendas, *intervalo = cache_previsoes.prever_com_intervalos(modelo_walmart,
+                                                                                            df_previsao)
+                    else:
+                        previsao_vendas = cache_previsoes.prever(modelo_walmart, df_previsao)
+
+                st.metric(
+                    label=f"Vendas Semanais para a Loja {loja_selecionada}, Dept {depto_selecionado}",
+                    value=f"$ {previsao_vendas:,.2f}"
+                )
+
+                # Faixa entre as árvores da floresta (calculada junto com a previsão)
+                if intervalo is not None:
+                    p10, p50, p90 = intervalo
+                    col_p10, col_p50, col_p90 = st.columns(3)
+                    col_p10.metric("P10 (cenário baixo)", f"$ {p10:,.2f}")
+                    col_p50.metric("P50 (mediana das árvores)", f"$ {p50:,.2f}")
+                    col_p90.metric("P90 (cenário alto)", f"$ {p90:,.2f}")
+                    st.caption("Quantis das previsões das árvores da floresta: medem a discordância entre "
+                               "elas, não são um intervalo de confiança calibrado.")
+                else:
+                    st.caption("O modelo carregado não tem previsões por árvore: intervalos P10/P90 indisponíveis.")
+
+                with st.expander("Ver detalhes dos dados usados na previsão"):
+                    st.dataframe(df_previsao)
+                    estatisticas = cache_previsoes.estatisticas()
+                    st.caption(f"Cache de previsões: {estatisticas['acertos']} acertos, {estatisticas['falhas']} falhas "
+                               f"({estatisticas['taxa_acerto']:.0%}), {estatisticas['entradas']} entradas.")
+            else:
+                st.info("Por favor, preencha os dados na barra lateral e clique em 'Gerar Previsão'.")
 
-    # 4. Conteúdo da Aba 3: Comparativo E-commerce
-    with tab3:
-        st.header("Análise Comparativa: Varejo Físico vs. E-commerce (UK)")
-        
-        if df_uk is not None:
-            st.write("Amostra dos dados brutos do E-commerce UK:")
-            st.dataframe(df_uk.sample(10))
-            
-            # --- Limpeza e Preparação dos dados UK (on-the-fly) ---
-            df_uk_limpo = df_uk.copy()
-            df_uk_limpo['InvoiceDate'] = pd.to_datetime(df_uk_limpo['InvoiceDate'], errors='coerce')
-            df_uk_limpo = df_uk_limpo.dropna(subset=['InvoiceDate'])
-            
-            # Filtra transações inválidas
-            df_uk_limpo = df_uk_limpo[df_uk_limpo['Quantity'] > 0]
-            df_uk_limpo = df_uk_limpo[df_uk_limpo['Price'] > 0] # <-- MODIFICADO
-            
-            # Cria novas colunas
-            df_uk_limpo['TotalPrice'] = df_uk_limpo['Quantity'] * df_uk_limpo['Price'] # <-- MODIFICADO
-            df_uk_limpo['Mes'] = df_uk_limpo['InvoiceDate'].dt.month
-            
             st.divider()
-            st.header("Análises Comparativas")
-
-            st.subheader("Vendas Totais por Mês (E-commerce UK)")
-            vendas_mes_uk = df_uk_limpo.groupby('Mes')['TotalPrice'].sum()
-            st.line_chart(vendas_mes_uk)
-            st.write("""
-            **Observação Comparativa:** Assim como no Walmart, o E-commerce apresenta um pico 
-            massivo de vendas no final do ano (Novembro e Dezembro), preparando-se para o Natal. 
-            A queda em Janeiro também é muito acentuada.
-            """)
-
-            st.subheader("Top 10 Países por Volume de Vendas (E-commerce UK)")
-            vendas_pais_uk = df_uk_limpo.groupby('Country')['TotalPrice'].sum().sort_values(ascending=False)
-            st.bar_chart(vendas_pais_uk.head(10))
-            st.write("Como esperado, o Reino Unido ('United Kingdom') domina as vendas, mas há uma presença significativa de outros países europeus.")
-            
-        else:
-            st.error("Não foi possível carregar os dados do E-commerce. Verifique o arquivo 'data/online_retail_II.csv'.") # <-- MODIFICADO
+            st.header("Cenários (E se...?)")
+            st.write("Veja como a previsão muda ao variar uma feature, mantendo os demais dados da barra lateral.")
+
+            # Fora do formulário: trocar a feature atualiza a faixa sugerida
+            colunas_variaveis = [coluna for coluna in COLUNAS_CENARIO
+                                 if coluna != 'IsHoliday' and coluna in colunas_modelo]
+            coluna_variada = st.selectbox("Feature a variar:", colunas_variaveis, key='cenario_coluna')
+            minimo_padrao, maximo_padrao = faixa_padrao(coluna_variada, carregar_indice_lojas())
+
+            # Todos os controles em um formulário: a varredura inteira roda em um único rerun
+            with st.form('form_cenarios'):
+                col_min, col_max, col_pontos = st.columns(3)
+                valor_minimo = col_min.number_input("De:", value=minimo_padrao, key=f'cenario_min_{coluna_variada}')
+                valor_maximo = col_max.number_input("Até:", value=maximo_padrao, key=f'cenario_max_{coluna_variada}')
+                num_pontos = col_pontos.slider("Pontos:", 2, 200, PONTOS_PADRAO, key='cenario_pontos')
+                comparar_feriado = st.checkbox("Comparar semana de feriado x semana normal", value=True,
+                                               key='cenario_feriado')
+                escopo = st.radio("Lojas:", ["Loja selecionada", "Todas as lojas (soma)"], horizontal=True,
+                                  key='cenario_escopo')
+                botao_cenarios = st.form_submit_button("Simular Cenários")
+
+            if botao_cenarios:
+                lojas_cenario = [loja_selecionada] if escopo == "Loja selecionada" else lojas
+                grade = {coluna_variada: np.linspace(valor_minimo, valor_maximo, num_pontos)}
+                if comparar_feriado:
+                    grade['IsHoliday'] = [False, True]
+
+                # As features base são montadas uma vez; a grade inteira vai em uma chamada de predict
+                inicio = time.perf_counter()
+                df_cenarios = relatorio.medir('cenarios', simular_cenarios, modelo_walmart,
+                                              features_formulario(lojas_cenario), grade,
+                                              suporta_intervalos(modelo_walmart))
+                duracao = time.perf_counter() - inicio
+
+                curvas = curvas_cenarios(df_cenarios, coluna_variada, 'IsHoliday' if comparar_feriado else None)
+                curvas = curvas.rename(columns={False: 'Semana normal', True: 'Feriado'})
+                st.subheader(f"Vendas Semanais Previstas x {coluna_variada} (Dept {depto_selecionado})")
+                st.line_chart(curvas)
+                st.caption(f"{len(df_cenarios):,} cenários ({len(lojas_cenario)} loja(s)) previstos em uma "
+                           f"única chamada do modelo, em {duracao * 1000:,.0f} ms.")
+                with st.expander("Ver previsões de cada cenário"):
+                    st.dataframe(df_cenarios)
+
+    # 4. Conteúdo da Aba 3: Comparativo E-commerce
+    if aba_aberta[2]:
+        with tab3:
+            st.header("Análise Comparativa: Varejo Físico vs. E-commerce (UK)")
+
+            # Tabelas pequenas pré-calculadas (preparacao_ecommerce.py): nada é limpo nem reagrupado aqui
+            with st.spinner("Carregando os dados do E-commerce..."):
+                agregados_uk = relatorio.medir('agregados_uk', carregar_agregados_uk)
+
+            if agregados_uk is not None:
+                st.write("Amostra dos dados brutos do E-commerce UK:")
+                st.dataframe(agregados_uk['amostra'].sample(min(10, len(agregados_uk['amostra']))))
+
+                st.divider()
+                st.header("Análises Comparativas")
+
+                st.subheader("Vendas Totais por Mês (E-commerce UK)")
+                st.line_chart(agregados_uk['vendas_por_mes'].set_index('Mes')['TotalPrice'])
+                st.write("""
+                **Observação Comparativa:** Assim como no Walmart, o E-commerce apresenta um pico 
+                massivo de vendas no final do ano (Novembro e Dezembro), preparando-se para o Natal. 
+                A queda em Janeiro também é muito acentuada.
+                """)
+
+                st.subheader("Top 10 Países por Volume de Vendas (E-commerce UK)")
+                st.bar_chart(agregados_uk['vendas_por_pais'].head(10).set_index('Country')['TotalPrice'])
+                st.write("Como esperado, o Reino Unido ('United Kingdom') domina as vendas, mas há uma presença significativa de outros países europeus.")
+
+            else:
+                st.error("Não foi possível carregar os dados do E-commerce. Verifique o arquivo 'data/online_retail_II.csv'.") # <-- MODIFICADO
 
 else:
-    st.error("Aplicação não pode ser iniciada. Verifique os arquivos de dados e modelo do Walmart.")
\ No newline at end of file
+    st.error("Aplicação não pode ser iniciada. Verifique os arquivos de dados do Walmart (execute o script 01).")
+
+# ==============================================================================
+# Bloco 16: Desempenho desta Execução
+# ==============================================================================
+with st.sidebar.expander("⏱️ Desempenho desta execução"):
+    # Cargas servidas pelo cache do Streamlit aparecem com poucos milissegundos
+    st.dataframe(relatorio.tabela()[['etapa', 'linhas', 'tempo_s', 'cpu_s', 'pico_rss_mb']], hide_index=True)
+if args_app.relatorio:
+    relatorio.salvar()
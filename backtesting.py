@@ -0,0 +1,284 @@
+# ==============================================================================
+# backtesting.py
+# Avaliação por origem móvel: treina no passado, prevê as semanas seguintes
+# ==============================================================================
+
+# O script 02 avalia com train_test_split aleatório, que mistura semanas futuras
+# no treino. Aqui cada fold treina só com as semanas anteriores a uma data de
+# origem e prevê as 'horizonte' semanas seguintes, como acontece em produção.
+#
+#     janela expansiva (padrão):  treino = [início do histórico, origem)
+#     janela deslizante (--janela N): treino = as N semanas antes da origem
+#
+# O erro é medido por fold e por série (Store, Dept), com o WMAE da competição
+# do Walmart: semanas de feriado pesam 5 e as demais pesam 1.
+#
+# Com as features de vendas (Vendas_*), as colunas gravadas pelo script 01 nas
+# semanas de teste vêm das vendas reais depois da origem (a semana k+2 veria a
+# venda real da k+1). Por isso, em cada fold elas são recalculadas semana a
+# semana só com o histórico até a origem e as previsões do próprio fold
+# (prever_recursivo), como na previsão em lote.
+#
+# Os folds rodam em paralelo em processos separados. Os dados não são copiados
+# para cada processo: a matriz de features (float32) e o alvo são gravados uma
+# vez em .npy, ordenados por data, e cada processo os abre com memory-mapping.
+# Como as linhas estão em ordem cronológica, o treino e o teste de um fold são
+# faixas contíguas do array, usadas sem cópia.
+#
+# Exemplos de uso:
+#     python backtesting.py                              # 8 folds, horizonte de 4 semanas
+#     python backtesting.py --folds 26 --horizonte 8 --passo 2 --n-processos 8
+#     python backtesting.py --janela 104                 # treino só com os últimos 2 anos
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from esquema_dados import carregar_dados_processados, localizar_dados_processados
+from features_vendas import datas_das_linhas, prever_recursivo, recortar_historico, usa_features_vendas
+from treinamento import PARAMETROS_DEPLOY, abrir_dados_compartilhados, criar_modelo, gravar_dados_compartilhados
+
+PASTA_BACKTESTS = Path('backtests')
+
+NUM_FOLDS_PADRAO = 8
+HORIZONTE_PADRAO = 4
+# Semanas mínimas de histórico antes da primeira origem
+TREINO_MINIMO_SEMANAS = 52
+# Peso das semanas de feriado no WMAE (regra da competição do Walmart)
+PESO_FERIADO = 5
+# Colunas da matriz usadas para reconstruir o histórico de vendas antes da origem
+COLUNAS_HISTORICO = ['Store', 'Dept', 'Ano', 'Mes', 'Dia']
+
+
+# ==============================================================================
+# Folds
+# ==============================================================================
+
+def ordenar_por_data(df):
+    """Reconstrói a data de cada linha a partir de Ano/Mes/Dia e ordena o dataframe por ela."""
+    datas = pd.to_datetime(dict(year=df['Ano'], month=df['Mes'], day=df['Dia']))
+    ordem = np.argsort(datas.to_numpy(), kind='stable')
+    return df.iloc[ordem].reset_index(drop=True), datas.to_numpy()[ordem]
+
+
+def gerar_folds(datas_ordenadas, num_folds=NUM_FOLDS_PADRAO, horizonte=HORIZONTE_PADRAO, passo=None,
+                janela=None, treino_minimo=TREINO_MINIMO_SEMANAS):
+    """
+    Define os folds sobre as datas (uma por linha, em ordem crescente).
+
+    As origens andam de 'passo' em 'passo' semanas (padrão: o horizonte) e o
+    último fold termina na última semana disponível. Cada fold traz as faixas de
+    linhas de treino e de teste, já que as linhas estão ordenadas por data.
+    """
+    semanas, primeira_linha = np.unique(datas_ordenadas, return_index=True)
+    limites = np.r_[primeira_linha, len(datas_ordenadas)]
+    passo = passo or horizonte
+
+    ultima_origem = len(semanas) - horizonte
+    origens = [ultima_origem - k * passo for k in range(num_folds)][::-1]
+    origens = [origem for origem in origens if origem >= max(treino_minimo, janela or 0)]
+
+    folds = []
+    for numero, origem in enumerate(origens):
+        inicio = 0 if janela is None else origem - janela
+        folds.append({
+            'fold': numero,
+            'inicio_treino': str(pd.Timestamp(semanas[inicio]).date()),
+            'origem': str(pd.Timestamp(semanas[origem]).date()),
+            'fim_teste': str(pd.Timestamp(semanas[origem + horizonte - 1]).date()),
+            'linhas_treino': (int(limites[inicio]), int(limites[origem])),
+            'linhas_teste': (int(limites[origem]), int(limites[origem + horizonte])),
+        })
+    return folds
+
+
+# ==============================================================================
+# Dados compartilhados entre os processos
+# ==============================================================================
+
+_DADOS_PROCESSO = {}
+
+
+def _abrir_dados(pasta):
+    """Inicializador de cada processo: abre os arrays compartilhados uma única vez."""
+    _DADOS_PROCESSO.update(abrir_dados_compartilhados(pasta))
+
+
+def prever_sem_vazamento(modelo, X, y, colunas, fold):
+    """
+    Prevê as semanas de teste do fold com as features de vendas recalculadas a
+    partir do histórico anterior à origem (todas as linhas antes do teste, mesmo
+    com janela deslizante) e das previsões das semanas anteriores do fold.
+    """
+    inicio_teste, fim_teste = fold['linhas_teste']
+    df_anterior = pd.DataFrame(X[:inicio_teste, [colunas.index(coluna) for coluna in COLUNAS_HISTORICO]],
+                               columns=COLUNAS_HISTORICO).astype(np.int64)
+    df_historico = recortar_historico(pd.DataFrame({
+        'Store': df_anterior['Store'], 'Dept': df_anterior['Dept'], 'Date': datas_das_linhas(df_anterior),
+        'Weekly_Sales': y[:inicio_teste].astype(np.float64),
+    }))
+    X_teste = pd.DataFrame(X[inicio_teste:fim_teste], columns=colunas)
+    resultado = prever_recursivo(lambda X_semana: modelo.predict(X_semana.to_numpy(np.float32)), X_teste,
+                                 df_historico)
+    return resultado['Weekly_Sales'].to_numpy()
+
+
+def _executar_fold(fold, parametros):
+    """Treina e avalia um fold; devolve as métricas do fold e os erros somados por série."""
+    X, y, colunas = _DADOS_PROCESSO['X'], _DADOS_PROCESSO['y'], _DADOS_PROCESSO['colunas']
+    inicio_treino, fim_treino = fold['linhas_treino']
+    inicio_teste, fim_teste = fold['linhas_teste']
+
+    inicio = time.perf_counter()
+    modelo = criar_modelo(**parametros)
+    modelo.fit(X[inicio_treino:fim_treino], y[inicio_treino:fim_treino])
+    X_teste = X[inicio_teste:fim_teste]
+    if usa_features_vendas(colunas):
+        previsoes = prever_sem_vazamento(modelo, X, y, colunas, fold)
+    else:
+        previsoes = modelo.predict(X_teste)
+    erro = np.abs(previsoes - y[inicio_teste:fim_teste])
+    peso = np.where(X_teste[:, colunas.index('IsHoliday')] > 0, PESO_FERIADO, 1)
+
+    erros_serie = pd.DataFrame({
+        'Store': X_teste[:, colunas.index('Store')].astype(np.int64),
+        'Dept': X_teste[:, colunas.index('Dept')].astype(np.int64),
+        'erro_absoluto': erro,
+        'erro_ponderado': erro * peso,
+        'peso': peso,
+        'linhas': 1,
+    }).groupby(['Store', 'Dept']).sum()
+
+    metricas = {
+        'fold': fold['fold'],
+        'inicio_treino': fold['inicio_treino'],
+        'origem': fold['origem'],
+        'fim_teste': fold['fim_teste'],
+        'linhas_treino': fim_treino - inicio_treino,
+        'linhas_teste': fim_teste - inicio_teste,
+        'mae': float(erro.mean()),
+        'wmae': float((erro * peso).sum() / peso.sum()),
+        'rmse': float(np.sqrt((erro ** 2).mean())),
+        'tempo_s': time.perf_counter() - inicio,
+    }
+    return metricas, erros_serie
+
+
+# ==============================================================================
+# Execução
+# ==============================================================================
+
+def executar_backtest(df, folds, parametros=None, n_processos=None):
+    """
+    Roda todos os folds e devolve (df_folds, df_series).
+
+    Cada modelo usa um núcleo (n_jobs=1); o paralelismo é entre folds, com até
+    'n_processos' processos (padrão: todos os núcleos; 1 roda no processo atual).
+    """
+    parametros = {**(parametros or {}), 'n_jobs': 1}
+    n_processos = n_processos or os.cpu_count()
+    df_ordenado, _ = ordenar_por_data(df)
+
+    pasta = tempfile.mkdtemp(prefix='backtest_')
+    try:
+        gravar_dados_compartilhados(df_ordenado, pasta)
+        del df_ordenado
+        if n_processos == 1 or len(folds) == 1:
+            _abrir_dados(pasta)
+            resultados = [_executar_fold(fold, parametros) for fold in folds]
+            _DADOS_PROCESSO.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_processos, len(folds)),
+                                     initializer=_abrir_dados, initargs=(pasta,)) as executor:
+                resultados = list(executor.map(_executar_fold, folds, [parametros] * len(folds)))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    df_folds = pd.DataFrame([metricas for metricas, _ in resultados])
+    df_series = pd.concat([erros for _, erros in resultados]).groupby(['Store', 'Dept']).sum()
+    df_series['mae'] = df_series['erro_absoluto'] / df_series['linhas']
+    df_series['wmae'] = df_series['erro_ponderado'] / df_series['peso']
+    return df_folds, df_series.reset_index()
+
+
+def resumir(df_series):
+    """MAE e WMAE sobre todas as linhas de teste de todos os folds."""
+    return {
+        'linhas_teste': int(df_series['linhas'].sum()),
+        'mae': float(df_series['erro_absoluto'].sum() / df_series['linhas'].sum()),
+        'wmae': float(df_series['erro_ponderado'].sum() / df_series['peso'].sum()),
+    }
+
+
+def salvar_resultados(df_folds, df_series, configuracao, pasta=PASTA_BACKTESTS):
+    """Grava folds.csv, series.csv e resumo.json em uma subpasta com a data da execução."""
+    pasta = Path(pasta) / f"backtest_{datetime.now():%Y%m%d_%H%M%S}"
+    pasta.mkdir(parents=True, exist_ok=True)
+    df_folds.to_csv(pasta / 'folds.csv', index=False)
+    df_series[['Store', 'Dept', 'linhas', 'mae', 'wmae']].to_csv(pasta / 'series.csv', index=False)
+    resumo = {'configuracao': configuracao, **resumir(df_series)}
+    (pasta / 'resumo.json').write_text(json.dumps(resumo, indent=2), encoding='utf-8')
+    return pasta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtesting por origem móvel do modelo de vendas.")
+    parser.add_argument('--folds', type=int, default=NUM_FOLDS_PADRAO)
+    parser.add_argument('--horizonte', type=int, default=HORIZONTE_PADRAO, help="Semanas previstas em cada fold.")
+    parser.add_argument('--passo', type=int, help="Semanas entre origens consecutivas (padrão: o horizonte).")
+    parser.add_argument('--janela', type=int,
+                        help="Janela deslizante com N semanas de treino (padrão: janela expansiva).")
+    parser.add_argument('--n-processos', type=int, help="Folds em paralelo (padrão: todos os núcleos).")
+    parser.add_argument('--n-estimators', type=int, default=PARAMETROS_DEPLOY['n_estimators'])
+    parser.add_argument('--max-depth', type=int, default=PARAMETROS_DEPLOY['max_depth'],
+                        help="Use 0 para árvores sem limite de profundidade.")
+    parser.add_argument('--saida', default=str(PASTA_BACKTESTS))
+    args = parser.parse_args()
+
+    print("--- Iniciando o backtesting por origem móvel ---")
+    caminho_dados = localizar_dados_processados()
+    try:
+        df = carregar_dados_processados(caminho=caminho_dados)
+    except FileNotFoundError:
+        print(f"❌ ERRO: O arquivo {caminho_dados} não foi encontrado.")
+        print("   - Por favor, execute o script 01_preparacao_dados.py primeiro.")
+        exit()
+
+    _, datas = ordenar_por_data(df[['Ano', 'Mes', 'Dia']])
+    folds = gerar_folds(datas, args.folds, args.horizonte, args.passo, args.janela)
+    if not folds:
+        print(f"❌ ERRO: Histórico curto demais para {args.folds} folds com {TREINO_MINIMO_SEMANAS} semanas de treino mínimo.")
+        exit()
+    tipo_janela = 'expansiva' if args.janela is None else f'deslizante de {args.janela} semanas'
+    print(f"[INFO] {len(folds)} folds, horizonte de {args.horizonte} semanas, janela {tipo_janela}.")
+
+    parametros = {'n_estimators': args.n_estimators, 'max_depth': args.max_depth or None}
+    inicio = time.perf_counter()
+    df_folds, df_series = executar_backtest(df, folds, parametros, args.n_processos)
+    print(f"[OK] Folds concluídos em {time.perf_counter() - inicio:.1f}s")
+
+    print("\n--- Erro por fold ---")
+    print(df_folds[['fold', 'origem', 'fim_teste', 'linhas_treino', 'linhas_teste', 'mae', 'wmae']].to_string(index=False))
+    resumo = resumir(df_series)
+    print(f"\nWMAE geral: ${resumo['wmae']:,.2f}  |  MAE geral: ${resumo['mae']:,.2f}")
+
+    print("\n--- Séries (Store, Dept) com maior WMAE ---")
+    print(df_series.nlargest(10, 'wmae')[['Store', 'Dept', 'linhas', 'wmae']].to_string(index=False))
+
+    configuracao = {**parametros, 'folds': len(folds), 'horizonte': args.horizonte,
+                    'passo': args.passo or args.horizonte, 'janela': args.janela}
+    pasta = salvar_resultados(df_folds, df_series, configuracao, args.saida)
+    print(f"\n✅ Resultados do backtesting salvos em: {pasta}")
+
+
+if __name__ == '__main__':
+    main()
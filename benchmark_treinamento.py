@@ -0,0 +1,284 @@
+# ==============================================================================
+# benchmark_treinamento.py
+# Medição de tempo, memória e tamanho do treino do modelo (script 02)
+# ==============================================================================
+
+# Repete as fases do script 02 (carregar, separar X/y, train_test_split, fit,
+# predict, feature_importances_ e joblib.dump) para uma grade de configurações
+# e grava os resultados em JSON e CSV, uma linha por configuração e repetição.
+#
+# Para cada fase são registrados o tempo de relógio, o tempo de CPU e o pico de
+# memória (RSS) do processo. Também entram o tamanho do modelo (joblib e
+# compacto), as métricas de teste e a latência de uma previsão de uma linha.
+#
+# O tamanho dos dados pode ser multiplicado com linhas sintéticas: as linhas
+# reais são reamostradas e as colunas contínuas recebem um ruído de 1%, o que
+# mantém a distribuição de cada coluna (zeros dos MarkDowns continuam zero).
+#
+# Exemplos de uso:
+#     python benchmark_treinamento.py                                  # só a configuração de deploy
+#     python benchmark_treinamento.py --n-estimators 25 50 100 --max-depth 10 20 0
+#     python benchmark_treinamento.py --multiplos 0.5 1 2 4 --n-jobs 1 -1
+#     python benchmark_treinamento.py --referencia benchmarks/treinamento_anterior.json
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.model_selection import train_test_split
+
+from esquema_dados import carregar_dados_processados, localizar_dados_processados
+from instrumentacao import MonitorMemoria, memoria_rss_mb, psutil
+from modelo_compacto import exportar_floresta
+from treinamento import PARAMETROS_DEPLOY, avaliar_previsoes, criar_modelo, separar_features_alvo
+
+PASTA_BENCHMARKS = Path('benchmarks')
+
+# Variação máxima aceita em relação à referência antes de apontar regressão
+TOLERANCIA_REGRESSAO = 0.20
+# Aumento mínimo, em segundos, para apontar regressão: fases de poucos
+# milissegundos variam mais que a tolerância só com o ruído da medição
+AUMENTO_MINIMO_REGRESSAO_S = 0.05
+
+# Colunas que recebem ruído nas linhas sintéticas (as demais são chaves ou calendário)
+COLUNAS_CONTINUAS = ['Weekly_Sales', 'Temperature', 'Fuel_Price', 'MarkDown1', 'MarkDown2',
+                     'MarkDown3', 'MarkDown4', 'MarkDown5', 'CPI', 'Unemployment']
+
+
+# ==============================================================================
+# Medição de memória e tempo por fase
+# ==============================================================================
+
+@contextmanager
+def medir_fase(nome, resultado):
+    """Registra em 'resultado' o tempo de relógio, o tempo de CPU e o pico de RSS da fase."""
+    inicio_cpu = time.process_time()
+    inicio = time.perf_counter()
+    with MonitorMemoria() as monitor:
+        yield
+    resultado[f'tempo_{nome}_s'] = time.perf_counter() - inicio
+    resultado[f'cpu_{nome}_s'] = time.process_time() - inicio_cpu
+    resultado[f'pico_rss_{nome}_mb'] = monitor.pico
+
+
+# ==============================================================================
+# Dados sintéticos
+# ==============================================================================
+
+def expandir_dados(df, multiplo, semente=42):
+    """
+    Devolve um dataframe com cerca de 'multiplo' vezes o número de linhas de 'df'.
+
+    Com multiplo < 1, é uma amostra sem reposição. Acima de 1, as linhas reais são
+    mantidas e completadas com linhas reamostradas cujas colunas contínuas são
+    multiplicadas por um ruído de 1%.
+    """
+    if multiplo == 1:
+        return df
+    gerador = np.random.default_rng(semente)
+    if multiplo < 1:
+        return df.sample(frac=multiplo, random_state=semente).reset_index(drop=True)
+
+    num_extras = int(round(len(df) * (multiplo - 1)))
+    extras = df.iloc[gerador.integers(0, len(df), num_extras)].reset_index(drop=True)
+    for coluna in COLUNAS_CONTINUAS:
+        if coluna in extras:
+            ruido = gerador.normal(1.0, 0.01, num_extras).astype(extras[coluna].dtype)
+            extras[coluna] = extras[coluna].to_numpy() * ruido
+    return pd.concat([df, extras], ignore_index=True)
+
+
+# ==============================================================================
+# Execução de uma configuração
+# ==============================================================================
+
+def latencia_uma_linha_ms(modelo, X, repeticoes=20):
+    """Mediana do tempo de predict() para uma única linha, como no simulador do app."""
+    linha = X.iloc[[0]]
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        modelo.predict(linha)
+        tempos.append(time.perf_counter() - inicio)
+    return float(np.median(tempos)) * 1000
+
+
+def executar_configuracao(df, parametros, pasta_temporaria):
+    """Treina e avalia um modelo com 'parametros', medindo cada fase do script 02."""
+    resultado = {}
+
+    with medir_fase('separar_xy', resultado):
+        X, y = separar_features_alvo(df)
+
+    with medir_fase('train_test_split', resultado):
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    modelo = criar_modelo(**parametros)
+    with medir_fase('fit', resultado):
+        modelo.fit(X_train, y_train)
+
+    with medir_fase('predict', resultado):
+        y_pred = modelo.predict(X_test)
+
+    with medir_fase('feature_importances', resultado):
+        modelo.feature_importances_
+
+    caminho_joblib = Path(pasta_temporaria) / 'modelo.joblib'
+    with medir_fase('joblib_dump', resultado):
+        joblib.dump(modelo, caminho_joblib)
+
+    pasta_compacta = exportar_floresta(modelo, Path(pasta_temporaria) / 'compacto')
+
+    resultado.update(avaliar_previsoes(y_test, y_pred))
+    resultado['linhas_treino'] = len(X_train)
+    resultado['linhas_teste'] = len(X_test)
+    resultado['linhas_por_s_fit'] = len(X_train) / resultado['tempo_fit_s']
+    resultado['linhas_por_s_predict'] = len(X_test) / resultado['tempo_predict_s']
+    resultado['latencia_uma_linha_ms'] = latencia_uma_linha_ms(modelo, X_test)
+    resultado['num_nos'] = int(sum(estimador.tree_.node_count for estimador in modelo.estimators_))
+    resultado['tamanho_joblib_mb'] = caminho_joblib.stat().st_size / 1024**2
+    resultado['tamanho_compacto_mb'] = sum(arquivo.stat().st_size for arquivo in pasta_compacta.iterdir()) / 1024**2
+    return resultado
+
+
+def grade_de_configuracoes(lista_n_estimators, lista_max_depth, lista_n_jobs):
+    """Produto cartesiano dos valores pedidos; max_depth 0 significa sem limite (None)."""
+    for n_estimators, max_depth, n_jobs in itertools.product(lista_n_estimators, lista_max_depth, lista_n_jobs):
+        yield {'n_estimators': n_estimators, 'max_depth': max_depth or None, 'n_jobs': n_jobs}
+
+
+# ==============================================================================
+# Resultados
+# ==============================================================================
+
+def informacoes_ambiente():
+    """Versões e máquina, para que resultados de execuções diferentes sejam comparáveis."""
+    return {
+        'data_execucao': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'plataforma': platform.platform(),
+        'num_cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'scikit_learn': sklearn.__version__,
+        'medicao_memoria': 'psutil' if psutil is not None else 'proc',
+    }
+
+
+def salvar_resultados(ambiente, resultados, pasta=PASTA_BENCHMARKS):
+    """Grava um JSON (ambiente + resultados) e um CSV com uma linha por execução."""
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    nome = f"treinamento_{datetime.now():%Y%m%d_%H%M%S}"
+    caminho_json = pasta / f'{nome}.json'
+    caminho_json.write_text(json.dumps({'ambiente': ambiente, 'resultados': resultados}, indent=2),
+                            encoding='utf-8')
+    pd.DataFrame(resultados).to_csv(pasta / f'{nome}.csv', index=False)
+    return caminho_json
+
+
+def _chave_configuracao(resultado):
+    return (resultado['multiplo_dados'], resultado['n_estimators'], resultado['max_depth'], resultado['n_jobs'])
+
+
+def _melhores_tempos(resultados):
+    """Menor tempo de cada fase entre as repetições de cada configuração."""
+    melhores = {}
+    for resultado in resultados:
+        chave = _chave_configuracao(resultado)
+        for campo, valor in resultado.items():
+            if campo.startswith('tempo_'):
+                melhores.setdefault(chave, {})[campo] = min(valor, melhores.get(chave, {}).get(campo, valor))
+    return melhores
+
+
+def comparar_com_referencia(resultados, caminho_referencia, tolerancia=TOLERANCIA_REGRESSAO,
+                            aumento_minimo_s=AUMENTO_MINIMO_REGRESSAO_S):
+    """
+    Compara os tempos de cada fase com um JSON salvo antes, configuração a
+    configuração (o menor tempo entre as repetições de cada lado), e devolve
+    as fases que ficaram mais lentas que a tolerância e ao menos
+    'aumento_minimo_s' segundos mais lentas.
+    """
+    referencia = json.loads(Path(caminho_referencia).read_text(encoding='utf-8'))['resultados']
+    melhores_referencia = _melhores_tempos(referencia)
+
+    regressoes = []
+    for chave, atuais in _melhores_tempos(resultados).items():
+        for campo, tempo_base in melhores_referencia.get(chave, {}).items():
+            tempo_atual = atuais.get(campo)
+            if (tempo_atual is not None and tempo_atual > tempo_base * (1 + tolerancia)
+                    and tempo_atual - tempo_base >= aumento_minimo_s):
+                regressoes.append((chave, campo, tempo_base, tempo_atual))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das fases de treino do modelo de vendas.")
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[PARAMETROS_DEPLOY['n_estimators']])
+    parser.add_argument('--max-depth', type=int, nargs='+', default=[PARAMETROS_DEPLOY['max_depth']],
+                        help="Use 0 para árvores sem limite de profundidade.")
+    parser.add_argument('--n-jobs', type=int, nargs='+', default=[PARAMETROS_DEPLOY['n_jobs']])
+    parser.add_argument('--multiplos', type=float, nargs='+', default=[1.0],
+                        help="Tamanhos dos dados em múltiplos do histórico real (ex.: 0.5 1 2 4).")
+    parser.add_argument('--repeticoes', type=int, default=1)
+    parser.add_argument('--saida', default=str(PASTA_BENCHMARKS))
+    parser.add_argument('--referencia', help="JSON de uma execução anterior para apontar regressões de tempo.")
+    args = parser.parse_args()
+
+    print("--- Iniciando o benchmark de treinamento ---")
+    caminho_dados = localizar_dados_processados()
+    carga = {}
+    try:
+        with medir_fase('carregar', carga):
+            df = carregar_dados_processados(caminho=caminho_dados)
+    except FileNotFoundError:
+        print(f"❌ ERRO: O arquivo {caminho_dados} não foi encontrado.")
+        print("   - Por favor, execute o script 01_preparacao_dados.py primeiro.")
+        exit()
+    print(f"[INFO] {len(df)} linhas carregadas de {caminho_dados} em {carga['tempo_carregar_s']:.2f}s")
+    if memoria_rss_mb() is None:
+        print("⚠️ Não foi possível medir a memória neste sistema (instale o psutil).")
+
+    configuracoes = list(grade_de_configuracoes(args.n_estimators, args.max_depth, args.n_jobs))
+    resultados = []
+    for multiplo in args.multiplos:
+        df_bench = expandir_dados(df, multiplo)
+        for parametros in configuracoes:
+            for repeticao in range(args.repeticoes):
+                with tempfile.TemporaryDirectory() as pasta_temporaria:
+                    resultado = {'multiplo_dados': multiplo, 'linhas': len(df_bench), **parametros,
+                                 'repeticao': repeticao, 'arquivo_dados': str(caminho_dados), **carga}
+                    resultado.update(executar_configuracao(df_bench, parametros, pasta_temporaria))
+                resultados.append(resultado)
+                print(f"[OK] x{multiplo:g} {parametros}: fit {resultado['tempo_fit_s']:.2f}s, "
+                      f"predict {resultado['tempo_predict_s']:.2f}s, MAE ${resultado['mae']:,.2f}, "
+                      f"joblib {resultado['tamanho_joblib_mb']:,.1f} MB")
+        del df_bench
+
+    caminho_resultados = salvar_resultados(informacoes_ambiente(), resultados, args.saida)
+    print(f"✅ Resultados salvos em: {caminho_resultados} (e .csv)")
+
+    if args.referencia:
+        regressoes = comparar_com_referencia(resultados, args.referencia)
+        if not regressoes:
+            print(f"✅ Nenhuma fase mais de {TOLERANCIA_REGRESSAO:.0%} (e {AUMENTO_MINIMO_REGRESSAO_S * 1000:.0f} ms) "
+                  f"mais lenta que a referência.")
+        for chave, campo, tempo_base, tempo_atual in regressoes:
+            print(f"⚠️ Regressão em {chave} {campo}: {tempo_base:.2f}s -> {tempo_atual:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
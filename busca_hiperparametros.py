@@ -0,0 +1,352 @@
+# ==============================================================================
+# busca_hiperparametros.py
+# Busca de hiperparâmetros por successive halving, com fronteira de Pareto
+# ==============================================================================
+
+# Em vez de treinar cada combinação com todos os dados, a busca começa com
+# muitos candidatos sorteados e poucos recursos (uma fração das linhas de treino
+# e das árvores) e, a cada rodada, promove só 1/eta deles para a rodada seguinte
+# com eta vezes mais recursos. Na última rodada os sobreviventes usam tudo.
+#
+# Cada avaliação mede três objetivos:
+#     wmae         erro nas semanas de validação (feriados pesam 5)
+#     tamanho_mb   tamanho do modelo (floresta compacta para o random forest)
+#     latencia_us  tempo de previsão por linha, em lote e com um núcleo
+#
+# A promoção ordena os candidatos pela fronteira de Pareto desses objetivos (e
+# depois pelo WMAE), para que modelos menores ou mais rápidos também cheguem ao
+# final. O resultado é a fronteira de Pareto da última rodada.
+#
+# A validação respeita o tempo: as últimas --semanas-validacao semanas ficam de
+# fora e o treino usa só as semanas anteriores. Com features de vendas, as
+# semanas de validação são previstas em sequência a partir da origem
+# (backtesting.prever_sem_vazamento), sem as vendas reais dessas semanas. As avaliações rodam em paralelo
+# (um núcleo por modelo) e cada uma é anotada em avaliacoes.jsonl assim que
+# termina; rodar de novo com o mesmo --nome continua de onde parou.
+#
+# Exemplos de uso:
+#     python busca_hiperparametros.py --nome rf
+#     python busca_hiperparametros.py --nome comparacao --modelos random_forest hist_gradient_boosting
+#     python busca_hiperparametros.py --nome rf --candidatos 81 --eta 3 --n-processos 16
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from threadpoolctl import threadpool_limits
+
+from backtesting import PESO_FERIADO, ordenar_por_data, prever_sem_vazamento
+from esquema_dados import carregar_dados_processados, localizar_dados_processados
+from features_vendas import usa_features_vendas
+from modelo_compacto import TIPO_NO
+from treinamento import BACKENDS, abrir_dados_compartilhados, criar_modelo, gravar_dados_compartilhados
+
+PASTA_BUSCAS = Path('buscas')
+
+# Valores sorteados para cada hiperparâmetro (um espaço por backend de
+# treinamento.BACKENDS: a busca mede as mesmas classes que o script 02 publica)
+ESPACOS_BUSCA = {
+    'random_forest': {
+        'n_estimators': [25, 50, 100, 200],
+        'max_depth': [10, 15, 20, 30, None],
+        'min_samples_leaf': [1, 2, 5, 10, 20],
+        'max_features': [1.0, 0.7, 0.5, 0.33],
+    },
+    'hist_gradient_boosting': {
+        'max_iter': [100, 200, 400, 800],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_leaf_nodes': [15, 31, 63, 127, 255],
+        'min_samples_leaf': [5, 10, 20, 50],
+        'l2_regularization': [0.0, 0.1, 1.0],
+    },
+}
+
+# Hiperparâmetro do número de árvores, reduzido junto com as linhas nas primeiras rodadas
+PARAMETRO_ARVORES = {'random_forest': 'n_estimators', 'hist_gradient_boosting': 'max_iter'}
+
+CANDIDATOS_PADRAO = 27
+ETA_PADRAO = 3
+SEMANAS_VALIDACAO_PADRAO = 8
+OBJETIVOS = ['wmae', 'tamanho_mb', 'latencia_us']
+
+
+# ==============================================================================
+# Candidatos e rodadas
+# ==============================================================================
+
+def sortear_candidatos(tipos_modelo, num_candidatos, semente=42):
+    """Sorteia combinações do espaço de busca, divididas igualmente entre os tipos de modelo."""
+    gerador = np.random.default_rng(semente)
+    candidatos = []
+    for i in range(num_candidatos):
+        tipo = tipos_modelo[i % len(tipos_modelo)]
+        parametros = {nome: valores[gerador.integers(len(valores))] for nome, valores in ESPACOS_BUSCA[tipo].items()}
+        # Tipos numpy não vão para o JSON
+        parametros = {nome: (valor.item() if hasattr(valor, 'item') else valor) for nome, valor in parametros.items()}
+        candidatos.append({'candidato': i, 'modelo': tipo, 'parametros': parametros})
+    return candidatos
+
+
+def numero_de_rodadas(num_candidatos, eta):
+    """Rodadas até restar no máximo eta candidatos (a última usa todos os recursos)."""
+    rodadas = 1
+    while num_candidatos > eta:
+        num_candidatos = int(np.ceil(num_candidatos / eta))
+        rodadas += 1
+    return rodadas
+
+
+def fracao_da_rodada(rodada, num_rodadas, eta):
+    """Fração das linhas de treino (e das árvores) usada em cada rodada."""
+    return float(eta ** (rodada - num_rodadas + 1))
+
+
+def fronteira_pareto(avaliacoes, objetivos=OBJETIVOS):
+    """Nível de Pareto de cada avaliação (0 = não dominada), com todos os objetivos a minimizar."""
+    valores = np.array([[avaliacao[objetivo] for objetivo in objetivos] for avaliacao in avaliacoes])
+    niveis = np.full(len(valores), -1)
+    restantes = np.arange(len(valores))
+    nivel = 0
+    while len(restantes):
+        sub = valores[restantes]
+        # Uma avaliação é dominada se outra é <= em tudo e < em algum objetivo
+        domina = (sub[:, None, :] <= sub[None, :, :]).all(axis=2) & (sub[:, None, :] < sub[None, :, :]).any(axis=2)
+        nao_dominadas = ~domina.any(axis=0)
+        niveis[restantes[nao_dominadas]] = nivel
+        restantes = restantes[~nao_dominadas]
+        nivel += 1
+    return niveis
+
+
+def promover(avaliacoes, quantidade):
+    """Escolhe os candidatos da próxima rodada: menor nível de Pareto e, em seguida, menor WMAE."""
+    niveis = fronteira_pareto(avaliacoes)
+    ordem = sorted(range(len(avaliacoes)), key=lambda i: (niveis[i], avaliacoes[i]['wmae']))
+    return [avaliacoes[i]['candidato'] for i in ordem[:quantidade]]
+
+
+# ==============================================================================
+# Avaliação (executada nos processos)
+# ==============================================================================
+
+_DADOS_PROCESSO = {}
+
+
+def _abrir_dados(pasta):
+    """
+    Inicializador de cada processo: abre os arrays compartilhados uma única vez
+    e limita o processo a uma thread. O gradient boosting usa OpenMP, que por
+    padrão ocupa todos os núcleos em cada processo; o limite também vale para o
+    BLAS. Assim o tempo de fit e a latência de todos os modelos são de um núcleo.
+    """
+    _DADOS_PROCESSO.update(abrir_dados_compartilhados(pasta))
+    # Sem o bloco 'with': o limite vale até o processo terminar
+    _DADOS_PROCESSO['limite_threads'] = threadpool_limits(limits=1)
+
+
+def tamanho_modelo_mb(modelo):
+    """Tamanho no formato de deploy: floresta compacta (random forest) ou pickle (demais)."""
+    if isinstance(modelo, RandomForestRegressor):
+        num_nos = sum(estimador.tree_.node_count for estimador in modelo.estimators_)
+        return num_nos * (TIPO_NO.itemsize + np.dtype(np.float32).itemsize) / 1024**2
+    return len(pickle.dumps(modelo)) / 1024**2
+
+
+def _avaliar(candidato, rodada, fracao, linhas, semente):
+    """Treina um candidato com a fração de linhas/árvores da rodada e mede os três objetivos."""
+    X, y, colunas = _DADOS_PROCESSO['X'], _DADOS_PROCESSO['y'], _DADOS_PROCESSO['colunas']
+    fim_treino, fim_validacao = linhas
+
+    # Mesma amostra para todos os candidatos da rodada (comparação justa)
+    if fracao < 1:
+        gerador = np.random.default_rng(semente + rodada)
+        amostra = np.sort(gerador.choice(fim_treino, int(fim_treino * fracao), replace=False))
+        X_treino, y_treino = X[amostra], y[amostra]
+    else:
+        X_treino, y_treino = X[:fim_treino], y[:fim_treino]
+
+    tipo = candidato['modelo']
+    parametros = dict(candidato['parametros'])
+    arvores = PARAMETRO_ARVORES[tipo]
+    parametros[arvores] = max(5, int(round(parametros[arvores] * fracao)))
+    if tipo == 'random_forest':
+        parametros['n_jobs'] = 1
+    # Os parâmetros não sorteados são os de deploy (treinamento.PARAMETROS_BACKENDS)
+    modelo = criar_modelo(tipo, random_state=semente, **parametros)
+
+    inicio = time.perf_counter()
+    modelo.fit(X_treino, y_treino)
+    tempo_fit = time.perf_counter() - inicio
+
+    X_validacao = X[fim_treino:fim_validacao]
+    inicio = time.perf_counter()
+    previsao = modelo.predict(X_validacao)
+    tempo_predict = time.perf_counter() - inicio
+    if usa_features_vendas(colunas):
+        # As features de vendas da validação usam vendas reais além da 1ª semana:
+        # o erro vem da previsão recursiva a partir da origem, como no backtesting.
+        # A latência continua sendo a do predict em lote, medida acima.
+        previsao = prever_sem_vazamento(modelo, X, y, colunas, {'linhas_teste': (fim_treino, fim_validacao)})
+
+    erro = np.abs(previsao - y[fim_treino:fim_validacao])
+    peso = np.where(X_validacao[:, colunas.index('IsHoliday')] > 0, PESO_FERIADO, 1)
+    return {
+        'candidato': candidato['candidato'],
+        'rodada': rodada,
+        'fracao': fracao,
+        'modelo': tipo,
+        'parametros': candidato['parametros'],
+        'arvores_usadas': parametros[arvores],
+        'linhas_treino': len(X_treino),
+        'wmae': float((erro * peso).sum() / peso.sum()),
+        'mae': float(erro.mean()),
+        'tamanho_mb': tamanho_modelo_mb(modelo),
+        'latencia_us': tempo_predict / len(X_validacao) * 1e6,
+        'tempo_fit_s': tempo_fit,
+    }
+
+
+# ==============================================================================
+# Execução da busca
+# ==============================================================================
+
+def _ler_avaliacoes(caminho):
+    if not caminho.exists():
+        return {}
+    avaliacoes = {}
+    for linha in caminho.read_text(encoding='utf-8').splitlines():
+        if linha.strip():
+            avaliacao = json.loads(linha)
+            avaliacoes[(avaliacao['candidato'], avaliacao['rodada'])] = avaliacao
+    return avaliacoes
+
+
+def executar_busca(df, pasta_busca, tipos_modelo=('random_forest',), num_candidatos=CANDIDATOS_PADRAO,
+                   eta=ETA_PADRAO, semanas_validacao=SEMANAS_VALIDACAO_PADRAO, n_processos=None, semente=42):
+    """
+    Roda (ou continua) a busca gravada em 'pasta_busca' e devolve a lista de
+    avaliações da última rodada com a coluna 'pareto' (nível 0 = fronteira).
+    """
+    pasta_busca = Path(pasta_busca)
+    pasta_busca.mkdir(parents=True, exist_ok=True)
+    configuracao = {'modelos': list(tipos_modelo), 'candidatos': num_candidatos, 'eta': eta,
+                    'semanas_validacao': semanas_validacao, 'semente': semente, 'linhas': len(df)}
+    caminho_configuracao = pasta_busca / 'configuracao.json'
+    if caminho_configuracao.exists():
+        anterior = json.loads(caminho_configuracao.read_text(encoding='utf-8'))
+        if anterior != configuracao:
+            raise ValueError(f"A busca em '{pasta_busca}' foi iniciada com outra configuração: {anterior}")
+    caminho_configuracao.write_text(json.dumps(configuracao, indent=2), encoding='utf-8')
+
+    caminho_avaliacoes = pasta_busca / 'avaliacoes.jsonl'
+    concluidas = _ler_avaliacoes(caminho_avaliacoes)
+    if concluidas:
+        print(f"[INFO] Continuando a busca: {len(concluidas)} avaliações já concluídas.")
+
+    # Validação temporal: as últimas semanas ficam de fora do treino
+    df_ordenado, datas = ordenar_por_data(df)
+    semanas = np.unique(datas)
+    fim_treino = int(np.searchsorted(datas, semanas[-semanas_validacao]))
+    linhas = (fim_treino, len(df_ordenado))
+
+    candidatos = {c['candidato']: c for c in sortear_candidatos(list(tipos_modelo), num_candidatos, semente)}
+    num_rodadas = numero_de_rodadas(num_candidatos, eta)
+    n_processos = n_processos or os.cpu_count()
+
+    pasta_dados = tempfile.mkdtemp(prefix='busca_')
+    try:
+        gravar_dados_compartilhados(df_ordenado, pasta_dados)
+        del df_ordenado
+        with ProcessPoolExecutor(max_workers=n_processos, initializer=_abrir_dados,
+                                 initargs=(pasta_dados,)) as executor, \
+                open(caminho_avaliacoes, 'a', encoding='utf-8') as arquivo:
+            vivos = sorted(candidatos)
+            for rodada in range(num_rodadas):
+                fracao = fracao_da_rodada(rodada, num_rodadas, eta)
+                pendentes = [c for c in vivos if (c, rodada) not in concluidas]
+                print(f"[INFO] Rodada {rodada + 1}/{num_rodadas}: {len(vivos)} candidatos com "
+                      f"{fracao:.0%} das linhas e das árvores ({len(vivos) - len(pendentes)} já avaliados).")
+
+                futuros = [executor.submit(_avaliar, candidatos[c], rodada, fracao, linhas, semente)
+                           for c in pendentes]
+                for futuro in as_completed(futuros):
+                    avaliacao = futuro.result()
+                    concluidas[(avaliacao['candidato'], rodada)] = avaliacao
+                    # Uma linha por avaliação, gravada na hora: é o que permite retomar a busca
+                    arquivo.write(json.dumps(avaliacao) + '\n')
+                    arquivo.flush()
+
+                avaliacoes = [concluidas[(c, rodada)] for c in vivos]
+                if rodada < num_rodadas - 1:
+                    vivos = sorted(promover(avaliacoes, int(np.ceil(len(vivos) / eta))))
+    finally:
+        shutil.rmtree(pasta_dados, ignore_errors=True)
+
+    niveis = fronteira_pareto(avaliacoes)
+    for avaliacao, nivel in zip(avaliacoes, niveis):
+        avaliacao['pareto'] = int(nivel)
+    return sorted(avaliacoes, key=lambda a: (a['pareto'], a['wmae']))
+
+
+def salvar_fronteira(avaliacoes, pasta_busca):
+    """Grava a fronteira de Pareto (nível 0) em JSON e a última rodada completa em CSV."""
+    pasta_busca = Path(pasta_busca)
+    fronteira = [a for a in avaliacoes if a['pareto'] == 0]
+    (pasta_busca / 'pareto.json').write_text(json.dumps(fronteira, indent=2), encoding='utf-8')
+    df_final = pd.DataFrame(avaliacoes)
+    df_final['parametros'] = df_final['parametros'].map(json.dumps)
+    df_final.to_csv(pasta_busca / 'rodada_final.csv', index=False)
+    return pasta_busca / 'pareto.json'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca de hiperparâmetros por successive halving.")
+    parser.add_argument('--nome', default='busca', help="Nome da busca (pasta em buscas/); repita para continuar.")
+    parser.add_argument('--modelos', nargs='+', choices=sorted(BACKENDS), default=['random_forest'])
+    parser.add_argument('--candidatos', type=int, default=CANDIDATOS_PADRAO)
+    parser.add_argument('--eta', type=int, default=ETA_PADRAO, help="Fator de corte entre rodadas.")
+    parser.add_argument('--semanas-validacao', type=int, default=SEMANAS_VALIDACAO_PADRAO)
+    parser.add_argument('--n-processos', type=int, help="Avaliações em paralelo (padrão: todos os núcleos).")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    print("--- Iniciando a busca de hiperparâmetros ---")
+    caminho_dados = localizar_dados_processados()
+    try:
+        df = carregar_dados_processados(caminho=caminho_dados)
+    except FileNotFoundError:
+        print(f"❌ ERRO: O arquivo {caminho_dados} não foi encontrado.")
+        print("   - Por favor, execute o script 01_preparacao_dados.py primeiro.")
+        exit()
+
+    pasta_busca = PASTA_BUSCAS / args.nome
+    inicio = time.perf_counter()
+    try:
+        avaliacoes = executar_busca(df, pasta_busca, args.modelos, args.candidatos, args.eta,
+                                    args.semanas_validacao, args.n_processos, args.semente)
+    except ValueError as e:
+        print(f"❌ ERRO: {e}")
+        print("   - Use outro --nome para iniciar uma busca nova.")
+        exit()
+    print(f"[OK] Busca concluída em {time.perf_counter() - inicio:.1f}s")
+
+    caminho_fronteira = salvar_fronteira(avaliacoes, pasta_busca)
+    print("\n--- Fronteira de Pareto (WMAE x tamanho x latência) ---")
+    for avaliacao in avaliacoes:
+        if avaliacao['pareto'] == 0:
+            print(f"   WMAE ${avaliacao['wmae']:,.2f} | {avaliacao['tamanho_mb']:,.1f} MB | "
+                  f"{avaliacao['latencia_us']:,.1f} µs/linha | {avaliacao['modelo']} {avaliacao['parametros']}")
+    print(f"✅ Fronteira salva em: {caminho_fronteira}")
+
+
+if __name__ == '__main__':
+    main()
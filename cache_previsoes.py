@@ -0,0 +1,116 @@
+# ==============================================================================
+# cache_previsoes.py
+# Cache LRU com expiração (TTL) das previsões do simulador
+# ==============================================================================
+
+# No dashboard, muitas sessões pedem a mesma combinação de loja, departamento,
+# semana, feriado e temperatura, e cada clique chamava modelo.predict de novo.
+# O cache guarda a previsão de cada vetor de features já consultado:
+#
+#     chave     versão do modelo + vetor de features normalizado (float64, na
+#               ordem de feature_names_in_) + tipo ('previsao' ou 'intervalos')
+#     valor     previsão (ou, em 'intervalos', a tupla média, P10, P50, P90) e
+#               instante em que foi calculada
+#
+# Uma única instância é compartilhada entre as sessões (st.cache_resource), por
+# isso o acesso é protegido por um lock. Quando o app carrega outro arquivo de
+# modelo, a versão muda e todas as entradas são descartadas.
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Previsões guardadas no máximo (as usadas há mais tempo saem primeiro)
+CAPACIDADE_PADRAO = 10_000
+# Segundos até uma previsão expirar
+TTL_PADRAO_S = 3600
+
+
+def normalizar_features(linha):
+    """Vetor de features como bytes float64: o mesmo valor gera a mesma chave (True == 1, 70 == 70.0)."""
+    return np.asarray(linha, dtype=np.float64).ravel().tobytes()
+
+
+class CachePrevisoes:
+    """Cache LRU + TTL de previsões, com contadores de acertos e falhas."""
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO, ttl_s=TTL_PADRAO_S):
+        self.capacidade = capacidade
+        self.ttl_s = ttl_s
+        self.versao_modelo = None
+        self.acertos = 0
+        self.falhas = 0
+        self.expiradas = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def definir_versao(self, versao_modelo):
+        """Registra a versão do modelo em uso; se ela mudou, esvazia o cache."""
+        with self._lock:
+            if versao_modelo != self.versao_modelo:
+                self._entradas.clear()
+                self.versao_modelo = versao_modelo
+
+    def obter(self, chave):
+        """Previsão guardada para a chave, ou None (falha ou entrada expirada)."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and time.monotonic() - entrada[1] > self.ttl_s:
+                del self._entradas[chave]
+                self.expiradas += 1
+                entrada = None
+            if entrada is None:
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return entrada[0]
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._entradas[chave] = (valor, time.monotonic())
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+
+    def _chave(self, df_linha, tipo):
+        # O tipo separa as entradas: um acerto sempre devolve o valor pedido
+        return (self.versao_modelo, normalizar_features(df_linha.to_numpy(dtype=np.float64)), tipo)
+
+    def prever(self, modelo, df_linha):
+        """Previsão de uma linha de features, consultando o cache antes de chamar modelo.predict."""
+        chave = self._chave(df_linha, 'previsao')
+        previsao = self.obter(chave)
+        if previsao is None:
+            previsao = float(modelo.predict(df_linha)[0])
+            self.guardar(chave, previsao)
+        return previsao
+
+    def prever_com_intervalos(self, modelo, df_linha):
+        """
+        Tupla (média, P10, P50, P90) de uma linha de features: um único percurso
+        da floresta dá a previsão e os quantis.
+        """
+        # Importado aqui: leva o scikit-learn junto, e o cache é criado ao abrir o app
+        from intervalos_previsao import prever_com_intervalos
+        chave = self._chave(df_linha, 'intervalos')
+        previsao = self.obter(chave)
+        if previsao is None:
+            intervalo = prever_com_intervalos(modelo, df_linha).iloc[0]
+            previsao = tuple(float(intervalo[coluna]) for coluna in ('Weekly_Sales', 'P10', 'P50', 'P90'))
+            self.guardar(chave, previsao)
+        return previsao
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'entradas': len(self._entradas),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'expiradas': self.expiradas,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+                'versao_modelo': self.versao_modelo,
+            }
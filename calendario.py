@@ -0,0 +1,115 @@
+# ==============================================================================
+# calendario.py
+# Dimensão de datas: partes do calendário e semanas de feriado, por chave inteira
+# ==============================================================================
+
+# Ano, Mes, Dia e Semana_do_Ano eram calculados com dt.year/dt.month/dt.day e
+# dt.isocalendar() sobre cada linha da tabela de fatos, embora existam só
+# algumas centenas de datas distintas. Aqui as features de data são calculadas
+# uma única vez por dia, em uma tabela (dimensão) indexada pela chave inteira
+# da data (dias desde 1970-01-01), e cada linha só busca a sua posição:
+#
+#     chave  ->  Ano, Mes, Dia, Semana_do_Ano,
+#                Super_Bowl, Labor_Day, Thanksgiving, Christmas,
+#                Semanas_Ate_Feriado, Semanas_Desde_Feriado
+#
+# As semanas do Walmart terminam na sexta-feira (a coluna Date). Os feriados
+# marcam a semana que contém o evento, com as mesmas regras para qualquer ano:
+# Super Bowl no primeiro domingo de fevereiro, Labor Day na primeira
+# segunda-feira de setembro, Thanksgiving na quarta quinta-feira de novembro e
+# Christmas em 25/12 (as semanas de IsHoliday do train.csv de 2010 a 2012).
+#
+# O preparo (script 01) e as consultas do simulador/servidor usam a mesma
+# tabela, então as features de treino e de previsão são sempre as mesmas.
+
+import functools
+import numpy as np
+import pandas as pd
+
+COLUNAS_CALENDARIO = ['Ano', 'Mes', 'Dia', 'Semana_do_Ano']
+COLUNAS_FERIADOS = ['Super_Bowl', 'Labor_Day', 'Thanksgiving', 'Christmas']
+COLUNAS_DISTANCIA_FERIADO = ['Semanas_Ate_Feriado', 'Semanas_Desde_Feriado']
+COLUNAS_DIMENSAO_DATAS = [*COLUNAS_CALENDARIO, *COLUNAS_FERIADOS, *COLUNAS_DISTANCIA_FERIADO]
+
+# Anos cobertos pela dimensão padrão (datas fora dela estendem a tabela por anos inteiros)
+ANO_INICIO_PADRAO = 2010
+ANO_FIM_PADRAO = 2014
+# Dia da semana em que as semanas do Walmart terminam (segunda = 0)
+DIA_FIM_SEMANA = 4
+
+
+def chave_data(datas):
+    """Chave inteira de cada data: dias desde 1970-01-01 (int32)."""
+    return np.asarray(pd.to_datetime(datas), dtype='datetime64[D]').astype(np.int32)
+
+
+def fim_da_semana(datas):
+    """Sexta-feira que encerra a semana de cada data (a própria data, se já for sexta)."""
+    datas = pd.DatetimeIndex(datas)
+    return datas + pd.to_timedelta((DIA_FIM_SEMANA - datas.dayofweek) % 7, unit='D')
+
+
+def datas_feriados(ano):
+    """Data de cada feriado do Walmart no ano, na ordem de COLUNAS_FERIADOS."""
+    def primeiro(mes, dia_semana):
+        inicio = pd.Timestamp(ano, mes, 1)
+        return inicio + pd.Timedelta(days=(dia_semana - inicio.dayofweek) % 7)
+
+    return [
+        primeiro(2, 6),
+        primeiro(9, 0),
+        primeiro(11, 3) + pd.Timedelta(weeks=3),
+        pd.Timestamp(ano, 12, 25),
+    ]
+
+
+@functools.cache
+def tabela_calendario(ano_inicio=ANO_INICIO_PADRAO, ano_fim=ANO_FIM_PADRAO):
+    """
+    Dimensão de datas com um dia por linha, de 1º de janeiro de 'ano_inicio' a
+    31 de dezembro de 'ano_fim'. Calculada uma vez por processo (functools.cache).
+    """
+    dias = pd.date_range(f'{ano_inicio}-01-01', f'{ano_fim}-12-31', freq='D')
+    semanas = fim_da_semana(dias)
+    dimensao = pd.DataFrame({
+        'Ano': dias.year.astype('int16'),
+        'Mes': dias.month.astype('int8'),
+        'Dia': dias.day.astype('int8'),
+        'Semana_do_Ano': dias.isocalendar().week.to_numpy().astype('int8'),
+    }, index=pd.Index(chave_data(dias), name='Chave_Data'))
+
+    # Semanas de feriado de um ano antes a um ano depois: as distâncias nas
+    # pontas da tabela também encontram o feriado anterior e o seguinte
+    feriados = {coluna: [] for coluna in COLUNAS_FERIADOS}
+    for ano in range(ano_inicio - 1, ano_fim + 2):
+        for coluna, data in zip(COLUNAS_FERIADOS, datas_feriados(ano)):
+            feriados[coluna].append(fim_da_semana([data])[0])
+    for coluna, semanas_feriado in feriados.items():
+        dimensao[coluna] = semanas.isin(semanas_feriado)
+
+    todas = np.sort(chave_data([semana for semanas_feriado in feriados.values() for semana in semanas_feriado]))
+    chaves_semana = chave_data(semanas)
+    proximo = todas[np.searchsorted(todas, chaves_semana, side='left')]
+    anterior = todas[np.searchsorted(todas, chaves_semana, side='right') - 1]
+    dimensao['Semanas_Ate_Feriado'] = ((proximo - chaves_semana) // 7).astype('int8')
+    dimensao['Semanas_Desde_Feriado'] = ((chaves_semana - anterior) // 7).astype('int8')
+    return dimensao
+
+
+def features_calendario(datas):
+    """
+    Features de data de cada linha (alinhadas com 'datas'), buscadas na dimensão
+    pela chave inteira: o custo é o de indexar um array, não o de recalcular
+    o calendário por linha.
+    """
+    chaves = chave_data(datas)
+    ano_inicio, ano_fim = ANO_INICIO_PADRAO, ANO_FIM_PADRAO
+    if len(chaves):
+        ano_inicio = min(ano_inicio, pd.Timestamp(chaves.min(), unit='D').year)
+        ano_fim = max(ano_fim, pd.Timestamp(chaves.max(), unit='D').year)
+    dimensao = tabela_calendario(ano_inicio, ano_fim)
+
+    posicoes = chaves - dimensao.index[0]
+    indice = datas.index if isinstance(datas, pd.Series) else None
+    return pd.DataFrame({coluna: dimensao[coluna].to_numpy()[posicoes] for coluna in COLUNAS_DIMENSAO_DATAS},
+                        index=indice)
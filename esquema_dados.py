@@ -0,0 +1,221 @@
+# ==============================================================================
+# esquema_dados.py
+# Tipos compactos e leitura/escrita colunar (Parquet) dos dados processados
+# ==============================================================================
+
+# Este módulo é compartilhado pelo script de preparação (01), pelo script de
+# treinamento (02) e pelo dashboard (app.py). Ele centraliza os caminhos dos
+# artefatos e os tipos de cada coluna, para que todos leiam os dados da mesma forma.
+
+import json
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+CAMINHO_PARQUET_WALMART = Path('data/walmart_dados_processados.parquet')
+CAMINHO_CSV_WALMART = Path('data/walmart_dados_processados.csv')
+# Saída do modo incremental: um arquivo por loja (Store=<n>/parte.parquet)
+CAMINHO_PARTICIONADO_WALMART = Path('data/walmart_particionado')
+# Saída do modo por loja (um arquivo por Store, preparados em paralelo)
+CAMINHO_POR_LOJA_WALMART = Path('data/walmart_por_loja')
+# Ponteiro para os dados processados em uso (gravado pelo script 01, lido por localizar_dados_processados)
+CAMINHO_DADOS_ATIVOS = Path('data/dados_processados_ativos.json')
+# Modelo treinado pelo script 02
+CAMINHO_MODELO_WALMART = Path('models/random_forest_regressor_v1.joblib')
+# Mesma floresta exportada em arrays planos (float32, memory-mapped), mais rápida em lotes pequenos
+CAMINHO_MODELO_COMPACTO_WALMART = Path('models/random_forest_compacto_v1')
+# Registro de modelos por segmento (tipo de loja, loja ou departamento), com modelo global de reserva
+CAMINHO_REGISTRO_SEGMENTOS = Path('models/segmentos')
+# Backend alternativo: gradient boosting por histogramas (script 02 com --backend hist_gradient_boosting)
+CAMINHO_MODELO_HISTOGRAMA_WALMART = Path('models/hist_gradient_boosting_v1')
+# Ponteiro para o modelo ativo (gravado pelo script 02, lido por localizar_modelo)
+CAMINHO_MODELO_ATIVO = Path('models/versoes/ativo.json')
+# Features exógenas de cada loja por data, consultadas pelo simulador do app
+CAMINHO_INDICE_LOJAS = Path('data/indice_lojas.parquet')
+# Tabelas pequenas, pré-agregadas, lidas pelo dashboard no lugar da tabela completa
+PASTA_AGREGADOS_WALMART = Path('data/walmart_agregados')
+# E-commerce UK: CSV original, dados limpos (preparacao_ecommerce.py) e agregados da aba 3
+CAMINHO_CSV_UK = Path('data/online_retail_II.csv')
+CAMINHO_PARQUET_UK = Path('data/ecommerce_uk_processado.parquet')
+PASTA_AGREGADOS_UK = Path('data/ecommerce_uk_agregados')
+
+# Tipos mínimos de cada coluna do dataframe processado.
+# Store (1-45), Dept (1-99), Mes, Dia e Semana_do_Ano cabem em int8; os valores
+# contínuos usam float32, que tem precisão de sobra para vendas e indicadores.
+TIPOS_WALMART = {
+    'Store': 'int8',
+    'Dept': 'int8',
+    'Weekly_Sales': 'float32',
+    'IsHoliday': 'bool',
+    'Size': 'int32',
+    'Temperature': 'float32',
+    'Fuel_Price': 'float32',
+    'MarkDown1': 'float32',
+    'MarkDown2': 'float32',
+    'MarkDown3': 'float32',
+    'MarkDown4': 'float32',
+    'MarkDown5': 'float32',
+    'CPI': 'float32',
+    'Unemployment': 'float32',
+    'Ano': 'int16',
+    'Mes': 'int8',
+    'Dia': 'int8',
+    'Semana_do_Ano': 'int8',
+    # Dimensão de datas (ver calendario.py)
+    'Super_Bowl': 'bool',
+    'Labor_Day': 'bool',
+    'Thanksgiving': 'bool',
+    'Christmas': 'bool',
+    'Semanas_Ate_Feriado': 'int8',
+    'Semanas_Desde_Feriado': 'int8',
+    'Type_A': 'int8',
+    'Type_B': 'int8',
+    'Type_C': 'int8',
+    # Features de histórico de vendas (opcionais, ver features_vendas.py)
+    'Vendas_Lag_1': 'float32',
+    'Vendas_Lag_2': 'float32',
+    'Vendas_Lag_52': 'float32',
+    'Vendas_Media_4': 'float32',
+    'Vendas_Desvio_4': 'float32',
+    'Vendas_Media_13': 'float32',
+    'Vendas_Desvio_13': 'float32',
+    'Vendas_Media_52': 'float32',
+    'Vendas_Desvio_52': 'float32',
+    'Vendas_Razao_Anual': 'float32',
+}
+
+
+# Tipos do E-commerce UK (online_retail_II.csv). Textos repetidos viram categorias.
+TIPOS_UK = {
+    'Invoice': 'category',
+    'StockCode': 'category',
+    'Description': 'category',
+    'Quantity': 'int32',
+    'Price': 'float32',
+    'Customer ID': 'float32',
+    'Country': 'category',
+}
+
+# Tipos aplicados já na leitura dos CSVs originais (train, stores e features),
+# para que nenhuma etapa da preparação trabalhe com int64/float64/texto.
+TIPOS_CSV_WALMART = {
+    **{coluna: tipo for coluna, tipo in TIPOS_WALMART.items() if coluna in (
+        'Store', 'Dept', 'Weekly_Sales', 'IsHoliday', 'Size', 'Temperature', 'Fuel_Price',
+        'MarkDown1', 'MarkDown2', 'MarkDown3', 'MarkDown4', 'MarkDown5', 'CPI', 'Unemployment')},
+    'Type': 'category',
+}
+
+
+def aplicar_tipos_compactos(df, tipos=TIPOS_WALMART):
+    """
+    Converte as colunas conhecidas do dataframe para os tipos compactos. Só as
+    colunas com tipo diferente são convertidas; sem nenhuma, o próprio df volta.
+    """
+    tipos_diferentes = {coluna: tipo for coluna, tipo in tipos.items()
+                        if coluna in df.columns and df[coluna].dtype != tipo}
+    return df.astype(tipos_diferentes) if tipos_diferentes else df
+
+
+def memoria_mb(df):
+    """Memória ocupada pelo dataframe (incluindo textos e categorias), em MB."""
+    return df.memory_usage(deep=True).sum() / 1024**2
+
+
+def relatorio_memoria(etapa, df, relatorio=None):
+    """
+    Imprime a memória do dataframe em uma etapa e, se 'relatorio' (lista) for
+    passado, acrescenta a medição a ele.
+    """
+    medicao = {'etapa': etapa, 'linhas': len(df), 'colunas': df.shape[1], 'memoria_mb': round(memoria_mb(df), 2)}
+    print(f"[MEMÓRIA] {etapa}: {medicao['memoria_mb']:,.2f} MB ({medicao['linhas']} linhas x {medicao['colunas']} colunas)")
+    if relatorio is not None:
+        relatorio.append(medicao)
+    return medicao
+
+
+def salvar_dados_processados(df, caminho=CAMINHO_PARQUET_WALMART, exportar_csv=False):
+    """Salva o dataframe processado em Parquet (e, opcionalmente, também em CSV)."""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+
+    df = aplicar_tipos_compactos(df)
+    df.to_parquet(caminho, index=False, engine='pyarrow', compression='zstd')
+
+    if exportar_csv:
+        df.to_csv(caminho.with_suffix('.csv'), index=False)
+    return caminho
+
+
+def registrar_dados_processados(caminho, caminho_ativo=CAMINHO_DADOS_ATIVOS):
+    """Aponta os dados processados em uso para 'caminho' (a troca do arquivo é atômica)."""
+    caminho_ativo = Path(caminho_ativo)
+    caminho_ativo.parent.mkdir(parents=True, exist_ok=True)
+    ponteiro = {'caminho': Path(caminho).as_posix(), 'gravado_em': datetime.now().isoformat(timespec='seconds')}
+    temporario = caminho_ativo.with_suffix('.tmp')
+    temporario.write_text(json.dumps(ponteiro, indent=2), encoding='utf-8')
+    temporario.replace(caminho_ativo)
+    return ponteiro
+
+
+def localizar_dados_processados(caminho_ativo=CAMINHO_DADOS_ATIVOS):
+    """
+    Escolhe o artefato de dados processados: o gravado pela última execução do
+    script 01 (o Parquet único, a pasta do modo incremental ou a do modo por
+    loja), registrado em CAMINHO_DADOS_ATIVOS. Sem o ponteiro (dados gerados por
+    versões anteriores), o primeiro existente nessa mesma ordem. A data dos
+    arquivos não entra na escolha: uma pasta antiga de outro modo não é usada
+    só por ter sido modificada depois.
+    """
+    caminho_ativo = Path(caminho_ativo)
+    if caminho_ativo.exists():
+        caminho = Path(json.loads(caminho_ativo.read_text(encoding='utf-8'))['caminho'])
+        if caminho.exists():
+            return caminho
+        print(f"⚠️ Os dados processados {caminho} não existem mais; usando a ordem padrão.")
+    return next((caminho for caminho in (CAMINHO_PARQUET_WALMART, CAMINHO_PARTICIONADO_WALMART,
+                                         CAMINHO_POR_LOJA_WALMART) if caminho.exists()),
+                CAMINHO_PARQUET_WALMART)
+
+
+def carregar_dados_processados(colunas=None, caminho=None):
+    """
+    Carrega os dados processados lendo apenas as colunas pedidas.
+
+    O Parquet é lido com memory-mapping (arquivo único ou pasta particionada);
+    se ele ainda não existir, usa o CSV antigo como alternativa. Em todos os
+    casos, as colunas saem com os tipos compactos de TIPOS_WALMART.
+    """
+    caminho = Path(caminho) if caminho is not None else localizar_dados_processados()
+    # Os tipos do esquema são garantidos na leitura: arquivos gravados por versões
+    # anteriores (ou partições com tipos diferentes) são convertidos aqui
+    if caminho.is_dir():
+        # partitioning=None: as colunas Store/Date do nome das pastas não são
+        # adicionadas, pois os próprios arquivos já trazem Store e as features de data.
+        return aplicar_tipos_compactos(pd.read_parquet(caminho, columns=colunas, engine='pyarrow',
+                                                       memory_map=True, partitioning=None))
+    if caminho.exists():
+        return aplicar_tipos_compactos(pd.read_parquet(caminho, columns=colunas, engine='pyarrow', memory_map=True))
+
+    caminho_csv = caminho.with_suffix('.csv')
+    if caminho_csv.exists():
+        df = pd.read_csv(caminho_csv, usecols=colunas)
+        return aplicar_tipos_compactos(df)
+
+    raise FileNotFoundError(f"Nenhum arquivo de dados processados encontrado em '{caminho}' ou '{caminho_csv}'.")
+
+
+def salvar_agregados(agregados, pasta=PASTA_AGREGADOS_WALMART):
+    """Salva cada tabela agregada (dicionário nome -> dataframe) em seu próprio Parquet."""
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    for nome, df_agregado in agregados.items():
+        df_agregado.to_parquet(pasta / f'{nome}.parquet', index=False, engine='pyarrow')
+    return pasta
+
+
+def carregar_agregado(nome, pasta=PASTA_AGREGADOS_WALMART):
+    """Carrega uma das tabelas agregadas (ex.: 'vendas_por_mes')."""
+    caminho = Path(pasta) / f'{nome}.parquet'
+    if not caminho.exists():
+        raise FileNotFoundError(f"Tabela agregada '{caminho}' não encontrada.")
+    return pd.read_parquet(caminho, engine='pyarrow')
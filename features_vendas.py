@@ -0,0 +1,244 @@
+# ==============================================================================
+# features_vendas.py
+# Histórico de vendas de cada série (Store, Dept) como features: lags e janelas
+# ==============================================================================
+
+# Para cada linha (Store, Dept, Date), usando apenas as semanas anteriores a ela:
+#
+#     Vendas_Lag_1/2/52          vendas de 1, 2 e 52 semanas antes
+#     Vendas_Media_4/13/52       média das últimas 4, 13 e 52 semanas
+#     Vendas_Desvio_4/13/52      desvio padrão das mesmas janelas
+#     Vendas_Razao_Anual         média das últimas 4 semanas / mesma janela um ano antes
+#
+# As séries não são percorridas uma a uma. O histórico vira uma matriz densa
+# séries x semanas (NaN onde a série não tem venda); cada série é uma linha
+# contígua. Os lags são leituras deslocadas nessa matriz, e as janelas saem de
+# somas acumuladas (valores, quadrados e contagens) ao longo das semanas, então
+# o custo não depende do tamanho da janela nem do número de séries.
+#
+# Semanas sem histórico suficiente (início da série, lacunas) recebem 0 nas
+# vendas e no desvio e 1 na razão anual, para que a matriz do modelo não tenha
+# nulos em nenhum dos caminhos de previsão (app, lote, floresta compacta).
+#
+# Atualização incremental: basta guardar as últimas SEMANAS_HISTORICO semanas
+# de cada série. Semanas novas são calculadas a partir desse recorte, sem reler
+# o histórico completo.
+#
+# Horizonte: as features só existem até uma semana depois do histórico (o
+# Vendas_Lag_1 da semana seguinte é a última venda conhecida). Mais adiante, os
+# lags e as janelas ficariam vazios e seriam preenchidos com 0, valores que o
+# modelo nunca viu no treino. Consultas avulsas além de HORIZONTE_MAXIMO são
+# recusadas (verificar_horizonte); grades de várias semanas são previstas de
+# forma recursiva (prever_recursivo), usando as previsões de cada semana como
+# histórico das seguintes.
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+DEFASAGENS = (1, 2, 52)
+JANELAS = (4, 13, 52)
+JANELA_RAZAO_ANUAL = 4
+# Maior distância olhada para trás: a razão anual usa as semanas t-56 a t-53
+SEMANAS_HISTORICO = 52 + JANELA_RAZAO_ANUAL
+
+# Semanas depois da última semana do histórico em que as features ainda vêm só de vendas reais
+HORIZONTE_MAXIMO = 1
+
+COLUNAS_FEATURES_VENDAS = [
+    *(f'Vendas_Lag_{k}' for k in DEFASAGENS),
+    *(f'Vendas_{estatistica}_{janela}' for janela in JANELAS for estatistica in ('Media', 'Desvio')),
+    'Vendas_Razao_Anual',
+]
+
+
+def datas_das_linhas(df):
+    """Data de cada linha: a coluna 'Date' ou, no dataframe processado, Ano/Mes/Dia."""
+    if 'Date' in df.columns:
+        return pd.to_datetime(df['Date'])
+    return pd.to_datetime(dict(year=df['Ano'], month=df['Mes'], day=df['Dia']))
+
+
+def _historico_de(df_processado):
+    """Reduz o dataframe processado às colunas do histórico de vendas."""
+    return pd.DataFrame({
+        'Store': df_processado['Store'].to_numpy(),
+        'Dept': df_processado['Dept'].to_numpy(),
+        'Date': datas_das_linhas(df_processado).to_numpy(),
+        'Weekly_Sales': df_processado['Weekly_Sales'].to_numpy(dtype=np.float64),
+    })
+
+
+def calcular_features_vendas(df_historico, df_consulta):
+    """
+    Calcula as features de vendas para cada linha de 'df_consulta' (Store, Dept e
+    Date ou Ano/Mes/Dia) a partir de 'df_historico' (Store, Dept, Date, Weekly_Sales).
+
+    Só entram semanas estritamente anteriores à da consulta, então a própria
+    venda da linha nunca vaza para as suas features. Devolve um dataframe float32
+    com o mesmo índice de 'df_consulta'.
+    """
+    datas_consulta = datas_das_linhas(df_consulta).to_numpy(dtype='datetime64[ns]')
+    datas_historico = df_historico['Date'].to_numpy(dtype='datetime64[ns]')
+
+    # Código da série: Store e Dept combinados em um inteiro, fatorado nas duas tabelas juntas
+    chave_consulta = df_consulta['Store'].to_numpy(np.int64) * 1000 + df_consulta['Dept'].to_numpy(np.int64)
+    chave_historico = df_historico['Store'].to_numpy(np.int64) * 1000 + df_historico['Dept'].to_numpy(np.int64)
+    # Séries que não aparecem na consulta não precisam entrar na matriz
+    no_historico = np.isin(chave_historico, chave_consulta)
+    chave_historico, datas_historico = chave_historico[no_historico], datas_historico[no_historico]
+    vendas_historico = df_historico['Weekly_Sales'].to_numpy(np.float64)[no_historico]
+
+    codigos, series = pd.factorize(np.concatenate([chave_consulta, chave_historico]))
+    serie_consulta, serie_historico = codigos[:len(chave_consulta)], codigos[len(chave_consulta):]
+
+    # Índice da semana de cada linha a partir da primeira data das duas tabelas
+    base = min(datas_consulta.min(), datas_historico.min()) if len(datas_historico) else datas_consulta.min()
+    semana_consulta = (datas_consulta - base) // np.timedelta64(7, 'D')
+    semana_historico = (datas_historico - base) // np.timedelta64(7, 'D')
+    num_semanas = int(max(semana_consulta.max(), semana_historico.max() if len(semana_historico) else 0)) + 1
+
+    # Matriz séries x semanas e somas acumuladas com uma coluna de zeros à esquerda:
+    # a soma das semanas [a, b) de uma série é acumulada[b] - acumulada[a]
+    matriz = np.full((len(series), num_semanas), np.nan)
+    matriz[serie_historico, semana_historico] = vendas_historico
+    presente = ~np.isnan(matriz)
+    valores = np.where(presente, matriz, 0.0)
+    soma = np.zeros((len(series), num_semanas + 1))
+    soma_quadrados = np.zeros_like(soma)
+    contagem = np.zeros_like(soma)
+    np.cumsum(valores, axis=1, out=soma[:, 1:])
+    np.cumsum(valores ** 2, axis=1, out=soma_quadrados[:, 1:])
+    np.cumsum(presente, axis=1, out=contagem[:, 1:])
+
+    def janela(inicio, fim):
+        """Soma, soma dos quadrados e contagem das semanas [inicio, fim) de cada consulta."""
+        inicio, fim = np.clip(inicio, 0, None), np.clip(fim, 0, None)
+        return tuple(acumulada[serie_consulta, fim] - acumulada[serie_consulta, inicio]
+                     for acumulada in (soma, soma_quadrados, contagem))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        features = {}
+        for k in DEFASAGENS:
+            anterior = semana_consulta - k
+            features[f'Vendas_Lag_{k}'] = np.where(anterior >= 0, matriz[serie_consulta, np.clip(anterior, 0, None)], np.nan)
+
+        for tamanho in JANELAS:
+            total, total_quadrados, n = janela(semana_consulta - tamanho, semana_consulta)
+            media = total / n
+            variancia = np.clip(total_quadrados - total * media, 0, None) / (n - 1)
+            features[f'Vendas_Media_{tamanho}'] = media
+            features[f'Vendas_Desvio_{tamanho}'] = np.where(n > 1, np.sqrt(variancia), np.nan)
+
+        total, _, n = janela(semana_consulta - 52 - JANELA_RAZAO_ANUAL, semana_consulta - 52)
+        media_ano_anterior = total / n
+        razao = features[f'Vendas_Media_{JANELA_RAZAO_ANUAL}'] / media_ano_anterior
+        features['Vendas_Razao_Anual'] = np.where(media_ano_anterior > 0, razao, 1.0)
+
+    df_features = pd.DataFrame(features, index=df_consulta.index)[COLUNAS_FEATURES_VENDAS]
+    df_features = df_features.fillna({'Vendas_Razao_Anual': 1.0}).fillna(0.0)
+    return df_features.astype(np.float32)
+
+
+def verificar_horizonte(df_historico, datas, horizonte=HORIZONTE_MAXIMO):
+    """
+    Levanta ValueError se alguma data estiver mais de 'horizonte' semanas depois
+    da última semana do histórico: para ela, as features de vendas não existem.
+    """
+    ultima = pd.Timestamp(df_historico['Date'].max())
+    datas = pd.to_datetime(pd.Series(np.asarray(datas).ravel()))
+    semanas = (datas - ultima) // pd.Timedelta(weeks=1)
+    if len(semanas) and semanas.max() > horizonte:
+        raise ValueError(
+            f"A data {datas.max():%Y-%m-%d} está {semanas.max()} semanas depois da última semana do histórico de "
+            f"vendas ({ultima:%Y-%m-%d}); as features de vendas só existem até {horizonte} semana(s) à frente. "
+            f"Para horizontes maiores, use a previsão recursiva (previsao_lote.py)."
+        )
+
+
+def prever_recursivo(prever, X, df_historico):
+    """
+    Prevê as linhas de X semana a semana, em ordem cronológica. As features de
+    vendas de cada semana são calculadas com o histórico mais as previsões das
+    semanas anteriores, então nenhuma semana fica além de HORIZONTE_MAXIMO.
+
+    'prever' recebe a matriz de uma semana (colunas de X, com as features de
+    vendas preenchidas) e devolve um array ou um dataframe com Weekly_Sales
+    (e outras colunas, como os intervalos). Devolve um dataframe alinhado com X.
+    """
+    datas = datas_das_linhas(X).to_numpy(dtype='datetime64[ns]')
+    # Cada semana depende da anterior: depois do histórico, nenhuma pode faltar
+    ultima = np.datetime64(pd.Timestamp(df_historico['Date'].max()), 'ns')
+    semanas_futuras = np.unique((datas[datas > ultima] - ultima) // np.timedelta64(7, 'D'))
+    faltando = sorted(set(range(1, int(semanas_futuras.max()) + 1)) - set(semanas_futuras.tolist())) \
+        if len(semanas_futuras) else []
+    if faltando:
+        raise ValueError(f"A previsão recursiva precisa de todas as semanas depois do histórico "
+                         f"({pd.Timestamp(ultima):%Y-%m-%d}); faltam as semanas {faltando} à frente.")
+
+    colunas_vendas = [coluna for coluna in COLUNAS_FEATURES_VENDAS if coluna in X.columns]
+    partes = []
+    for data in np.unique(datas):
+        verificar_horizonte(df_historico, [data])
+        X_semana = X[datas == data].copy()
+        features = calcular_features_vendas(df_historico, X_semana)
+        for coluna in colunas_vendas:
+            X_semana[coluna] = features[coluna].astype(X_semana[coluna].dtype)
+
+        resultado = prever(X_semana)
+        if not isinstance(resultado, pd.DataFrame):
+            resultado = pd.DataFrame({'Weekly_Sales': np.asarray(resultado, dtype=np.float64)}, index=X_semana.index)
+        partes.append(resultado)
+
+        # Vendas reais já existentes têm prioridade sobre as previstas (keep='first')
+        previstas = pd.DataFrame({
+            'Store': X_semana['Store'].to_numpy(np.int64), 'Dept': X_semana['Dept'].to_numpy(np.int64),
+            'Date': data, 'Weekly_Sales': resultado['Weekly_Sales'].to_numpy(np.float64),
+        })
+        df_historico = recortar_historico(pd.concat([df_historico, previstas], ignore_index=True).drop_duplicates(
+            subset=['Store', 'Dept', 'Date'], keep='first'))
+    return pd.concat(partes).reindex(X.index)
+
+
+def recortar_historico(df_historico, semanas=SEMANAS_HISTORICO):
+    """Mantém só as últimas 'semanas' semanas, o suficiente para calcular as features das próximas."""
+    limite = df_historico['Date'].max() - pd.Timedelta(weeks=semanas)
+    return df_historico[df_historico['Date'] > limite].reset_index(drop=True)
+
+
+def adicionar_features_vendas(df_processado, df_historico=None):
+    """
+    Acrescenta as features de vendas ao dataframe processado.
+
+    'df_historico' é o recorte salvo na execução anterior (modo incremental) ou
+    None para calcular só com as linhas recebidas. Devolve (dataframe com as
+    features, histórico atualizado e recortado para a próxima execução).
+    """
+    df_novo = _historico_de(df_processado)
+    if df_historico is not None:
+        # Semanas reenviadas substituem as versões antigas do recorte
+        df_novo = pd.concat([df_historico, df_novo], ignore_index=True).drop_duplicates(
+            subset=['Store', 'Dept', 'Date'], keep='last'
+        )
+    features = calcular_features_vendas(df_novo, df_processado)
+    df_processado = pd.concat([df_processado.drop(columns=COLUNAS_FEATURES_VENDAS, errors='ignore'), features],
+                              axis=1)
+    return df_processado, recortar_historico(df_novo)
+
+
+def carregar_historico_vendas(caminho):
+    """Lê o recorte do histórico salvo (ou None, se ainda não existir)."""
+    caminho = Path(caminho)
+    return pd.read_parquet(caminho, engine='pyarrow') if caminho.exists() else None
+
+
+def salvar_historico_vendas(df_historico, caminho):
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    df_historico.to_parquet(caminho, index=False, engine='pyarrow')
+    return caminho
+
+
+def usa_features_vendas(colunas_modelo):
+    """Indica se o modelo foi treinado com as features de vendas."""
+    return any(coluna in COLUNAS_FEATURES_VENDAS for coluna in colunas_modelo)
@@ -0,0 +1,123 @@
+# ==============================================================================
+# indice_lojas.py
+# Índice compacto das features exógenas de cada loja, por data
+# ==============================================================================
+
+# O simulador precisa de Size, Fuel_Price, MarkDowns, CPI, Unemployment e Type_*
+# da loja escolhida. Em vez de filtrar a tabela de fatos inteira a cada previsão,
+# o script 01 gera um índice pequeno (uma linha por loja e semana, vindo de
+# stores.csv + features.csv já imputado) e o app consulta só a faixa da loja.
+
+import numpy as np
+import pandas as pd
+from esquema_dados import CAMINHO_INDICE_LOJAS, TIPOS_CSV_WALMART, aplicar_tipos_compactos
+from pipeline_preparacao import (
+    CAMINHO_FEATURES, CAMINHO_LOJAS, CAMINHO_MEDIANAS, COLUNAS_MARKDOWN, COLUNAS_TIPO,
+    calcular_medianas_por_loja, carregar_medianas, codificar_tipo_loja, imputar_features,
+)
+
+# Features que o modelo usa e que não são informadas pelo usuário no simulador
+COLUNAS_FEATURES_EXTERNAS = ['Fuel_Price', *COLUNAS_MARKDOWN, 'CPI', 'Unemployment']
+COLUNAS_EXOGENAS = ['Size', *COLUNAS_FEATURES_EXTERNAS, *COLUNAS_TIPO]
+
+
+def construir_indice_lojas(df_stores, df_features_tratado):
+    """Une lojas e features imputadas em uma tabela (Store, Date) -> features exógenas."""
+    df_lojas = codificar_tipo_loja(df_stores, sorted(df_stores['Type'].unique()))
+    df_indice = pd.merge(df_features_tratado[['Store', 'Date', *COLUNAS_FEATURES_EXTERNAS]], df_lojas,
+                         on='Store', how='inner')
+    df_indice = df_indice[['Store', 'Date', *COLUNAS_EXOGENAS]].sort_values(['Store', 'Date'])
+    return aplicar_tipos_compactos(df_indice.reset_index(drop=True))
+
+
+def gerar_indice_lojas(caminho_lojas=CAMINHO_LOJAS, caminho_features=CAMINHO_FEATURES,
+                       usar_medianas_salvas=False):
+    """
+    Lê stores.csv e features.csv, aplica a imputação do pipeline e monta o índice.
+
+    Com 'usar_medianas_salvas', usa as medianas persistidas pelo modo incremental,
+    para que o índice seja imputado da mesma forma que as partições.
+    """
+    df_stores = pd.read_csv(caminho_lojas, dtype=TIPOS_CSV_WALMART)
+    df_features = pd.read_csv(caminho_features, parse_dates=['Date'], dtype=TIPOS_CSV_WALMART)
+    if usar_medianas_salvas:
+        medianas = carregar_medianas(df_features, CAMINHO_MEDIANAS)
+    else:
+        medianas = calcular_medianas_por_loja(df_features)
+    return construir_indice_lojas(df_stores, imputar_features(df_features, medianas))
+
+
+def salvar_indice_lojas(df_indice, caminho=CAMINHO_INDICE_LOJAS):
+    """Salva o índice em Parquet (algumas centenas de KB para todas as lojas)."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    df_indice.to_parquet(caminho, index=False, engine='pyarrow')
+    return caminho
+
+
+class IndiceLojas:
+    """
+    Consulta as features exógenas de uma loja em uma data sem varrer a tabela de fatos.
+
+    As linhas ficam ordenadas por (Store, Date) em um único array; cada loja é
+    uma faixa contígua localizada por dicionário, e a data é encontrada por busca
+    binária dentro da faixa (poucas centenas de semanas por loja).
+    """
+
+    def __init__(self, df_indice):
+        df_indice = df_indice.sort_values(['Store', 'Date'])
+        lojas = df_indice['Store'].to_numpy()
+        inicios = np.flatnonzero(np.r_[True, lojas[1:] != lojas[:-1]])
+        fins = np.r_[inicios[1:], len(lojas)]
+
+        self.colunas = list(COLUNAS_EXOGENAS)
+        self._faixas = {int(lojas[i]): (int(i), int(f)) for i, f in zip(inicios, fins)}
+        self._datas = df_indice['Date'].to_numpy(dtype='datetime64[ns]')
+        self._valores = df_indice[self.colunas].to_numpy(dtype=np.float64)
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_INDICE_LOJAS):
+        """Lê o índice salvo pelo script 01; se não existir, gera a partir dos CSVs."""
+        if caminho.exists():
+            return cls(pd.read_parquet(caminho, engine='pyarrow'))
+        return cls(gerar_indice_lojas())
+
+    @property
+    def lojas(self):
+        return sorted(self._faixas)
+
+    def faixa(self, coluna):
+        """Menor e maior valor de uma coluna exógena entre todas as lojas e semanas."""
+        valores = self._valores[:, self.colunas.index(coluna)]
+        return float(valores.min()), float(valores.max())
+
+    def consultar(self, loja, data=None):
+        """
+        Devolve um dicionário coluna -> valor com as features em vigor na data.
+
+        Sem data, devolve os valores mais recentes da loja. Datas fora do período
+        disponível usam a primeira ou a última semana conhecida.
+        """
+        inicio, fim = self._faixas[int(loja)]
+        if data is None:
+            posicao = fim - 1
+        else:
+            data = np.datetime64(pd.Timestamp(data), 'ns')
+            posicao = inicio + np.searchsorted(self._datas[inicio:fim], data, side='right') - 1
+            posicao = min(max(posicao, inicio), fim - 1)
+        return dict(zip(self.colunas, self._valores[posicao]))
+
+    def consultar_lote(self, lojas, datas):
+        """
+        Versão vetorizada de 'consultar' para várias linhas (lojas e datas
+        alinhadas). Devolve um dataframe com as colunas exógenas, uma busca
+        binária por loja distinta.
+        """
+        lojas = np.asarray(lojas, dtype=np.int64)
+        datas = np.asarray(pd.to_datetime(datas), dtype='datetime64[ns]')
+        posicoes = np.empty(len(lojas), dtype=np.int64)
+        for loja in np.unique(lojas):
+            inicio, fim = self._faixas[int(loja)]
+            linhas = lojas == loja
+            posicao = inicio + np.searchsorted(self._datas[inicio:fim], datas[linhas], side='right') - 1
+            posicoes[linhas] = np.clip(posicao, inicio, fim - 1)
+        return pd.DataFrame(self._valores[posicoes], columns=self.colunas)
@@ -0,0 +1,213 @@
+# ==============================================================================
+# instrumentacao.py
+# Tempo, CPU, pico de memória e linhas de cada etapa, com relatório em JSON
+# ==============================================================================
+
+# Os scripts 01 e 02 e o app mediam pouco mais que prints de shape e
+# df.info(). Aqui cada etapa (leitura dos CSVs, imputação, merges, features,
+# One-Hot, fit, predict, cargas do dashboard) é envolvida por um bloco 'with'
+# que registra:
+#
+#     tempo_s / cpu_s                 tempo de relógio e de CPU da etapa
+#     tempo_proprio_s / cpu_proprio_s o mesmo, sem as etapas aninhadas nela
+#     pico_rss_mb / rss_final_mb      pico e valor final da memória do processo
+#     linhas                          linhas do resultado (quando informado)
+#
+# Ao final, o relatório vai para relatorios_execucao/<nome>_<data>.json, com
+# as versões e a máquina; comparando dois relatórios, dá para ver qual etapa
+# ficou mais lenta numa execução noturna. Com perfil=True, a execução inteira
+# também é registrada pelo cProfile em um .prof ao lado do JSON (aberto com
+# 'python -m pstats', snakeviz ou flameprof, que desenha o flamegraph).
+#
+# Exemplo:
+#     relatorio = RelatorioExecucao('preparacao')
+#     with relatorio.etapa('carregar') as medicao:
+#         df = pd.read_csv(...)
+#         medicao['linhas'] = len(df)
+#     relatorio.salvar()
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PASTA_RELATORIOS = Path('relatorios_execucao')
+
+# Intervalo entre as leituras de memória durante uma fase (segundos)
+INTERVALO_AMOSTRAGEM = 0.01
+
+
+# ==============================================================================
+# Medição de memória
+# ==============================================================================
+
+def memoria_rss_mb():
+    """Memória residente atual do processo em MB (psutil, /proc ou None se indisponível)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024**2
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class MonitorMemoria:
+    """Lê a memória do processo em uma thread separada e guarda o maior valor visto."""
+
+    def __init__(self, intervalo=INTERVALO_AMOSTRAGEM):
+        self.intervalo = intervalo
+        self.pico = memoria_rss_mb()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            atual = memoria_rss_mb()
+            if atual is not None and atual > self.pico:
+                self.pico = atual
+
+    def __enter__(self):
+        if self.pico is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._parar.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        atual = memoria_rss_mb()
+        if atual is not None and atual > self.pico:
+            self.pico = atual
+
+
+# ==============================================================================
+# Relatório de uma execução
+# ==============================================================================
+
+def contar_linhas(resultado):
+    """Linhas de um dataframe/array (ou da primeira tabela de uma tupla); None se não houver."""
+    if isinstance(resultado, tuple):
+        resultado = resultado[0] if resultado else None
+    return len(resultado) if hasattr(resultado, '__len__') and hasattr(resultado, 'shape') else None
+
+
+def informacoes_execucao():
+    """Versões e máquina, para que relatórios de execuções diferentes sejam comparáveis."""
+    return {
+        'python': sys.version.split()[0],
+        'plataforma': platform.platform(),
+        'num_cpus': os.cpu_count(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'medicao_memoria': 'psutil' if psutil is not None else 'proc',
+        'argumentos': sys.argv[1:],
+    }
+
+
+class RelatorioExecucao:
+    """
+    Coleta as medições das etapas de uma execução e grava o relatório em JSON.
+
+    Etapas podem ser aninhadas (ex.: o 'fit' dentro de 'treino'): cada uma
+    guarda o tempo total e o tempo próprio, descontadas as etapas internas.
+    """
+
+    def __init__(self, nome, perfil=False, pasta=PASTA_RELATORIOS, exibir=True):
+        self.nome = nome
+        self.pasta = Path(pasta)
+        self.exibir = exibir
+        self.etapas = []
+        self.inicio = datetime.now()
+        self._inicio_relogio = time.perf_counter()
+        self._inicio_cpu = time.process_time()
+        self._abertas = []
+        self._perfil = cProfile.Profile() if perfil else None
+        if self._perfil is not None:
+            self._perfil.enable()
+
+    @contextmanager
+    def etapa(self, nome, linhas=None):
+        """
+        Mede o bloco 'with' como uma etapa. O dicionário entregue pelo 'with'
+        pode receber 'linhas' (e outros campos) durante a etapa.
+        """
+        medicao = {'etapa': nome, 'nivel': len(self._abertas), 'linhas': linhas}
+        internas = {'tempo_s': 0.0, 'cpu_s': 0.0}
+        self._abertas.append(internas)
+        inicio_cpu = time.process_time()
+        inicio = time.perf_counter()
+        try:
+            with MonitorMemoria() as monitor:
+                yield medicao
+        finally:
+            medicao['tempo_s'] = time.perf_counter() - inicio
+            medicao['cpu_s'] = time.process_time() - inicio_cpu
+            medicao['tempo_proprio_s'] = medicao['tempo_s'] - internas['tempo_s']
+            medicao['cpu_proprio_s'] = medicao['cpu_s'] - internas['cpu_s']
+            medicao['pico_rss_mb'] = monitor.pico
+            medicao['rss_final_mb'] = memoria_rss_mb()
+            self._abertas.pop()
+            if self._abertas:
+                self._abertas[-1]['tempo_s'] += medicao['tempo_s']
+                self._abertas[-1]['cpu_s'] += medicao['cpu_s']
+            self.etapas.append(medicao)
+            if self.exibir:
+                linhas = f", {medicao['linhas']:,} linhas" if medicao['linhas'] is not None else ''
+                pico = f", pico {medicao['pico_rss_mb']:,.0f} MB" if medicao['pico_rss_mb'] is not None else ''
+                print(f"[TEMPO] {'  ' * medicao['nivel']}{nome}: {medicao['tempo_s']:.2f}s "
+                      f"(CPU {medicao['cpu_s']:.2f}s{pico}{linhas})")
+
+    def medir(self, nome, funcao, *args, **kwargs):
+        """Executa funcao(*args, **kwargs) como uma etapa, contando as linhas do resultado."""
+        with self.etapa(nome) as medicao:
+            resultado = funcao(*args, **kwargs)
+            medicao['linhas'] = contar_linhas(resultado)
+        return resultado
+
+    def tabela(self):
+        """Etapas em um dataframe, na ordem em que terminaram."""
+        return pd.DataFrame(self.etapas, columns=['etapa', 'nivel', 'linhas', 'tempo_s', 'cpu_s', 'tempo_proprio_s',
+                                                  'cpu_proprio_s', 'pico_rss_mb', 'rss_final_mb'])
+
+    def resumo(self):
+        """Dicionário completo do relatório (ambiente, totais e etapas)."""
+        return {
+            'execucao': self.nome,
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'tempo_total_s': time.perf_counter() - self._inicio_relogio,
+            'cpu_total_s': time.process_time() - self._inicio_cpu,
+            'pico_rss_mb': max((m['pico_rss_mb'] for m in self.etapas if m['pico_rss_mb'] is not None), default=None),
+            'ambiente': informacoes_execucao(),
+            'etapas': self.etapas,
+        }
+
+    def salvar(self, extras=None):
+        """Grava o JSON (e o .prof, se o perfil estiver ativo) e devolve o caminho do JSON."""
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        nome = f"{self.nome}_{self.inicio:%Y%m%d_%H%M%S}"
+        resumo = self.resumo()
+        if extras:
+            resumo.update(extras)
+        if self._perfil is not None:
+            self._perfil.disable()
+            caminho_perfil = self.pasta / f'{nome}.prof'
+            self._perfil.dump_stats(caminho_perfil)
+            resumo['perfil'] = str(caminho_perfil)
+        caminho = self.pasta / f'{nome}.json'
+        caminho.write_text(json.dumps(resumo, indent=2, default=str), encoding='utf-8')
+        return caminho
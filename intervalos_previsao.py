@@ -0,0 +1,91 @@
+# ==============================================================================
+# intervalos_previsao.py
+# Quantis (P10/P50/P90) da previsão a partir das previsões de cada árvore
+# ==============================================================================
+
+# A floresta devolve só a média das árvores. A dispersão entre as árvores já
+# diz quanto a previsão é incerta para aquela linha, sem treinar outro modelo:
+#
+#     X (linhas)  ->  prever_por_arvore  ->  matriz linhas x árvores
+#                                         ->  média (Weekly_Sales) e quantis (P10, P50, P90)
+#
+# A matriz vem do percurso vetorizado da FlorestaCompacta (cada árvore desce com
+# todas as linhas do bloco de uma vez), sem chamar cada estimador. Um
+# RandomForestRegressor do .joblib é convertido uma vez para o formato compacto
+# (em memória) e o registro por segmento calcula os quantis com a floresta de
+# cada segmento. O gradient boosting por histogramas soma árvores em sequência
+# e não tem previsões independentes por árvore, então não oferece intervalos.
+#
+# As faixas medem a discordância entre as árvores, não são intervalos
+# calibrados: servem para comparar a incerteza entre lojas, datas e cenários.
+#
+# Exemplo:
+#     df_intervalos = prever_com_intervalos(modelo, X)   # Weekly_Sales, P10, P50, P90
+
+import weakref
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from modelo_compacto import FlorestaCompacta
+from modelos_segmentados import RegistroModelos, segmentos_das_linhas
+
+# Coluna de saída -> quantil entre as previsões das árvores
+QUANTIS_PADRAO = {'P10': 0.1, 'P50': 0.5, 'P90': 0.9}
+
+# Florestas do scikit-learn já convertidas, para não refazer a conversão a cada chamada
+_florestas_convertidas = weakref.WeakKeyDictionary()
+
+
+def suporta_intervalos(modelo):
+    """True se o modelo tem previsões independentes por árvore (florestas e registro por segmento)."""
+    return isinstance(modelo, (FlorestaCompacta, RegistroModelos, RandomForestRegressor, ExtraTreesRegressor))
+
+
+def floresta_compacta(modelo):
+    """A própria FlorestaCompacta ou a conversão (feita uma vez) de uma floresta do scikit-learn."""
+    if isinstance(modelo, FlorestaCompacta):
+        return modelo
+    if modelo not in _florestas_convertidas:
+        _florestas_convertidas[modelo] = FlorestaCompacta.de_modelo(modelo)
+    floresta = _florestas_convertidas[modelo]
+    floresta.n_jobs = modelo.n_jobs
+    return floresta
+
+
+def quantis_da_floresta(floresta, X, quantis=QUANTIS_PADRAO):
+    """
+    Média e quantis das previsões das árvores para cada linha de X, a partir de
+    uma única matriz linhas x árvores. Devolve (média, matriz linhas x quantis).
+    """
+    por_arvore = floresta.prever_por_arvore(X)
+    media = por_arvore.mean(axis=1, dtype=np.float64)
+    valores = np.quantile(por_arvore, list(quantis.values()), axis=1).T
+    return media, valores
+
+
+def prever_com_intervalos(modelo, X, quantis=QUANTIS_PADRAO):
+    """
+    Dataframe com Weekly_Sales (média das árvores, a mesma previsão de
+    modelo.predict) e uma coluna por quantil (P10, P50, P90), alinhado com X.
+    """
+    if not suporta_intervalos(modelo):
+        raise ValueError(f"O modelo {type(modelo).__name__} não tem previsões por árvore para calcular intervalos.")
+
+    if isinstance(modelo, RegistroModelos):
+        # Mesmo despacho de RegistroModelos.predict: um percurso por grupo de linhas do segmento
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(X, columns=modelo.feature_names_in_)
+        X = X[list(modelo.feature_names_in_)]
+        segmentos = segmentos_das_linhas(X, modelo.segmentacao)
+        media = np.empty(len(X), dtype=np.float64)
+        valores = np.empty((len(X), len(quantis)), dtype=np.float64)
+        for segmento in np.unique(segmentos):
+            linhas = segmentos == segmento
+            media[linhas], valores[linhas] = quantis_da_floresta(modelo.modelo_do_segmento(segmento),
+                                                                 X[linhas], quantis)
+    else:
+        media, valores = quantis_da_floresta(floresta_compacta(modelo), X, quantis)
+
+    df_intervalos = pd.DataFrame(valores, columns=list(quantis), index=X.index if isinstance(X, pd.DataFrame) else None)
+    df_intervalos.insert(0, 'Weekly_Sales', media)
+    return df_intervalos
@@ -0,0 +1,348 @@
+# ==============================================================================
+# modelo_compacto.py
+# Floresta aleatória em arrays planos: exportação, carregamento e previsão
+# ==============================================================================
+
+# O .joblib guarda cada árvore como um objeto do scikit-learn, com 64 bytes por
+# nó e valores em float64, e precisa ser desserializado inteiro em cada processo.
+# Aqui todas as árvores viram dois arrays numpy contíguos, com um elemento por nó:
+#
+#     nos.npy    registro de 14 bytes com os campos usados para descer na árvore:
+#                limiar (float32), esquerda/direita (int32, índice global do
+#                filho; folhas apontam para si mesmas) e feature (int16)
+#     valor.npy  previsão da folha (float32)
+#
+# Os arrays são salvos como .npy sem compressão (o ganho de tamanho vem dos tipos
+# compactos): um arquivo comprimido teria de ser descomprimido em cada processo,
+# e estes são abertos com memory-mapping, então vários processos (workers do
+# dashboard, servidor) compartilham as mesmas páginas do arquivo, em modo
+# somente leitura. O treino completo ativa a floresta compacta para esses
+# consumidores de lotes pequenos (ver localizar_modelo).
+#
+# Um valor ausente (NaN) desce sempre para a direita, como no scikit-learn
+# sem suporte a NaN ('x <= limiar' é falso): os dois percursos usam a mesma
+# comparação, então a previsão não depende do tamanho do bloco.
+
+import functools
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from esquema_dados import (CAMINHO_MODELO_ATIVO, CAMINHO_MODELO_COMPACTO_WALMART, CAMINHO_MODELO_HISTOGRAMA_WALMART,
+                           CAMINHO_MODELO_WALMART, CAMINHO_REGISTRO_SEGMENTOS)
+from modelo_histograma import GradientBoostingHistograma
+
+TIPO_NO = np.dtype([('limiar', '<f4'), ('esquerda', '<i4'), ('direita', '<i4'), ('feature', '<i2')])
+VERSAO_FORMATO = 1
+
+# Linhas percorridas por vez na previsão (cada bloco pode ir para uma thread)
+TAMANHO_BLOCO_PREVISAO = 8192
+# Blocos com menos linhas descem todas as árvores juntas: com poucas linhas, o
+# custo é o das chamadas ao numpy, e o percurso por árvore faria uma por nível
+# de cada árvore
+LINHAS_PERCURSO_CONJUNTO = 1024
+
+
+def _limiar_float32(limiar):
+    """
+    Converte os limiares para float32 sem mudar nenhuma decisão.
+
+    O scikit-learn compara X em float32 com o limiar em float64. Arredondar o
+    limiar para o maior float32 que não passa dele mantém 'x <= limiar'
+    idêntico para qualquer x representável em float32.
+    """
+    limiar32 = limiar.astype(np.float32)
+    acima = limiar32.astype(np.float64) > limiar
+    limiar32[acima] = np.nextafter(limiar32[acima], np.float32(-np.inf))
+    return limiar32
+
+
+def compactar_floresta(modelo, colunas=None):
+    """
+    Converte um RandomForestRegressor treinado para os arrays planos (nos,
+    valor) e os metadados do formato compacto, sem gravar nada.
+
+    'colunas' informa os nomes das features quando o modelo foi treinado com um
+    array numpy (sem feature_names_in_).
+    """
+    partes = {nome: [] for nome in ('esquerda', 'direita', 'feature', 'limiar', 'valor')}
+    raizes = []
+    deslocamento = 0
+    profundidade = 0
+    for estimador in modelo.estimators_:
+        arvore = estimador.tree_
+        ids = np.arange(arvore.node_count) + deslocamento
+        folha = arvore.children_left == -1
+
+        # Nas folhas, os dois filhos apontam para o próprio nó e o limiar é +inf:
+        # assim todas as linhas podem andar o mesmo número de passos, sem máscaras.
+        partes['esquerda'].append(np.where(folha, ids, arvore.children_left + deslocamento))
+        partes['direita'].append(np.where(folha, ids, arvore.children_right + deslocamento))
+        partes['feature'].append(np.where(folha, 0, arvore.feature))
+        partes['limiar'].append(np.where(folha, np.inf, arvore.threshold))
+        partes['valor'].append(arvore.value[:, 0, 0])
+
+        raizes.append(deslocamento)
+        deslocamento += arvore.node_count
+        profundidade = max(profundidade, arvore.max_depth)
+
+    nos = np.empty(deslocamento, dtype=TIPO_NO)
+    nos['limiar'] = _limiar_float32(np.concatenate(partes['limiar']))
+    nos['esquerda'] = np.concatenate(partes['esquerda'])
+    nos['direita'] = np.concatenate(partes['direita'])
+    nos['feature'] = np.concatenate(partes['feature'])
+    valor = np.concatenate(partes['valor']).astype(np.float32)
+
+    metadados = {
+        'versao_formato': VERSAO_FORMATO,
+        'tipo': 'random_forest',
+        'feature_names_in_': [str(coluna) for coluna in (modelo.feature_names_in_ if colunas is None else colunas)],
+        'raizes': raizes,
+        'profundidade_maxima': int(profundidade),
+        'num_nos': int(deslocamento),
+    }
+    return nos, valor, metadados
+
+
+def exportar_floresta(modelo, pasta=CAMINHO_MODELO_COMPACTO_WALMART, colunas=None):
+    """Salva um RandomForestRegressor treinado no formato de arrays planos."""
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    # Remove arquivos de uma exportação anterior
+    for arquivo in pasta.glob('*.npy'):
+        arquivo.unlink()
+
+    nos, valor, metadados = compactar_floresta(modelo, colunas)
+    np.save(pasta / 'nos.npy', nos)
+    np.save(pasta / 'valor.npy', valor)
+    (pasta / 'metadados.json').write_text(json.dumps(metadados, indent=2), encoding='utf-8')
+    return pasta
+
+
+class FlorestaCompacta:
+    """
+    Previsor da floresta exportada por 'exportar_floresta'.
+
+    Oferece o mesmo contrato usado pelo app (feature_names_in_, predict, n_jobs).
+    Em blocos grandes, cada árvore desce todas as linhas do bloco de uma vez
+    (um passo vetorizado por nível); em blocos pequenos, todas as árvores descem
+    juntas. Blocos de linhas podem ser divididos entre threads.
+    """
+
+    def __init__(self, nos, valor, metadados, n_jobs=None):
+        self.metadados = metadados
+        self.feature_names_in_ = np.array(metadados['feature_names_in_'], dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.raizes = np.asarray(metadados['raizes'], dtype=np.int32)
+        self.n_estimators = len(self.raizes)
+        self.profundidade_maxima = metadados['profundidade_maxima']
+        self.nos = nos
+        self.valor = valor
+        self.n_jobs = n_jobs
+
+    @classmethod
+    def carregar(cls, pasta=CAMINHO_MODELO_COMPACTO_WALMART, mmap=True):
+        """Abre a floresta; com 'mmap', os arrays são mapeados do disco em vez de copiados."""
+        pasta = Path(pasta)
+        metadados = json.loads((pasta / 'metadados.json').read_text(encoding='utf-8'))
+        modo = 'r' if mmap else None
+        nos = np.load(pasta / 'nos.npy', mmap_mode=modo)
+        valor = np.load(pasta / 'valor.npy', mmap_mode=modo)
+        return cls(nos, valor, metadados)
+
+    @classmethod
+    def de_modelo(cls, modelo, colunas=None):
+        """Floresta compacta em memória a partir de um RandomForestRegressor treinado."""
+        return cls(*compactar_floresta(modelo, colunas), n_jobs=getattr(modelo, 'n_jobs', None))
+
+    def set_params(self, **parametros):
+        """Aceita n_jobs, como os estimadores do scikit-learn."""
+        for nome, valor in parametros.items():
+            setattr(self, nome, valor)
+        return self
+
+    def _matriz(self, X):
+        """Reordena as colunas como no treino e converte para float32 contíguo."""
+        if isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names_in_)]
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    @functools.cached_property
+    def _arrays_percurso(self):
+        """
+        Campos dos nós em arrays contíguos, indexados pelo dobro do índice do nó:
+        o filho de '2 * no' é filhos[2 * no + vai_para_direita], já dobrado.
+        Calculados na primeira previsão com blocos grandes.
+        """
+        filhos = np.empty(2 * len(self.nos), dtype=np.intp)
+        filhos[0::2] = self.nos['esquerda']
+        filhos[1::2] = self.nos['direita']
+        return (2 * filhos, np.repeat(self.nos['feature'].astype(np.intp), 2),
+                np.repeat(np.asarray(self.nos['limiar']), 2))
+
+    def _percorrer_por_arvore(self, bloco):
+        """Desce o bloco inteiro em cada árvore, um nível por passo; devolve a previsão de cada par."""
+        filhos, feature, limiar = self._arrays_percurso
+        num_linhas, num_features = bloco.shape
+        valores = bloco.ravel()
+        # Posição do início de cada linha em 'valores'
+        base = np.arange(num_linhas, dtype=np.intp) * num_features
+        saida = np.empty((num_linhas, self.n_estimators), dtype=np.float32)
+        for arvore, raiz in enumerate(self.raizes):
+            nos = np.full(num_linhas, 2 * raiz, dtype=np.intp)
+            for _ in range(self.profundidade_maxima):
+                # ~(x <= limiar) e não x > limiar: NaN vai para a direita, como em _percorrer_bloco
+                vai_para_direita = ~(valores.take(base + feature.take(nos)) <= limiar.take(nos))
+                nos = filhos.take(nos + vai_para_direita)
+            saida[:, arvore] = self.valor.take(nos // 2)
+        return saida
+
+    def _percorrer_bloco(self, bloco):
+        """Desce todas as árvores para um bloco de linhas e devolve o índice da folha de cada par."""
+        num_linhas, num_features = bloco.shape
+        valores = bloco.ravel()
+        # Posição do início de cada linha em 'valores', repetida para cada árvore
+        base = np.repeat(np.arange(num_linhas, dtype=np.int64) * num_features, self.n_estimators)
+        nos = np.tile(self.raizes, num_linhas)
+        for _ in range(self.profundidade_maxima):
+            registro = self.nos.take(nos)
+            vai_para_esquerda = valores.take(base + registro['feature']) <= registro['limiar']
+            nos = np.where(vai_para_esquerda, registro['esquerda'], registro['direita'])
+        return nos.reshape(num_linhas, self.n_estimators)
+
+    def prever_por_arvore(self, X):
+        """Devolve uma matriz (linhas x árvores) com a previsão de cada árvore."""
+        X = self._matriz(X)
+        saida = np.empty((len(X), self.n_estimators), dtype=np.float32)
+
+        def prever_bloco(inicio):
+            bloco = X[inicio:inicio + TAMANHO_BLOCO_PREVISAO]
+            if len(bloco) < LINHAS_PERCURSO_CONJUNTO:
+                saida[inicio:inicio + len(bloco)] = self.valor.take(self._percorrer_bloco(bloco))
+            else:
+                saida[inicio:inicio + len(bloco)] = self._percorrer_por_arvore(bloco)
+
+        inicios = range(0, len(X), TAMANHO_BLOCO_PREVISAO)
+        num_threads = 1 if not self.n_jobs else (self.n_jobs if self.n_jobs > 0 else os.cpu_count())
+        if num_threads > 1 and len(inicios) > 1:
+            # O numpy libera o GIL nas leituras indexadas, então os blocos rodam em paralelo
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                list(executor.map(prever_bloco, inicios))
+        else:
+            for inicio in inicios:
+                prever_bloco(inicio)
+        return saida
+
+    def predict(self, X):
+        """Previsão da floresta: média das previsões das árvores."""
+        return self.prever_por_arvore(X).mean(axis=1, dtype=np.float64)
+
+
+# Arquivo gravado por último em cada formato de modelo: a data dele é a do modelo
+MARCADORES_MODELO = {
+    CAMINHO_REGISTRO_SEGMENTOS: CAMINHO_REGISTRO_SEGMENTOS / 'registro.json',
+    CAMINHO_MODELO_COMPACTO_WALMART: CAMINHO_MODELO_COMPACTO_WALMART / 'metadados.json',
+    CAMINHO_MODELO_HISTOGRAMA_WALMART: CAMINHO_MODELO_HISTOGRAMA_WALMART / 'metadados.json',
+    CAMINHO_MODELO_WALMART: CAMINHO_MODELO_WALMART,
+}
+
+
+# Variável de ambiente com o modelo usado quando nenhum caminho é passado
+# (pasta ou arquivo, ex.: models/random_forest_compacto_v1)
+VARIAVEL_MODELO = 'FORECAST_MODELO'
+# Sem ela e sem modelo ativo (treinos anteriores ao ponteiro), o primeiro
+# formato existente nesta ordem. Para lotes grandes (previsão em lote), o
+# .joblib vem antes da floresta compacta: o predict do scikit-learn é mais
+# rápido nesses lotes. Para lotes pequenos (app, servidor), a compacta vem
+# antes: ela prevê poucas linhas mais rápido, abre quase instantaneamente e é
+# compartilhada entre processos por memory-mapping.
+PREFERENCIA_MODELOS = [CAMINHO_MODELO_WALMART, CAMINHO_REGISTRO_SEGMENTOS, CAMINHO_MODELO_HISTOGRAMA_WALMART,
+                       CAMINHO_MODELO_COMPACTO_WALMART]
+PREFERENCIA_MODELOS_LOTES_PEQUENOS = [CAMINHO_MODELO_COMPACTO_WALMART, CAMINHO_MODELO_WALMART,
+                                      CAMINHO_REGISTRO_SEGMENTOS, CAMINHO_MODELO_HISTOGRAMA_WALMART]
+
+
+def ler_modelo_ativo(caminho_ativo=CAMINHO_MODELO_ATIVO):
+    """Conteúdo do ponteiro do modelo ativo (caminho, versão, data), ou None se ele não existe."""
+    caminho_ativo = Path(caminho_ativo)
+    if not caminho_ativo.exists():
+        return None
+    return json.loads(caminho_ativo.read_text(encoding='utf-8'))
+
+
+def localizar_modelo(lotes_pequenos=False, caminho_ativo=CAMINHO_MODELO_ATIVO):
+    """
+    Escolhe o modelo de previsão: o da variável FORECAST_MODELO, se definida;
+    senão o modelo ativo gravado pelo script 02 (versoes_modelo.ativar_modelo);
+    senão o primeiro existente em PREFERENCIA_MODELOS. A data dos arquivos não
+    entra na escolha: copiar ou regravar um artefato não troca o modelo.
+
+    Com 'lotes_pequenos' (app e servidor), usa a versão compacta do modelo
+    ativo, quando ele tem uma, e a ordem PREFERENCIA_MODELOS_LOTES_PEQUENOS.
+    """
+    configurado = os.environ.get(VARIAVEL_MODELO)
+    if configurado:
+        return Path(configurado)
+    ativo = ler_modelo_ativo(caminho_ativo)
+    if ativo is not None:
+        opcoes = [ativo.get('caminho_compacto'), ativo['caminho']] if lotes_pequenos else [ativo['caminho']]
+        for caminho in map(Path, filter(None, opcoes)):
+            if MARCADORES_MODELO.get(caminho, caminho).exists():
+                return caminho
+        print(f"⚠️ O modelo ativo {ativo['caminho']} não existe mais; usando a ordem padrão de modelos.")
+    preferencia = PREFERENCIA_MODELOS_LOTES_PEQUENOS if lotes_pequenos else PREFERENCIA_MODELOS
+    return next((caminho for caminho in preferencia if MARCADORES_MODELO[caminho].exists()),
+                CAMINHO_MODELO_WALMART)
+
+
+def versao_modelo(caminho=None, lotes_pequenos=False):
+    """
+    Identificador do artefato de modelo (caminho e data do marcador, em ns).
+    Muda sempre que o modelo é regravado; None se ele não existe.
+    """
+    caminho = Path(caminho) if caminho is not None else localizar_modelo(lotes_pequenos)
+    marcador = MARCADORES_MODELO.get(caminho, caminho)
+    if not marcador.exists():
+        return None
+    return f'{caminho}@{marcador.stat().st_mtime_ns}'
+
+
+def colunas_do_modelo(caminho=None, lotes_pequenos=False):
+    """
+    feature_names_in_ do modelo sem carregá-lo: lidas do registro.json ou do
+    metadados.json da pasta. Para o .joblib ativo, vêm dos metadados da sua
+    floresta compacta; só um .joblib avulso precisa ser desserializado.
+    """
+    caminho = Path(caminho) if caminho is not None else localizar_modelo(lotes_pequenos)
+    if caminho.is_dir():
+        arquivo = caminho / 'registro.json' if (caminho / 'registro.json').exists() else caminho / 'metadados.json'
+        return np.array(json.loads(arquivo.read_text(encoding='utf-8'))['feature_names_in_'], dtype=object)
+    ativo = ler_modelo_ativo()
+    if ativo is not None and ativo.get('caminho_compacto') and Path(ativo['caminho']) == caminho:
+        compacto = Path(ativo['caminho_compacto']) / 'metadados.json'
+        if compacto.exists() and compacto.stat().st_mtime >= caminho.stat().st_mtime:
+            return np.array(json.loads(compacto.read_text(encoding='utf-8'))['feature_names_in_'], dtype=object)
+    return joblib.load(caminho).feature_names_in_
+
+
+def carregar_modelo(caminho=None, lotes_pequenos=False):
+    """
+    Carrega o modelo para previsão: um registro de modelos por segmento, uma
+    pasta com metadados.json (o campo 'tipo' escolhe a classe: floresta
+    compacta ou gradient boosting por histogramas) ou o .joblib original do
+    scikit-learn. Sem caminho, usa o de localizar_modelo(lotes_pequenos).
+    """
+    caminho = Path(caminho) if caminho is not None else localizar_modelo(lotes_pequenos)
+    if (caminho / 'registro.json').exists():
+        # Importado aqui porque modelos_segmentados depende deste módulo
+        from modelos_segmentados import RegistroModelos
+        return RegistroModelos.carregar(caminho)
+    if caminho.is_dir():
+        metadados = json.loads((caminho / 'metadados.json').read_text(encoding='utf-8'))
+        if metadados.get('tipo') == 'hist_gradient_boosting':
+            return GradientBoostingHistograma.carregar(caminho)
+        return FlorestaCompacta.carregar(caminho)
+    return joblib.load(caminho)
@@ -0,0 +1,64 @@
+# ==============================================================================
+# modelo_histograma.py
+# Backend de gradient boosting por histogramas
+# ==============================================================================
+
+# Alternativa ao RandomForestRegressor: o HistGradientBoostingRegressor do
+# scikit-learn treina em poucos segundos, gera um modelo de poucos MB e prevê
+# grades inteiras rapidamente. Ele discretiza as features em até 255 faixas
+# (bins) por coluna a cada fit.
+#
+# O estimador recebe as features em float32 (treinamento.features_float32),
+# sem discretização própria: ele refaz as faixas a cada fit mesmo quando recebe
+# códigos já discretizados, então guardar códigos em cache não economiza tempo.
+# Valores ausentes (NaN) seguem o tratamento nativo do scikit-learn, que
+# aprende para qual lado de cada divisão eles vão.
+#
+# Formato salvo (pasta):
+#     metadados.json   tipo 'hist_gradient_boosting', feature_names_in_, ...
+#     modelo.joblib    o estimador treinado
+
+import json
+import joblib
+from pathlib import Path
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from esquema_dados import CAMINHO_MODELO_HISTOGRAMA_WALMART
+
+VERSAO_FORMATO = 2
+
+
+class GradientBoostingHistograma(HistGradientBoostingRegressor):
+    """
+    HistGradientBoostingRegressor com exportação no formato de pasta do projeto.
+
+    É o próprio estimador do scikit-learn (get_params, set_params, clone), então
+    o script 02, o app e a previsão em lote o usam do mesmo jeito que a floresta.
+    """
+
+    tipo = 'hist_gradient_boosting'
+
+    def exportar(self, pasta=CAMINHO_MODELO_HISTOGRAMA_WALMART):
+        """Grava o modelo e um metadados.json com o tipo, lido por carregar_modelo()."""
+        pasta = Path(pasta)
+        pasta.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self, pasta / 'modelo.joblib')
+        metadados = {
+            'versao_formato': VERSAO_FORMATO,
+            'tipo': self.tipo,
+            'feature_names_in_': [str(coluna) for coluna in self.feature_names_in_],
+            'n_iter_': int(self.n_iter_),
+            'parametros': self.get_params(),
+        }
+        (pasta / 'metadados.json').write_text(json.dumps(metadados, indent=2, default=str), encoding='utf-8')
+        return pasta
+
+    @classmethod
+    def carregar(cls, pasta=CAMINHO_MODELO_HISTOGRAMA_WALMART):
+        pasta = Path(pasta)
+        metadados = json.loads((pasta / 'metadados.json').read_text(encoding='utf-8'))
+        if metadados.get('versao_formato') != VERSAO_FORMATO:
+            raise ValueError(f"O modelo em '{pasta}' usa o formato {metadados.get('versao_formato')}; "
+                             f"treine-o de novo (formato atual: {VERSAO_FORMATO}).")
+        return joblib.load(pasta / 'modelo.joblib')
+
@@ -0,0 +1,201 @@
+# ==============================================================================
+# modelos_segmentados.py
+# Um modelo por segmento (tipo de loja, loja ou departamento) + modelo global
+# ==============================================================================
+
+# Em vez de uma única floresta para todas as séries, cada segmento recebe a sua,
+# treinada só com as próprias linhas. Segmentos com poucas linhas (ou que não
+# existiam no treino) usam o modelo global. O resultado é um registro:
+#
+#     models/segmentos/
+#         registro.json     segmentação, lista de segmentos e métricas do treino
+#         global/           floresta compacta usada como reserva
+#         loja_1/ ...       uma floresta compacta por segmento
+#
+# Os segmentos são treinados em paralelo em processos separados. A memória de
+# cada processo fica limitada a um segmento: as linhas são ordenadas por
+# segmento e gravadas uma vez em .npy (memory-mapped), cada tarefa recebe só a
+# faixa do seu segmento, treina com n_jobs=1 e grava a floresta direto no disco,
+# sem devolver o modelo ao processo principal.
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from esquema_dados import CAMINHO_REGISTRO_SEGMENTOS
+from modelo_compacto import FlorestaCompacta, exportar_floresta
+from treinamento import abrir_dados_compartilhados, criar_modelo, gravar_dados_compartilhados
+
+# Segmentos com menos linhas de treino que isso usam o modelo global
+MIN_LINHAS_SEGMENTO = 2000
+NOME_MODELO_GLOBAL = 'global'
+
+
+def _segmento_tipo(df):
+    return np.select([df['Type_A'] == 1, df['Type_B'] == 1, df['Type_C'] == 1], ['A', 'B', 'C'], '')
+
+
+SEGMENTACOES = {
+    'tipo': _segmento_tipo,
+    'loja': lambda df: df['Store'].to_numpy().astype(np.int64).astype(str),
+    'departamento': lambda df: df['Dept'].to_numpy().astype(np.int64).astype(str),
+}
+
+
+def segmentos_das_linhas(df, segmentacao):
+    """Segmento de cada linha (texto, como nas chaves do registro)."""
+    return np.asarray(SEGMENTACOES[segmentacao](df), dtype=str)
+
+
+# ==============================================================================
+# Treino
+# ==============================================================================
+
+_DADOS_PROCESSO = {}
+
+
+def _abrir_dados(pasta):
+    """Inicializador de cada processo: abre os arrays compartilhados uma única vez."""
+    _DADOS_PROCESSO.update(abrir_dados_compartilhados(pasta))
+
+
+def _treinar_segmento(tarefa, parametros, pasta_registro):
+    """Treina a floresta de um segmento (faixa de linhas) e a grava no registro."""
+    X, y, colunas = _DADOS_PROCESSO['X'], _DADOS_PROCESSO['y'], _DADOS_PROCESSO['colunas']
+    inicio, fim = tarefa['linhas']
+
+    inicio_treino = time.perf_counter()
+    modelo = criar_modelo(**parametros)
+    modelo.fit(X[inicio:fim], y[inicio:fim])
+    exportar_floresta(modelo, Path(pasta_registro) / tarefa['pasta'], colunas=colunas)
+    return {'segmento': tarefa['segmento'], 'pasta': tarefa['pasta'], 'linhas': fim - inicio,
+            'tempo_s': time.perf_counter() - inicio_treino}
+
+
+def treinar_registro(df_treino, segmentacao, pasta=CAMINHO_REGISTRO_SEGMENTOS, min_linhas=MIN_LINHAS_SEGMENTO,
+                     n_processos=None, parametros=None, modelo_global=None):
+    """
+    Treina um modelo por segmento e grava o registro em 'pasta'.
+
+    'modelo_global' (já treinado com as mesmas linhas) é exportado como reserva;
+    sem ele, o modelo global também é treinado no pool. O registro é montado em
+    uma pasta temporária e só substitui o anterior quando está completo.
+    """
+    parametros = {**(parametros or {}), 'n_jobs': 1}
+    n_processos = n_processos or os.cpu_count()
+    pasta = Path(pasta)
+
+    # Linhas de cada segmento contíguas: cada tarefa é só uma faixa do array
+    segmentos = segmentos_das_linhas(df_treino, segmentacao)
+    ordem = np.argsort(segmentos, kind='stable')
+    df_ordenado = df_treino.iloc[ordem]
+    nomes, inicios, contagens = np.unique(segmentos[ordem], return_index=True, return_counts=True)
+
+    tarefas = [
+        {'segmento': str(nome), 'pasta': f'{segmentacao}_{nome}', 'linhas': (int(inicio), int(inicio + contagem))}
+        for nome, inicio, contagem in zip(nomes, inicios, contagens) if contagem >= min_linhas
+    ]
+    if modelo_global is None:
+        tarefas.append({'segmento': None, 'pasta': NOME_MODELO_GLOBAL, 'linhas': (0, len(df_ordenado))})
+    # Os maiores primeiro, para equilibrar a carga entre os processos
+    tarefas.sort(key=lambda tarefa: tarefa['linhas'][0] - tarefa['linhas'][1])
+
+    pasta_temp = pasta.with_name(pasta.name + '.tmp')
+    if pasta_temp.exists():
+        shutil.rmtree(pasta_temp)
+    pasta_temp.mkdir(parents=True)
+    pasta_dados = tempfile.mkdtemp(prefix='segmentos_')
+    try:
+        gravar_dados_compartilhados(df_ordenado, pasta_dados)
+        colunas = json.loads((Path(pasta_dados) / 'colunas.json').read_text(encoding='utf-8'))
+        del df_ordenado
+        if modelo_global is not None:
+            exportar_floresta(modelo_global, pasta_temp / NOME_MODELO_GLOBAL, colunas=colunas)
+
+        if n_processos == 1 or len(tarefas) <= 1:
+            _abrir_dados(pasta_dados)
+            resultados = [_treinar_segmento(tarefa, parametros, pasta_temp) for tarefa in tarefas]
+            _DADOS_PROCESSO.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_processos, len(tarefas)),
+                                     initializer=_abrir_dados, initargs=(pasta_dados,)) as executor:
+                resultados = list(executor.map(_treinar_segmento, tarefas, [parametros] * len(tarefas),
+                                               [pasta_temp] * len(tarefas)))
+    finally:
+        shutil.rmtree(pasta_dados, ignore_errors=True)
+
+    registro = {
+        'segmentacao': segmentacao,
+        'min_linhas': min_linhas,
+        'feature_names_in_': colunas,
+        'global': NOME_MODELO_GLOBAL,
+        'segmentos': {r['segmento']: r['pasta'] for r in resultados if r['segmento'] is not None},
+        'treino': sorted(resultados, key=lambda r: r['pasta']),
+    }
+    # Marcador gravado por último: o registro só é válido quando todas as florestas existem
+    (pasta_temp / 'registro.json').write_text(json.dumps(registro, indent=2), encoding='utf-8')
+    if pasta.exists():
+        shutil.rmtree(pasta)
+    os.replace(pasta_temp, pasta)
+    return pasta
+
+
+# ==============================================================================
+# Previsão
+# ==============================================================================
+
+class RegistroModelos:
+    """
+    Despacha cada linha para o modelo do seu segmento (ou para o global).
+
+    Oferece o mesmo contrato dos outros modelos (feature_names_in_, predict,
+    n_jobs), então o app e a previsão em lote o usam sem mudanças. As florestas
+    são abertas com memory-mapping, então carregar o registro inteiro é barato.
+    """
+
+    def __init__(self, registro, modelos, modelo_global):
+        self.registro = registro
+        self.segmentacao = registro['segmentacao']
+        self.feature_names_in_ = np.array(registro['feature_names_in_'], dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.modelos = modelos
+        self.modelo_global = modelo_global
+        self.n_jobs = None
+
+    @classmethod
+    def carregar(cls, pasta=CAMINHO_REGISTRO_SEGMENTOS):
+        pasta = Path(pasta)
+        registro = json.loads((pasta / 'registro.json').read_text(encoding='utf-8'))
+        modelos = {segmento: FlorestaCompacta.carregar(pasta / subpasta)
+                   for segmento, subpasta in registro['segmentos'].items()}
+        return cls(registro, modelos, FlorestaCompacta.carregar(pasta / registro['global']))
+
+    def set_params(self, **parametros):
+        """Repassa n_jobs para todas as florestas."""
+        for nome, valor in parametros.items():
+            setattr(self, nome, valor)
+            for modelo in (self.modelo_global, *self.modelos.values()):
+                modelo.set_params(**{nome: valor})
+        return self
+
+    def modelo_do_segmento(self, segmento):
+        return self.modelos.get(str(segmento), self.modelo_global)
+
+    def predict(self, X):
+        """Prevê cada grupo de linhas do mesmo segmento com uma única chamada ao seu modelo."""
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(X, columns=self.feature_names_in_)
+        X = X[list(self.feature_names_in_)]
+        segmentos = segmentos_das_linhas(X, self.segmentacao)
+        previsoes = np.empty(len(X), dtype=np.float64)
+        for segmento in np.unique(segmentos):
+            linhas = segmentos == segmento
+            previsoes[linhas] = self.modelo_do_segmento(segmento).predict(X[linhas])
+        return previsoes
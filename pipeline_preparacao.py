@@ -0,0 +1,619 @@
+# ==============================================================================
+# pipeline_preparacao.py
+# Etapas da preparação dos dados do Walmart como funções reutilizáveis
+# ==============================================================================
+
+# As mesmas regras do script 01 (imputação, merge, features de data e One-Hot
+# Encoding), escritas como funções para que possam ser importadas e aplicadas
+# tanto ao histórico completo quanto apenas às semanas novas (modo incremental).
+#
+# Uso típico, sem gráficos nem prints de EDA:
+#     from pipeline_preparacao import executar_pipeline
+#     df_processed = executar_pipeline()
+
+import functools
+import hashlib
+import inspect
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from esquema_dados import (
+    CAMINHO_PARQUET_WALMART, CAMINHO_PARTICIONADO_WALMART, CAMINHO_POR_LOJA_WALMART, TIPOS_CSV_WALMART, aplicar_tipos_compactos,
+    carregar_dados_processados, relatorio_memoria, salvar_agregados,
+)
+from calendario import chave_data, datas_feriados, features_calendario, fim_da_semana, tabela_calendario
+from features_vendas import (
+    adicionar_features_vendas, carregar_historico_vendas, datas_das_linhas, recortar_historico,
+    salvar_historico_vendas,
+)
+
+CAMINHO_TREINO = Path('data/train.csv')
+CAMINHO_LOJAS = Path('data/stores.csv')
+CAMINHO_FEATURES = Path('data/features.csv')
+
+PASTA_ESTADO = Path('data/estado_preparacao')
+CAMINHO_MEDIANAS = PASTA_ESTADO / 'medianas_por_loja.parquet'
+CAMINHO_MANIFESTO = PASTA_ESTADO / 'manifesto_particoes.parquet'
+# Últimas semanas de vendas de cada série, usadas pelas features de histórico
+CAMINHO_HISTORICO_VENDAS = PASTA_ESTADO / 'historico_vendas.parquet'
+
+PASTA_CACHE = Path('data/cache_preparacao')
+# Incrementar quando uma mudança fora das funções das etapas alterar o resultado
+VERSAO_PIPELINE = '2'
+
+# Linhas de train.csv lidas por vez no modo em lotes
+TAMANHO_LOTE_PADRAO = 250_000
+
+COLUNAS_MARKDOWN = ['MarkDown1', 'MarkDown2', 'MarkDown3', 'MarkDown4', 'MarkDown5']
+COLUNAS_MEDIANA = ['CPI', 'Unemployment']
+
+
+# ==============================================================================
+# Etapas da preparação
+# ==============================================================================
+
+def carregar_dados_brutos(caminho_treino=CAMINHO_TREINO, caminho_lojas=CAMINHO_LOJAS,
+                          caminho_features=CAMINHO_FEATURES):
+    """
+    Lê os três CSVs originais, já convertendo a coluna 'Date' para datetime e as
+    demais para os tipos compactos do esquema (int8/int16/float32/bool/category).
+    """
+    df_train = pd.read_csv(caminho_treino, parse_dates=['Date'], dtype=TIPOS_CSV_WALMART)
+    df_stores = pd.read_csv(caminho_lojas, dtype=TIPOS_CSV_WALMART)
+    df_features = pd.read_csv(caminho_features, parse_dates=['Date'], dtype=TIPOS_CSV_WALMART)
+    return df_train, df_stores, df_features
+
+
+def calcular_medianas_por_loja(df_features):
+    """Calcula a mediana de CPI e Unemployment de cada loja (usada na imputação)."""
+    return df_features.groupby('Store')[COLUNAS_MEDIANA].median()
+
+
+def imputar_features(df_features, medianas):
+    """Preenche MarkDowns com 0 e CPI/Unemployment com a mediana da loja."""
+    df_features_tratado = df_features.copy()
+    df_features_tratado[COLUNAS_MARKDOWN] = df_features_tratado[COLUNAS_MARKDOWN].fillna(0)
+    for coluna in COLUNAS_MEDIANA:
+        df_features_tratado[coluna] = df_features_tratado[coluna].fillna(
+            df_features_tratado['Store'].map(medianas[coluna])
+        )
+    return df_features_tratado
+
+
+def unir_dados(df_train, df_stores, df_features_tratado):
+    """Une vendas, lojas e features (inner join), mantendo o IsHoliday de df_train."""
+    df_merged = pd.merge(df_train, df_stores, on='Store', how='inner')
+    df_final = pd.merge(df_merged, df_features_tratado, on=['Store', 'Date'], how='inner')
+    if 'IsHoliday_y' in df_final.columns:
+        df_final = df_final.drop(columns=['IsHoliday_y'])
+        df_final = df_final.rename(columns={'IsHoliday_x': 'IsHoliday'})
+    return df_final
+
+
+def criar_features_de_data(df):
+    """
+    Junta as features de calendário de 'Date' (Ano, Mes, Dia, Semana_do_Ano,
+    semanas de feriado e distâncias até/desde o feriado) e remove a coluna original.
+    O calendário é calculado por data distinta (calendario.py), não por linha.
+    """
+    df_datas = features_calendario(df['Date'])
+    return pd.concat([df.drop(columns=['Date']), df_datas], axis=1)
+
+
+def codificar_tipo_loja(df, tipos_loja=('A', 'B', 'C')):
+    """
+    Aplica One-Hot Encoding na coluna 'Type'.
+
+    As categorias são fixadas em 'tipos_loja' para que um lote parcial (por exemplo,
+    uma única semana de poucas lojas) gere sempre as mesmas colunas Type_*.
+    """
+    df = df.copy()
+    df['Type'] = pd.Categorical(df['Type'], categories=list(tipos_loja))
+    return pd.get_dummies(df, columns=['Type'], dtype='int8')
+
+
+def preparar_dados(df_train, df_stores, df_features, medianas=None):
+    """Executa todas as etapas e devolve o dataframe pronto para o modelo."""
+    if medianas is None:
+        medianas = calcular_medianas_por_loja(df_features)
+    tipos_loja = sorted(df_stores['Type'].unique())
+
+    df_features_tratado = imputar_features(df_features, medianas)
+    df_final = unir_dados(df_train, df_stores, df_features_tratado)
+    df_eng = criar_features_de_data(df_final)
+    return aplicar_tipos_compactos(codificar_tipo_loja(df_eng, tipos_loja))
+
+
+# ==============================================================================
+# Rótulo do tipo de loja e tabelas agregadas para o dashboard
+# ==============================================================================
+
+COLUNAS_TIPO = ['Type_A', 'Type_B', 'Type_C']
+
+# Chaves de agrupamento de cada tabela agregada
+AGREGACOES = {
+    'vendas_por_mes': ['Mes'],
+    'vendas_por_tipo': ['Type_Label'],
+    'vendas_loja_depto_semana': ['Store', 'Dept', 'Semana_do_Ano'],
+}
+# Amostra de linhas exibida na aba 1 do dashboard, gravada junto dos agregados
+# para que o app não precise ler a tabela de fatos
+COLUNAS_AMOSTRA = [
+    'Store', 'Dept', 'Weekly_Sales', 'IsHoliday', 'Temperature', 'Fuel_Price', 'CPI', 'Unemployment',
+    'Size', 'Ano', 'Mes', 'Dia', 'Semana_do_Ano', 'Type_A', 'Type_B', 'Type_C',
+]
+LINHAS_AMOSTRA = 1000
+
+
+def rotular_tipo_loja(df):
+    """Cria o rótulo categórico 'Tipo A/B/C' a partir das colunas One-Hot, sem percorrer linha a linha."""
+    rotulos = ['Tipo A', 'Tipo B', 'Tipo C']
+    condicoes = [df[coluna].to_numpy() == 1 for coluna in COLUNAS_TIPO]
+    codigos = np.select(condicoes, [0, 1, 2], default=-1)
+    return pd.Categorical.from_codes(codigos, categories=rotulos)
+
+
+def calcular_amostra(df_processed, linhas=LINHAS_AMOSTRA):
+    """
+    Sorteia até 'linhas' linhas (colunas de COLUNAS_AMOSTRA presentes no df).
+
+    O sorteio fica as linhas com os menores hashes de conteúdo (coluna
+    'Chave_Amostra'): amostras de partes diferentes (lotes, lojas) combinadas
+    por combinar_agregados dão a mesma amostra que a tabela inteira daria.
+    """
+    df = df_processed[[coluna for coluna in COLUNAS_AMOSTRA if coluna in df_processed.columns]]
+    return (df.assign(Chave_Amostra=pd.util.hash_pandas_object(df, index=False).to_numpy())
+              .nsmallest(linhas, 'Chave_Amostra').reset_index(drop=True))
+
+
+def calcular_agregados(df_processed):
+    """
+    Soma Weekly_Sales por mês, por tipo de loja e por loja/departamento/semana do
+    ano, e sorteia a amostra de linhas do dashboard ('amostra').
+    """
+    df = df_processed[['Store', 'Dept', 'Mes', 'Semana_do_Ano']].copy()
+    # Soma em float64 para não acumular erro de arredondamento do float32
+    df['Weekly_Sales'] = df_processed['Weekly_Sales'].astype('float64')
+    df['Type_Label'] = rotular_tipo_loja(df_processed)
+    agregados = {
+        nome: df.groupby(chaves, observed=True)['Weekly_Sales'].sum().reset_index()
+        for nome, chaves in AGREGACOES.items()
+    }
+    agregados['amostra'] = calcular_amostra(df_processed)
+    return agregados
+
+
+def combinar_agregados(parciais):
+    """Junta agregados parciais (ex.: um por lote) somando novamente pelas mesmas chaves."""
+    agregados = {
+        nome: pd.concat([parcial[nome] for parcial in parciais])
+                .groupby(chaves, observed=True)['Weekly_Sales'].sum().reset_index()
+        for nome, chaves in AGREGACOES.items()
+    }
+    agregados['amostra'] = (pd.concat([parcial['amostra'] for parcial in parciais])
+                              .nsmallest(LINHAS_AMOSTRA, 'Chave_Amostra').reset_index(drop=True))
+    return agregados
+
+
+# ==============================================================================
+# Pipeline completo com cache em disco por etapa
+# ==============================================================================
+
+# Funções de cada etapa; o código-fonte delas entra na chave do cache, então
+# qualquer alteração na lógica invalida a etapa (e todas as seguintes).
+ETAPAS = {
+    'carregar': (carregar_dados_brutos,),
+    'imputar': (calcular_medianas_por_loja, imputar_features),
+    'unir': (unir_dados,),
+    'datas': (criar_features_de_data, features_calendario, tabela_calendario, datas_feriados, fim_da_semana,
+              chave_data),
+    'one_hot': (codificar_tipo_loja,),
+}
+
+
+def _assinatura_arquivo(caminho):
+    """Identifica a versão de um arquivo de entrada pelo caminho, tamanho e data de modificação."""
+    info = Path(caminho).stat()
+    return f"{Path(caminho).resolve()}:{info.st_size}:{info.st_mtime_ns}"
+
+
+def _chave_etapa(nome, chaves_entrada):
+    """Hash das entradas da etapa + versão do código das suas funções."""
+    codigo = ''.join(inspect.getsource(funcao) for funcao in ETAPAS[nome])
+    partes = [VERSAO_PIPELINE, nome, codigo, *chaves_entrada]
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()[:16]
+
+
+def _memoizar(nome, chave, calcular, pasta_cache, usar_cache):
+    """Devolve o resultado salvo da etapa se a chave não mudou; senão executa e salva."""
+    pasta_etapa = Path(pasta_cache) / nome
+    pasta = pasta_etapa / chave
+    if usar_cache and (pasta / 'concluido').exists():
+        partes = [pd.read_parquet(arquivo) for arquivo in sorted(pasta.glob('parte_*.parquet'))]
+        print(f"[CACHE] Etapa '{nome}' reaproveitada.")
+        return partes[0] if len(partes) == 1 else tuple(partes)
+
+    resultado = calcular()
+    print(f"[OK] Etapa '{nome}' executada.")
+    if usar_cache:
+        # Mantém apenas a versão mais recente de cada etapa
+        if pasta_etapa.exists():
+            shutil.rmtree(pasta_etapa)
+        pasta.mkdir(parents=True)
+        partes = resultado if isinstance(resultado, tuple) else (resultado,)
+        for i, parte in enumerate(partes):
+            parte.to_parquet(pasta / f'parte_{i}.parquet', engine='pyarrow')
+        # Marcador gravado por último: uma execução interrompida não deixa cache parcial
+        (pasta / 'concluido').touch()
+    return resultado
+
+
+def executar_pipeline(caminho_treino=CAMINHO_TREINO, caminho_lojas=CAMINHO_LOJAS,
+                      caminho_features=CAMINHO_FEATURES, usar_cache=True, pasta_cache=PASTA_CACHE,
+                      medicoes_memoria=None, relatorio=None):
+    """
+    Executa carregar -> imputar -> unir -> datas -> one_hot e devolve o dataframe processado.
+
+    Cada etapa é salva em 'pasta_cache' com uma chave que encadeia a assinatura
+    dos CSVs de entrada e o código das etapas anteriores. Numa nova execução,
+    as etapas cujas entradas não mudaram são lidas do disco; se a última etapa
+    estiver em cache, nenhuma das anteriores chega a ser carregada.
+
+    Com 'medicoes_memoria' (lista), a memória do resultado de cada etapa
+    resolvida é impressa e acrescentada à lista. Com 'relatorio'
+    (instrumentacao.RelatorioExecucao), o tempo, a CPU, o pico de memória e as
+    linhas de cada etapa resolvida entram no relatório da execução.
+    """
+    fontes = (caminho_treino, caminho_lojas, caminho_features)
+    chaves = {}
+    chaves_entrada = [_assinatura_arquivo(caminho) for caminho in fontes]
+    for nome in ETAPAS:
+        chaves[nome] = _chave_etapa(nome, chaves_entrada)
+        chaves_entrada = [chaves[nome]]
+
+    def etapa(nome, calcular):
+        if relatorio is not None:
+            resultado = relatorio.medir(nome, _memoizar, nome, chaves[nome], calcular, pasta_cache, usar_cache)
+        else:
+            resultado = _memoizar(nome, chaves[nome], calcular, pasta_cache, usar_cache)
+        if medicoes_memoria is not None:
+            if isinstance(resultado, tuple):
+                for rotulo, df in zip(('train', 'stores', 'features'), resultado):
+                    relatorio_memoria(f'{nome} ({rotulo})', df, medicoes_memoria)
+            else:
+                relatorio_memoria(nome, resultado, medicoes_memoria)
+        return resultado
+
+    # Cada etapa só é resolvida quando uma etapa seguinte precisa dela
+    @functools.cache
+    def carga():
+        return etapa('carregar', lambda: carregar_dados_brutos(*fontes))
+
+    @functools.cache
+    def imputado():
+        return etapa('imputar', lambda: imputar_features(carga()[2], calcular_medianas_por_loja(carga()[2])))
+
+    @functools.cache
+    def unido():
+        return etapa('unir', lambda: unir_dados(carga()[0], carga()[1], imputado()))
+
+    @functools.cache
+    def com_datas():
+        return etapa('datas', lambda: criar_features_de_data(unido()))
+
+    return etapa('one_hot', lambda: codificar_tipo_loja(com_datas(), sorted(carga()[1]['Type'].unique())))
+
+
+# ==============================================================================
+# Modo em lotes: train.csv lido em partes, para históricos maiores que a memória
+# ==============================================================================
+
+def preparar_em_lotes(caminho_treino=CAMINHO_TREINO, caminho_lojas=CAMINHO_LOJAS,
+                      caminho_features=CAMINHO_FEATURES, caminho_saida=CAMINHO_PARQUET_WALMART,
+                      tamanho_lote=TAMANHO_LOTE_PADRAO, exportar_csv=False):
+    """
+    Processa train.csv em lotes de 'tamanho_lote' linhas e grava cada lote direto no Parquet.
+
+    Apenas stores.csv e features.csv (tabelas pequenas, uma linha por loja ou por
+    loja/semana) ficam inteiros em memória, já imputados. Cada lote de vendas é
+    unido a elas, recebe as features de data e o One-Hot de 'Type' e é escrito
+    como um novo row group, então o pico de memória depende do tamanho do lote
+    e não do tamanho do histórico. Retorna o número de linhas gravadas.
+    """
+    caminho_saida = Path(caminho_saida)
+    caminho_saida.parent.mkdir(parents=True, exist_ok=True)
+
+    df_stores = pd.read_csv(caminho_lojas, dtype=TIPOS_CSV_WALMART)
+    df_features = pd.read_csv(caminho_features, parse_dates=['Date'], dtype=TIPOS_CSV_WALMART)
+    df_features_tratado = imputar_features(df_features, calcular_medianas_por_loja(df_features))
+    tipos_loja = sorted(df_stores['Type'].unique())
+
+    # Escreve em arquivos temporários e só troca pelos definitivos ao final,
+    # para que uma execução interrompida não deixe um Parquet pela metade.
+    caminho_temp = caminho_saida.with_name(caminho_saida.name + '.tmp')
+    caminho_csv = caminho_saida.with_suffix('.csv')
+    caminho_csv_temp = caminho_csv.with_name(caminho_csv.name + '.tmp')
+
+    escritor = None
+    total_linhas = 0
+    # Os agregados de cada lote são somados ao acumulado na hora, para que a
+    # memória deles não cresça com o número de lotes
+    agregados = None
+    try:
+        for lote in pd.read_csv(caminho_treino, parse_dates=['Date'], dtype=TIPOS_CSV_WALMART,
+                                chunksize=tamanho_lote):
+            df_lote = unir_dados(lote, df_stores, df_features_tratado)
+            df_lote = codificar_tipo_loja(criar_features_de_data(df_lote), tipos_loja)
+            df_lote = aplicar_tipos_compactos(df_lote)
+
+            tabela = pa.Table.from_pandas(df_lote, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(caminho_temp, tabela.schema, compression='zstd')
+            escritor.write_table(tabela.cast(escritor.schema))
+            agregados_lote = calcular_agregados(df_lote)
+            agregados = agregados_lote if agregados is None else combinar_agregados([agregados, agregados_lote])
+
+            if exportar_csv:
+                df_lote.to_csv(caminho_csv_temp, mode='w' if total_linhas == 0 else 'a',
+                               header=total_linhas == 0, index=False)
+            total_linhas += len(df_lote)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+    if escritor is None:
+        raise ValueError(f"O arquivo '{caminho_treino}' não contém nenhuma linha de vendas.")
+
+    os.replace(caminho_temp, caminho_saida)
+    if exportar_csv:
+        os.replace(caminho_csv_temp, caminho_csv)
+    salvar_agregados(agregados)
+    return total_linhas
+
+
+# ==============================================================================
+# Modo por loja: as lojas são independentes e processadas em paralelo
+# ==============================================================================
+
+def caminho_fragmento_loja(pasta_saida, loja):
+    """Arquivo da loja na saída por loja (número com 3 dígitos: a ordem dos nomes é a das lojas)."""
+    return Path(pasta_saida) / f"loja_{int(loja):03d}.parquet"
+
+
+def _preparar_loja(tarefa):
+    """
+    Executa as etapas do pipeline para uma única loja e grava o seu fragmento.
+    Devolve só os resultados pequenos: linhas, agregados e recorte do histórico.
+    """
+    df_features = tarefa['features']
+    df_features_tratado = imputar_features(df_features, calcular_medianas_por_loja(df_features))
+    df_final = unir_dados(tarefa['train'], tarefa['stores'], df_features_tratado)
+    df_loja = aplicar_tipos_compactos(codificar_tipo_loja(criar_features_de_data(df_final), tarefa['tipos_loja']))
+    historico = None
+    if tarefa['features_vendas']:
+        # Lags e janelas são calculados dentro de cada (Store, Dept): a loja tem tudo o que precisa
+        df_loja, historico = adicionar_features_vendas(df_loja)
+        df_loja = aplicar_tipos_compactos(df_loja)
+
+    df_loja.to_parquet(tarefa['caminho'], index=False, engine='pyarrow', compression='zstd')
+    return {'loja': tarefa['loja'], 'linhas': len(df_loja), 'agregados': calcular_agregados(df_loja),
+            'historico': historico}
+
+
+def preparar_por_loja(caminho_treino=CAMINHO_TREINO, caminho_lojas=CAMINHO_LOJAS,
+                      caminho_features=CAMINHO_FEATURES, pasta_saida=CAMINHO_POR_LOJA_WALMART,
+                      n_processos=None, features_vendas=False, caminho_historico=CAMINHO_HISTORICO_VENDAS):
+    """
+    Divide os dados por Store e prepara cada loja em um processo do pool.
+
+    Depois da leitura, nenhuma etapa mistura lojas: as medianas de imputação são
+    por loja, os merges são por Store (e Date) e as features de data e de vendas
+    são por linha ou por (Store, Dept). Cada processo recebe as linhas de uma loja
+    (vendas, a linha de stores.csv e as semanas de features.csv) e as categorias
+    de 'Type' de todas as lojas, e grava o seu arquivo em 'pasta_saida'.
+
+    O resultado tem as mesmas linhas e valores do caminho serial, na ordem de
+    Store e, dentro da loja, na ordem do train.csv (a ordem do arquivo original).
+    Os agregados do dashboard são combinados a partir dos parciais de cada loja.
+    Retorna o número de linhas gravadas.
+    """
+    n_processos = n_processos or os.cpu_count()
+    pasta_saida = Path(pasta_saida)
+    df_train, df_stores, df_features = carregar_dados_brutos(caminho_treino, caminho_lojas, caminho_features)
+    tipos_loja = sorted(df_stores['Type'].unique())
+
+    # A saída é montada em uma pasta temporária e só substitui a anterior quando completa
+    pasta_temp = pasta_saida.with_name(pasta_saida.name + '.tmp')
+    if pasta_temp.exists():
+        shutil.rmtree(pasta_temp)
+    pasta_temp.mkdir(parents=True)
+
+    lojas_stores = dict(tuple(df_stores.groupby('Store', sort=False)))
+    lojas_features = dict(tuple(df_features.groupby('Store', sort=False)))
+    tarefas = [
+        {'loja': int(loja), 'train': df_loja, 'stores': lojas_stores[loja], 'features': lojas_features[loja],
+         'tipos_loja': tipos_loja, 'features_vendas': features_vendas,
+         'caminho': caminho_fragmento_loja(pasta_temp, loja)}
+        for loja, df_loja in df_train.groupby('Store', sort=True)
+        if loja in lojas_stores and loja in lojas_features
+    ]
+    if not tarefas:
+        raise ValueError(f"Nenhuma loja de '{caminho_treino}' tem linhas em stores.csv e features.csv.")
+    del df_train
+    # As maiores primeiro, para equilibrar a carga entre os processos
+    tarefas.sort(key=lambda tarefa: -len(tarefa['train']))
+
+    if n_processos == 1:
+        resultados = [_preparar_loja(tarefa) for tarefa in tarefas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_processos, len(tarefas))) as executor:
+            resultados = list(executor.map(_preparar_loja, tarefas))
+    resultados.sort(key=lambda resultado: resultado['loja'])
+
+    if pasta_saida.exists():
+        shutil.rmtree(pasta_saida)
+    os.replace(pasta_temp, pasta_saida)
+
+    salvar_agregados(combinar_agregados([resultado['agregados'] for resultado in resultados]))
+    if features_vendas:
+        # Cada loja recortou o próprio histórico; o recorte final usa a última semana de todas
+        historico = pd.concat([resultado['historico'] for resultado in resultados], ignore_index=True)
+        salvar_historico_vendas(recortar_historico(historico), caminho_historico)
+    return sum(resultado['linhas'] for resultado in resultados)
+
+
+# ==============================================================================
+# Modo incremental: processa apenas as partições (Store, Date) novas ou alteradas
+# ==============================================================================
+
+def _hash_por_particao(df, chaves=('Store', 'Date')):
+    """Resume o conteúdo de cada partição (Store, Date) em um único hash."""
+    chaves = list(chaves)
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    # A soma (com overflow em uint64) não depende da ordem das linhas dentro da partição
+    return hashes.groupby([df[c] for c in chaves]).sum()
+
+
+def calcular_manifesto(df_train, df_stores, df_features):
+    """Gera o hash de cada partição (Store, Date) considerando as três fontes."""
+    hash_treino = _hash_por_particao(df_train)
+    hash_features = _hash_por_particao(df_features)
+    hash_lojas = pd.util.hash_pandas_object(df_stores.set_index('Store'), index=True)
+
+    manifesto = hash_treino.rename('hash_treino').to_frame().join(
+        hash_features.rename('hash_features'), how='inner'
+    )
+    hash_loja = manifesto.index.get_level_values('Store').map(hash_lojas)
+    manifesto['hash'] = (
+        manifesto['hash_treino'].to_numpy()
+        ^ manifesto['hash_features'].to_numpy()
+        ^ hash_loja.to_numpy(dtype='uint64')
+    )
+    return manifesto[['hash']].reset_index()
+
+
+def carregar_medianas(df_features, caminho=CAMINHO_MEDIANAS):
+    """
+    Carrega as medianas persistidas. Lojas que ainda não têm mediana salva
+    (lojas novas) recebem a mediana calculada a partir de suas próprias linhas.
+    """
+    caminho = Path(caminho)
+    if caminho.exists():
+        medianas = pd.read_parquet(caminho)
+    else:
+        medianas = pd.DataFrame(columns=COLUNAS_MEDIANA, index=pd.Index([], name='Store'))
+
+    lojas_novas = set(df_features['Store'].unique()) - set(medianas.index)
+    if lojas_novas:
+        novas = calcular_medianas_por_loja(df_features[df_features['Store'].isin(lojas_novas)])
+        medianas = pd.concat([medianas, novas]).sort_index()
+    return medianas
+
+
+def caminho_particao(pasta_saida, loja):
+    """Pasta das linhas de uma loja na saída particionada (formato Store=<n>)."""
+    return Path(pasta_saida) / f"Store={loja}"
+
+
+def escrever_particoes(df_processado, datas, pasta_saida=CAMINHO_PARTICIONADO_WALMART):
+    """
+    Substitui as datas reprocessadas de cada loja e compacta a loja em um único arquivo.
+
+    O manifesto continua por (Store, Date), mas a saída guarda um Parquet por loja:
+    um arquivo por (Store, Date) teria milhares de arquivos de poucas dezenas de
+    linhas, e ler a pasta ficaria muito mais lento que ler o Parquet único.
+    As linhas já gravadas da loja nas datas que não vieram no lote são mantidas,
+    e o arquivo sai em ordem de data.
+    """
+    pasta_saida = Path(pasta_saida)
+    df_processado = aplicar_tipos_compactos(df_processado)
+    for loja, df_loja in df_processado.groupby('Store', sort=False):
+        pasta = caminho_particao(pasta_saida, loja)
+        if pasta.exists():
+            # Lê todos os arquivos da loja (inclusive os Date=<...> do formato antigo, um por data)
+            df_anterior = aplicar_tipos_compactos(pd.read_parquet(pasta, engine='pyarrow', partitioning=None))
+            mantidas = ~datas_das_linhas(df_anterior).isin(datas[df_loja.index].unique()).to_numpy()
+            df_loja = pd.concat([df_anterior[mantidas], df_loja], ignore_index=True)
+        df_loja = df_loja.iloc[np.argsort(datas_das_linhas(df_loja).to_numpy(), kind='stable')]
+
+        # O prefixo '_' faz a leitura da pasta ignorar o temporário de uma execução interrompida
+        pasta_temp = pasta_saida / f'_{pasta.name}.tmp'
+        if pasta_temp.exists():
+            shutil.rmtree(pasta_temp)
+        pasta_temp.mkdir(parents=True)
+        df_loja.to_parquet(pasta_temp / 'parte.parquet', index=False, engine='pyarrow', compression='zstd')
+        if pasta.exists():
+            shutil.rmtree(pasta)
+        os.replace(pasta_temp, pasta)
+
+
+def preparar_incremental(caminho_treino=CAMINHO_TREINO, caminho_lojas=CAMINHO_LOJAS,
+                         caminho_features=CAMINHO_FEATURES,
+                         pasta_saida=CAMINHO_PARTICIONADO_WALMART, pasta_estado=PASTA_ESTADO,
+                         features_vendas=False):
+    """
+    Processa somente as partições (Store, Date) novas ou alteradas desde a última
+    execução e grava o resultado na saída particionada.
+
+    O estado (medianas por loja, manifesto de hashes e, com 'features_vendas',
+    as últimas semanas de vendas de cada série) fica em 'pasta_estado'.
+    Na primeira execução, sem estado salvo, todo o histórico é processado.
+    Retorna o número de partições (re)processadas.
+    """
+    pasta_estado = Path(pasta_estado)
+    caminho_medianas = pasta_estado / CAMINHO_MEDIANAS.name
+    caminho_manifesto = pasta_estado / CAMINHO_MANIFESTO.name
+    caminho_historico = pasta_estado / CAMINHO_HISTORICO_VENDAS.name
+
+    df_train, df_stores, df_features = carregar_dados_brutos(caminho_treino, caminho_lojas, caminho_features)
+
+    # 1. Descobre quais partições mudaram comparando os hashes com o manifesto salvo
+    manifesto_atual = calcular_manifesto(df_train, df_stores, df_features)
+    manifesto_salvo = None
+    if caminho_manifesto.exists():
+        manifesto_salvo = pd.read_parquet(caminho_manifesto)
+        comparacao = manifesto_atual.merge(manifesto_salvo, on=['Store', 'Date'], how='left',
+                                           suffixes=('', '_salvo'))
+        alteradas = comparacao[comparacao['hash'] != comparacao['hash_salvo']][['Store', 'Date']]
+    else:
+        alteradas = manifesto_atual[['Store', 'Date']]
+
+    if alteradas.empty:
+        return 0
+
+    # 2. Filtra apenas as linhas das partições alteradas
+    df_train_novo = df_train.merge(alteradas, on=['Store', 'Date'], how='inner')
+    df_features_novo = df_features.merge(alteradas, on=['Store', 'Date'], how='inner')
+
+    # 3. Imputa com as medianas persistidas (as mesmas da execução completa)
+    medianas = carregar_medianas(df_features, caminho_medianas)
+
+    df_processado = preparar_dados(df_train_novo, df_stores, df_features_novo, medianas)
+    if features_vendas:
+        # Lags e janelas das semanas novas saem do recorte salvo, sem reler o histórico.
+        # Correções em semanas antigas não recalculam as features das semanas seguintes.
+        df_processado, historico = adicionar_features_vendas(df_processado,
+                                                             carregar_historico_vendas(caminho_historico))
+    escrever_particoes(df_processado, datas_das_linhas(df_processado), pasta_saida)
+
+    # 4. Persiste o novo estado somente depois que as partições foram gravadas.
+    # Partições que não vieram nesta entrada (ex.: arquivo só com a semana nova) continuam no manifesto.
+    if manifesto_salvo is not None:
+        manifesto_atual = pd.concat([manifesto_salvo, manifesto_atual]).drop_duplicates(
+            subset=['Store', 'Date'], keep='last'
+        )
+    pasta_estado.mkdir(parents=True, exist_ok=True)
+    medianas.to_parquet(caminho_medianas)
+    manifesto_atual.to_parquet(caminho_manifesto, index=False)
+    if features_vendas:
+        salvar_historico_vendas(historico, caminho_historico)
+
+    # 5. Refaz as tabelas agregadas lendo só as colunas necessárias da saída particionada
+    # (as colunas da amostra incluem as usadas nas somas)
+    salvar_agregados(calcular_agregados(carregar_dados_processados(COLUNAS_AMOSTRA, pasta_saida)))
+    return len(alteradas)
@@ -0,0 +1,133 @@
+# ==============================================================================
+# preparacao_ecommerce.py
+# Preparação offline do E-commerce UK (online_retail_II.csv) para a aba 3
+# ==============================================================================
+
+# O equivalente ao script 01 para os dados do E-commerce: a limpeza que a aba 3
+# fazia a cada interação (conversão de InvoiceDate, filtro de Quantity/Price,
+# TotalPrice e Mes) roda uma única vez, e o dashboard lê só tabelas pequenas:
+#
+#     data/ecommerce_uk_processado.parquet    transações limpas, tipos compactos
+#     data/ecommerce_uk_agregados/
+#         vendas_por_mes.parquet              TotalPrice por mês
+#         vendas_por_pais.parquet             TotalPrice por país (decrescente)
+#         amostra.parquet                     amostra das transações brutas
+#
+# Exemplos:
+#     python preparacao_ecommerce.py              # só refaz se o CSV mudou
+#     python preparacao_ecommerce.py --forcar
+
+import argparse
+import pandas as pd
+from pathlib import Path
+from esquema_dados import (
+    CAMINHO_CSV_UK, CAMINHO_PARQUET_UK, PASTA_AGREGADOS_UK, TIPOS_UK, memoria_mb, salvar_agregados,
+)
+
+# Formato de InvoiceDate no CSV: informado ao parser para não inferir linha a linha.
+# Se nenhuma data estiver nele, limpar_vendas_uk falha em vez de descartar tudo.
+FORMATO_DATA_UK = '%Y-%m-%d %H:%M:%S'
+LINHAS_AMOSTRA_UK = 1000
+# Tabelas gravadas em PASTA_AGREGADOS_UK
+AGREGACOES_UK = {'vendas_por_mes': 'Mes', 'vendas_por_pais': 'Country'}
+
+
+def carregar_vendas_uk_brutas(caminho=CAMINHO_CSV_UK, colunas=None):
+    """Lê o CSV original (encoding latin1) já com os tipos compactos de TIPOS_UK."""
+    tipos = {coluna: tipo for coluna, tipo in TIPOS_UK.items() if colunas is None or coluna in colunas}
+    return pd.read_csv(caminho, encoding='latin1', usecols=colunas, dtype=tipos)
+
+
+def limpar_vendas_uk(df_uk):
+    """
+    Converte InvoiceDate, descarta datas inválidas e transações com Quantity ou
+    Price não positivos e cria TotalPrice e Mes. Levanta ValueError se nenhuma
+    data estiver no formato FORMATO_DATA_UK (o CSV usa outro formato).
+    """
+    datas = pd.to_datetime(df_uk['InvoiceDate'], format=FORMATO_DATA_UK, errors='coerce')
+    preenchidas = df_uk['InvoiceDate'].dropna()
+    if len(preenchidas) and datas.notna().sum() == 0:
+        raise ValueError(f"Nenhuma data de InvoiceDate está no formato '{FORMATO_DATA_UK}' "
+                         f"(ex.: {str(preenchidas.iloc[0])!r}). Ajuste FORMATO_DATA_UK em preparacao_ecommerce.py.")
+    validas = (datas.notna() & (df_uk['Quantity'] > 0) & (df_uk['Price'] > 0)).to_numpy()
+    df_limpo = df_uk[validas].assign(InvoiceDate=datas[validas])
+    df_limpo['TotalPrice'] = (df_limpo['Quantity'] * df_limpo['Price']).astype('float32')
+    df_limpo['Mes'] = df_limpo['InvoiceDate'].dt.month.astype('int8')
+    return df_limpo.reset_index(drop=True)
+
+
+def sortear_amostra_uk(df_uk):
+    """Amostra fixa (semente 42) das transações brutas exibida na aba 3."""
+    return df_uk.sample(min(LINHAS_AMOSTRA_UK, len(df_uk)), random_state=42).sort_index()
+
+
+def calcular_agregados_uk(df_limpo):
+    """Soma TotalPrice por mês e por país (em float64, como nos agregados do Walmart)."""
+    total = df_limpo['TotalPrice'].astype('float64')
+    agregados = {
+        nome: total.groupby(df_limpo[chave], observed=True).sum().reset_index()
+        for nome, chave in AGREGACOES_UK.items()
+    }
+    # Países como texto: a tabela pequena não precisa carregar as categorias de todo o CSV
+    agregados['vendas_por_pais'] = (agregados['vendas_por_pais'].astype({'Country': str})
+                                    .sort_values('TotalPrice', ascending=False).reset_index(drop=True))
+    return agregados
+
+
+def preparar_ecommerce(caminho_csv=CAMINHO_CSV_UK, caminho_saida=CAMINHO_PARQUET_UK, pasta_agregados=PASTA_AGREGADOS_UK):
+    """Executa a preparação completa e grava os dados limpos e os agregados. Devolve o dataframe limpo."""
+    df_uk = carregar_vendas_uk_brutas(caminho_csv)
+    print(f"[MEMÓRIA] CSV lido: {memoria_mb(df_uk):,.2f} MB ({len(df_uk)} linhas)")
+    amostra = sortear_amostra_uk(df_uk)
+
+    df_limpo = limpar_vendas_uk(df_uk)
+    del df_uk
+    print(f"[MEMÓRIA] Dados limpos: {memoria_mb(df_limpo):,.2f} MB ({len(df_limpo)} linhas)")
+
+    caminho_saida = Path(caminho_saida)
+    caminho_saida.parent.mkdir(parents=True, exist_ok=True)
+    df_limpo.to_parquet(caminho_saida, index=False, engine='pyarrow', compression='zstd')
+
+    # A amostra é gravada com as categorias já reduzidas às linhas sorteadas
+    amostra = amostra.apply(lambda coluna: coluna.cat.remove_unused_categories()
+                            if isinstance(coluna.dtype, pd.CategoricalDtype) else coluna)
+    salvar_agregados({**calcular_agregados_uk(df_limpo), 'amostra': amostra.reset_index(drop=True)},
+                     pasta_agregados)
+    return df_limpo
+
+
+def saidas_atualizadas(caminho_csv=CAMINHO_CSV_UK, caminho_saida=CAMINHO_PARQUET_UK, pasta_agregados=PASTA_AGREGADOS_UK):
+    """True se os dados limpos e os agregados existem e são mais novos que o CSV."""
+    saidas = [Path(caminho_saida), *(Path(pasta_agregados) / f'{nome}.parquet'
+                                     for nome in (*AGREGACOES_UK, 'amostra'))]
+    if not all(saida.exists() for saida in saidas):
+        return False
+    return min(saida.stat().st_mtime for saida in saidas) >= Path(caminho_csv).stat().st_mtime
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preparação offline dos dados do E-commerce UK para o dashboard.")
+    parser.add_argument('--csv', default=str(CAMINHO_CSV_UK))
+    parser.add_argument('--forcar', action='store_true', help="Refaz a preparação mesmo se o CSV não mudou.")
+    args = parser.parse_args()
+
+    print("--- Iniciando a preparação dos dados do E-commerce UK ---")
+    try:
+        if not args.forcar and saidas_atualizadas(args.csv):
+            print("✅ Dados do E-commerce já preparados e mais novos que o CSV. Nada a fazer.")
+            return
+        df_limpo = preparar_ecommerce(args.csv)
+    except FileNotFoundError as e:
+        print("❌ ERRO: Arquivo não encontrado. Coloque o 'online_retail_II.csv' na pasta 'data'.")
+        print(f"   Detalhe do erro: {e}")
+        exit()
+    except ValueError as e:
+        print(f"❌ ERRO: {e}")
+        exit()
+
+    print(f"✅ {len(df_limpo)} transações limpas salvas em: {CAMINHO_PARQUET_UK}")
+    print(f"✅ Tabelas agregadas para o dashboard salvas em: {PASTA_AGREGADOS_UK}")
+
+
+if __name__ == '__main__':
+    main()
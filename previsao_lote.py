@@ -0,0 +1,232 @@
+# ==============================================================================
+# previsao_lote.py
+# Previsão em lote: todas as combinações loja x departamento x semana de uma vez
+# ==============================================================================
+
+# O simulador do app.py prevê uma única linha por clique. Este módulo monta a
+# matriz de features da grade inteira de forma vetorizada (merge com lojas e
+# features, mesmas regras do script 01) e chama o modelo em blocos grandes.
+#
+# Exemplos de uso:
+#     python previsao_lote.py                                  # grade do sampleSubmission
+#     python previsao_lote.py --semanas 8 --csv                # próximas 8 semanas
+#     python previsao_lote.py --n-jobs 8 --tamanho-bloco 200000
+#
+# Com features de vendas, grades além da semana seguinte ao histórico são
+# previstas de forma recursiva (cada semana usa as previsões das anteriores).
+#
+# Com uma floresta (compacta, .joblib ou registro por segmento), a saída também
+# traz P10, P50 e P90: os quantis das previsões das árvores (intervalos_previsao.py).
+
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from esquema_dados import TIPOS_CSV_WALMART, carregar_dados_processados
+from modelo_compacto import carregar_modelo
+from calendario import features_calendario
+from intervalos_previsao import QUANTIS_PADRAO, prever_com_intervalos, suporta_intervalos
+from features_vendas import (
+    calcular_features_vendas, carregar_historico_vendas, prever_recursivo, usa_features_vendas, verificar_horizonte,
+)
+from pipeline_preparacao import (
+    CAMINHO_FEATURES, CAMINHO_HISTORICO_VENDAS, CAMINHO_LOJAS, CAMINHO_MEDIANAS, carregar_medianas,
+    preparar_dados,
+)
+
+CAMINHO_GRADE_SUBMISSAO = Path('data/sampleSubmission.csv/sampleSubmission.csv')
+CAMINHO_PREVISOES_LOTE = Path('data/previsoes_lote.parquet')
+
+# Linhas enviadas ao modelo por chamada de predict()
+TAMANHO_BLOCO_PADRAO = 100_000
+
+
+def grade_da_submissao(caminho=CAMINHO_GRADE_SUBMISSAO):
+    """Lê uma grade no formato do Kaggle (Id = 'Loja_Depto_Data') e separa as colunas."""
+    df_grade = pd.read_csv(caminho, usecols=['Id'])
+    partes = df_grade['Id'].str.split('_', n=2, expand=True)
+    df_grade['Store'] = partes[0].astype('int64')
+    df_grade['Dept'] = partes[1].astype('int64')
+    df_grade['Date'] = pd.to_datetime(partes[2])
+    return df_grade
+
+
+def grade_proximas_semanas(num_semanas, df_historico=None):
+    """
+    Monta a grade de todos os pares (Store, Dept) já vistos no histórico para as
+    'num_semanas' semanas seguintes à última data disponível.
+    """
+    if df_historico is None:
+        df_historico = carregar_dados_processados(['Store', 'Dept', 'Ano', 'Mes', 'Dia'])
+    pares = df_historico[['Store', 'Dept']].drop_duplicates().sort_values(['Store', 'Dept'])
+    ultima_data = pd.to_datetime(dict(year=df_historico['Ano'], month=df_historico['Mes'],
+                                      day=df_historico['Dia'])).max()
+    datas = pd.date_range(ultima_data + pd.Timedelta(weeks=1), periods=num_semanas, freq='7D')
+
+    # Produto cartesiano pares x datas sem laços em Python
+    df_grade = pd.DataFrame({
+        'Store': np.repeat(pares['Store'].to_numpy(), len(datas)),
+        'Dept': np.repeat(pares['Dept'].to_numpy(), len(datas)),
+        'Date': np.tile(datas.to_numpy(), len(pares)),
+    })
+    df_grade['Id'] = (df_grade['Store'].astype(str) + '_' + df_grade['Dept'].astype(str)
+                      + '_' + df_grade['Date'].dt.strftime('%Y-%m-%d'))
+    return df_grade
+
+
+def montar_matriz_features(df_grade, colunas_modelo, caminho_lojas=CAMINHO_LOJAS,
+                           caminho_features=CAMINHO_FEATURES, caminho_medianas=CAMINHO_MEDIANAS):
+    """
+    Aplica à grade as mesmas etapas do pipeline de preparação e devolve
+    (chaves, X): as colunas de identificação e a matriz na ordem do modelo.
+
+    Se o modelo usa as features de histórico de vendas, elas ficam vazias (NaN):
+    dependem das previsões das semanas anteriores e são preenchidas semana a
+    semana por prever_grade.
+    """
+    df_stores = pd.read_csv(caminho_lojas, dtype=TIPOS_CSV_WALMART)
+    df_features = pd.read_csv(caminho_features, parse_dates=['Date'], dtype=TIPOS_CSV_WALMART)
+    medianas = carregar_medianas(df_features, caminho_medianas)
+
+    # 'Date' é mantida em uma coluna auxiliar porque o pipeline a substitui por Ano/Mes/Dia
+    df_grade = df_grade.assign(Data_Previsao=df_grade['Date'])
+    df_processado = preparar_dados(df_grade, df_stores, df_features, medianas)
+
+    chaves = df_processado[['Id', 'Store', 'Dept', 'Data_Previsao']].rename(columns={'Data_Previsao': 'Date'})
+    X = df_processado.reindex(columns=list(colunas_modelo))
+    return chaves.reset_index(drop=True), X.reset_index(drop=True)
+
+
+def montar_features_consultas(df_consultas, indice_lojas, colunas_modelo, df_historico=None):
+    """
+    Matriz de features (na ordem do modelo) para consultas no formato do
+    simulador: Store, Dept, Date, IsHoliday e Temperature por linha.
+
+    As features exógenas vêm do índice de lojas, sem ler os CSVs; as de
+    histórico de vendas, do recorte salvo pelo script 01 (se o modelo as usa).
+    """
+    datas = pd.to_datetime(df_consultas['Date']).reset_index(drop=True)
+    df_features = pd.DataFrame({
+        'Store': df_consultas['Store'].to_numpy(), 'Dept': df_consultas['Dept'].to_numpy(),
+        'IsHoliday': df_consultas['IsHoliday'].to_numpy(), 'Temperature': df_consultas['Temperature'].to_numpy(),
+    })
+    # Mesma dimensão de datas do script 01 (calendário e feriados buscados pela chave da data)
+    df_features = df_features.join(features_calendario(datas))
+    df_features = df_features.join(indice_lojas.consultar_lote(df_features['Store'], datas))
+    if usa_features_vendas(colunas_modelo):
+        if df_historico is None:
+            raise FileNotFoundError(CAMINHO_HISTORICO_VENDAS)
+        # Além de uma semana do histórico os lags não existem: a consulta é recusada
+        verificar_horizonte(df_historico, datas)
+        df_features = df_features.join(calcular_features_vendas(df_historico, df_features))
+    return df_features[list(colunas_modelo)]
+
+
+def prever_em_blocos(modelo, X, tamanho_bloco=TAMANHO_BLOCO_PADRAO, n_jobs=-1):
+    """Chama modelo.predict em blocos de 'tamanho_bloco' linhas, usando 'n_jobs' núcleos."""
+    if hasattr(modelo, 'n_jobs'):
+        modelo.set_params(n_jobs=n_jobs)
+    previsoes = np.empty(len(X), dtype=np.float64)
+    for inicio in range(0, len(X), tamanho_bloco):
+        fim = inicio + tamanho_bloco
+        previsoes[inicio:fim] = modelo.predict(X.iloc[inicio:fim])
+    return previsoes
+
+
+def prever_intervalos_em_blocos(modelo, X, tamanho_bloco=TAMANHO_BLOCO_PADRAO, n_jobs=-1):
+    """
+    Weekly_Sales e P10/P50/P90 em blocos de 'tamanho_bloco' linhas: cada bloco
+    tem uma única matriz linhas x árvores, da qual saem a média e os quantis.
+    """
+    if hasattr(modelo, 'n_jobs'):
+        modelo.set_params(n_jobs=n_jobs)
+    return pd.concat([prever_com_intervalos(modelo, X.iloc[inicio:inicio + tamanho_bloco])
+                      for inicio in range(0, len(X), tamanho_bloco)])
+
+
+def prever_grade(modelo, df_grade, tamanho_bloco=TAMANHO_BLOCO_PADRAO, n_jobs=-1, intervalos=False,
+                 caminho_historico=CAMINHO_HISTORICO_VENDAS):
+    """
+    Monta as features da grade e devolve um dataframe com Id, Store, Dept, Date e
+    Weekly_Sales (e P10, P50 e P90, com 'intervalos').
+
+    Se o modelo usa as features de vendas, a grade é prevista semana a semana
+    (prever_recursivo): as previsões de cada semana viram o histórico das
+    seguintes, a partir do recorte salvo pelo script 01 (--features-vendas).
+    """
+    chaves, X = montar_matriz_features(df_grade, modelo.feature_names_in_)
+
+    def prever(X_parte):
+        if intervalos:
+            return prever_intervalos_em_blocos(modelo, X_parte, tamanho_bloco, n_jobs)
+        return prever_em_blocos(modelo, X_parte, tamanho_bloco, n_jobs)
+
+    if usa_features_vendas(modelo.feature_names_in_):
+        df_historico = carregar_historico_vendas(caminho_historico)
+        if df_historico is None:
+            raise FileNotFoundError(caminho_historico)
+        return chaves.join(prever_recursivo(prever, X, df_historico))
+    if intervalos:
+        return chaves.join(prever(X))
+    chaves['Weekly_Sales'] = prever(X)
+    return chaves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Previsão de vendas em lote para grades loja x departamento x semana.")
+    parser.add_argument('--grade', default=str(CAMINHO_GRADE_SUBMISSAO),
+                        help="CSV com a coluna Id no formato 'Loja_Depto_AAAA-MM-DD'.")
+    parser.add_argument('--semanas', type=int,
+                        help="Em vez de --grade, prevê todos os pares (Store, Dept) para as próximas N semanas.")
+    parser.add_argument('--modelo', help="Pasta ou arquivo do modelo (padrão: FORECAST_MODELO ou o modelo ativo, ver localizar_modelo).")
+    parser.add_argument('--saida', default=str(CAMINHO_PREVISOES_LOTE))
+    parser.add_argument('--csv', action='store_true',
+                        help="Também salva um CSV no formato de submissão (Id, Weekly_Sales).")
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO_PADRAO)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--sem-intervalos', action='store_true',
+                        help="Não calcula as colunas P10/P50/P90 (quantis das previsões das árvores).")
+    args = parser.parse_args()
+
+    print("--- Iniciando a previsão em lote ---")
+    try:
+        modelo = carregar_modelo(args.modelo)
+        df_grade = grade_proximas_semanas(args.semanas) if args.semanas else grade_da_submissao(args.grade)
+    except FileNotFoundError as e:
+        print("❌ ERRO: Arquivo não encontrado. Execute os scripts 01 e 02 primeiro.")
+        print(f"   Detalhe do erro: {e}")
+        exit()
+    print(f"[INFO] Grade com {len(df_grade)} combinações loja x departamento x semana.")
+
+    intervalos = not args.sem_intervalos and suporta_intervalos(modelo)
+    if not args.sem_intervalos and not intervalos:
+        print(f"[INFO] O modelo {type(modelo).__name__} não tem previsões por árvore: saída sem P10/P50/P90.")
+
+    try:
+        df_previsoes = prever_grade(modelo, df_grade, args.tamanho_bloco, args.n_jobs, intervalos)
+    except FileNotFoundError as e:
+        print("❌ ERRO: Arquivo não encontrado. Execute os scripts 01 (com --features-vendas, se o modelo usa "
+              "o histórico de vendas) e 02 primeiro.")
+        print(f"   Detalhe do erro: {e}")
+        exit()
+    except ValueError as e:
+        print(f"❌ ERRO: {e}")
+        exit()
+    if len(df_previsoes) < len(df_grade):
+        print(f"⚠️ {len(df_grade) - len(df_previsoes)} linhas sem features externas para a data foram ignoradas.")
+
+    caminho_saida = Path(args.saida)
+    caminho_saida.parent.mkdir(parents=True, exist_ok=True)
+    df_previsoes.to_parquet(caminho_saida, index=False, engine='pyarrow')
+    print(f"✅ {len(df_previsoes)} previsões salvas em: {caminho_saida}")
+    if intervalos:
+        print(f"[INFO] Colunas {', '.join(QUANTIS_PADRAO)} com os quantis das previsões das árvores.")
+
+    if args.csv:
+        caminho_csv = caminho_saida.with_suffix('.csv')
+        df_previsoes[['Id', 'Weekly_Sales']].to_csv(caminho_csv, index=False)
+        print(f"✅ Arquivo de submissão salvo em: {caminho_csv}")
+
+
+if __name__ == '__main__':
+    main()
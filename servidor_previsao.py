@@ -0,0 +1,348 @@
+# ==============================================================================
+# servidor_previsao.py
+# Servidor HTTP/JSON de previsões, com micro-lotes e pool de processos
+# ==============================================================================
+
+# Acesso programático ao modelo (ex.: sistema de reposição), sem passar pelo
+# dashboard. O servidor é assíncrono (asyncio, só biblioteca padrão):
+#
+#     POST /prever     {"Store": 1, "Dept": 1, "Date": "2012-11-02"}  (ou uma
+#                      lista desses objetos, ou {"linhas": [...]}). IsHoliday
+#                      (padrão false) e Temperature (padrão 70 °F) são opcionais.
+#                      Resposta: {"previsoes": [...], "versao_modelo": "..."}
+#     GET  /saude      situação e versão do modelo
+#     GET  /metricas   pedidos, tamanho médio dos lotes e latência p50/p99
+#
+# Pedidos que chegam juntos são reunidos em um micro-lote (até --max-lote linhas
+# ou --espera-ms milissegundos) e previstos com uma única chamada vetorizada de
+# predict. Os lotes rodam em um pool de processos: cada processo carrega o
+# modelo uma vez e monta as features a partir do índice de lojas, sem ler os
+# CSVs. Sem --modelo ou FORECAST_MODELO, o servidor usa a floresta compacta do
+# modelo ativo, aberta com memory-mapping: as páginas são compartilhadas entre
+# os processos em vez de cada um desserializar o seu .joblib.
+#
+# Exemplos:
+#     python servidor_previsao.py                           # 127.0.0.1:8000
+#     python servidor_previsao.py --porta 8080 --processos 4 --max-lote 2048
+#     curl -X POST localhost:8000/prever -d '[{"Store": 1, "Dept": 1, "Date": "2012-11-02"}]'
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from features_vendas import carregar_historico_vendas, usa_features_vendas, verificar_horizonte
+from indice_lojas import IndiceLojas
+from modelo_compacto import carregar_modelo, colunas_do_modelo, localizar_modelo, versao_modelo
+from pipeline_preparacao import CAMINHO_HISTORICO_VENDAS
+from previsao_lote import montar_features_consultas
+
+HOST_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8000
+# Linhas por micro-lote e tempo máximo que o primeiro pedido espera por outros
+MAX_LOTE_PADRAO = 4096
+ESPERA_LOTE_MS_PADRAO = 5
+# Valores usados quando a consulta não informa o campo (os mesmos do simulador)
+TEMPERATURA_PADRAO = 70.0
+CAMPOS_OBRIGATORIOS = ('Store', 'Dept', 'Date')
+# Latências guardadas para os percentis (as mais recentes)
+AMOSTRAS_LATENCIA = 10_000
+
+# Maior corpo aceito por pedido (um lote de MAX_LOTE_PADRAO linhas tem poucas centenas de KB)
+MAX_CORPO_BYTES = 8 * 1024**2
+
+MOTIVOS_HTTP = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                500: 'Internal Server Error'}
+
+
+def ler_consultas(corpo, lojas_validas, historico=None):
+    """
+    Converte o JSON do pedido em um dataframe de consultas (Store, Dept, Date,
+    IsHoliday, Temperature). Com 'historico' (modelos com features de vendas),
+    datas além do horizonte das features são recusadas.
+    """
+    dados = json.loads(corpo)
+    if isinstance(dados, dict):
+        dados = dados['linhas'] if 'linhas' in dados else [dados]
+    if not isinstance(dados, list) or not dados or not all(isinstance(linha, dict) for linha in dados):
+        raise ValueError("Envie um objeto ou uma lista de objetos com Store, Dept e Date.")
+
+    df = pd.DataFrame(dados)
+    faltando = [campo for campo in CAMPOS_OBRIGATORIOS if campo not in df or df[campo].isna().any()]
+    if faltando:
+        raise ValueError(f"Campos obrigatórios ausentes: {', '.join(faltando)}.")
+    consultas = pd.DataFrame({
+        'Store': df['Store'].astype('int64'),
+        'Dept': df['Dept'].astype('int64'),
+        'Date': pd.to_datetime(df['Date']),
+        'IsHoliday': df['IsHoliday'].fillna(False).astype(bool) if 'IsHoliday' in df else False,
+        'Temperature': df['Temperature'].fillna(TEMPERATURA_PADRAO).astype('float64')
+        if 'Temperature' in df else TEMPERATURA_PADRAO,
+    })
+    desconhecidas = sorted(set(consultas['Store']) - lojas_validas)
+    if desconhecidas:
+        raise ValueError(f"Lojas desconhecidas: {desconhecidas}.")
+    if historico is not None:
+        verificar_horizonte(historico, consultas['Date'])
+    return consultas
+
+
+# ==============================================================================
+# Processos de previsão
+# ==============================================================================
+
+_ESTADO_PROCESSO = {}
+
+
+def _iniciar_processo(caminho_modelo):
+    """Inicializador de cada processo: carrega modelo, índice e histórico uma única vez."""
+    modelo = carregar_modelo(caminho_modelo)
+    if hasattr(modelo, 'n_jobs'):
+        # O paralelismo é entre processos
+        modelo.set_params(n_jobs=1)
+    _ESTADO_PROCESSO['modelo'] = modelo
+    _ESTADO_PROCESSO['indice'] = IndiceLojas.carregar()
+    _ESTADO_PROCESSO['historico'] = (carregar_historico_vendas(CAMINHO_HISTORICO_VENDAS)
+                                     if usa_features_vendas(modelo.feature_names_in_) else None)
+
+
+def _prever_lote(consultas):
+    """Monta as features de um micro-lote e faz uma única chamada de predict."""
+    modelo = _ESTADO_PROCESSO['modelo']
+    X = montar_features_consultas(consultas, _ESTADO_PROCESSO['indice'], modelo.feature_names_in_,
+                                  _ESTADO_PROCESSO['historico'])
+    return np.asarray(modelo.predict(X), dtype=np.float64)
+
+
+# ==============================================================================
+# Servidor
+# ==============================================================================
+
+class ServidorPrevisao:
+    """Recebe pedidos HTTP, agrupa as consultas em micro-lotes e os envia ao pool."""
+
+    def __init__(self, caminho_modelo=None, processos=None, max_lote=MAX_LOTE_PADRAO,
+                 espera_ms=ESPERA_LOTE_MS_PADRAO):
+        # Resolvido uma vez aqui, para todos os processos abrirem o mesmo artefato
+        self.caminho_modelo = caminho_modelo or localizar_modelo(lotes_pequenos=True)
+        self.versao_modelo = versao_modelo(self.caminho_modelo)
+        self.processos = processos or os.cpu_count()
+        self.max_lote = max_lote
+        self.espera_s = espera_ms / 1000
+        self.lojas_validas = set(IndiceLojas.carregar().lojas)
+        # O modelo só é carregado nos processos de previsão; aqui bastam os nomes das
+        # features (lidos dos metadados) para saber se o histórico é necessário.
+        # Da história, só a última semana é guardada (para recusar datas além do horizonte)
+        self.historico = None
+        if usa_features_vendas(colunas_do_modelo(self.caminho_modelo)):
+            historico = carregar_historico_vendas(CAMINHO_HISTORICO_VENDAS)
+            if historico is None:
+                raise FileNotFoundError(CAMINHO_HISTORICO_VENDAS)
+            self.historico = historico.nlargest(1, 'Date')[['Date']]
+
+        self.pedidos = 0
+        self.linhas = 0
+        self.erros = 0
+        self.tamanhos_lote = deque(maxlen=AMOSTRAS_LATENCIA)
+        self.latencias = deque(maxlen=AMOSTRAS_LATENCIA)
+        self._fila = None
+        self._vagas = None
+        self._tarefas = set()
+        self._executor = None
+
+    # --- Micro-lotes -----------------------------------------------------------
+
+    async def _agrupar(self):
+        """Junta os pedidos da fila até encher o lote ou acabar o prazo do primeiro."""
+        laco = asyncio.get_running_loop()
+        while True:
+            pedidos = [await self._fila.get()]
+            linhas = len(pedidos[0][0])
+            prazo = laco.time() + self.espera_s
+            while linhas < self.max_lote:
+                restante = prazo - laco.time()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = await asyncio.wait_for(self._fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                pedidos.append(pedido)
+                linhas += len(pedido[0])
+            # No máximo um lote em execução por processo; os demais pedidos esperam na fila
+            await self._vagas.acquire()
+            tarefa = asyncio.create_task(self._executar(pedidos))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _executar(self, pedidos):
+        try:
+            consultas = pd.concat([consultas for consultas, _ in pedidos], ignore_index=True)
+            try:
+                previsoes = await asyncio.get_running_loop().run_in_executor(self._executor, _prever_lote, consultas)
+            except Exception as e:
+                for _, futuro in pedidos:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                return
+            self.tamanhos_lote.append(len(consultas))
+            inicio = 0
+            for consultas_pedido, futuro in pedidos:
+                fim = inicio + len(consultas_pedido)
+                if not futuro.done():
+                    futuro.set_result(previsoes[inicio:fim])
+                inicio = fim
+        finally:
+            self._vagas.release()
+
+    async def prever(self, consultas):
+        """Coloca as consultas na fila do próximo micro-lote e espera as previsões."""
+        futuro = asyncio.get_running_loop().create_future()
+        await self._fila.put((consultas, futuro))
+        return await futuro
+
+    # --- HTTP ------------------------------------------------------------------
+
+    def metricas(self):
+        latencias_ms = np.array(self.latencias) * 1000
+        return {
+            'pedidos': self.pedidos,
+            'linhas': self.linhas,
+            'erros': self.erros,
+            'lotes': len(self.tamanhos_lote),
+            'linhas_por_lote_media': float(np.mean(self.tamanhos_lote)) if self.tamanhos_lote else 0.0,
+            'latencia_p50_ms': float(np.percentile(latencias_ms, 50)) if len(latencias_ms) else None,
+            'latencia_p99_ms': float(np.percentile(latencias_ms, 99)) if len(latencias_ms) else None,
+            'versao_modelo': self.versao_modelo,
+        }
+
+    async def _rotear(self, metodo, caminho, corpo):
+        if metodo == 'GET' and caminho == '/saude':
+            return 200, {'status': 'ok', 'versao_modelo': self.versao_modelo}
+        if metodo == 'GET' and caminho == '/metricas':
+            return 200, self.metricas()
+        if metodo != 'POST' or caminho != '/prever':
+            return 404, {'erro': f'Rota não encontrada: {metodo} {caminho}'}
+
+        inicio = time.perf_counter()
+        try:
+            consultas = ler_consultas(corpo, self.lojas_validas, self.historico)
+        except (ValueError, TypeError, KeyError) as e:
+            self.erros += 1
+            return 400, {'erro': str(e)}
+        try:
+            previsoes = await self.prever(consultas)
+        except Exception as e:
+            self.erros += 1
+            return 500, {'erro': f'{type(e).__name__}: {e}'}
+        self.pedidos += 1
+        self.linhas += len(consultas)
+        self.latencias.append(time.perf_counter() - inicio)
+        return 200, {'previsoes': previsoes.tolist(), 'versao_modelo': self.versao_modelo}
+
+    @staticmethod
+    async def _responder(escritor, status, resposta, manter):
+        dados = json.dumps(resposta, ensure_ascii=False).encode('utf-8')
+        escritor.write(
+            f'HTTP/1.1 {status} {MOTIVOS_HTTP[status]}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(dados)}\r\n'
+            f'Connection: {"keep-alive" if manter else "close"}\r\n\r\n'.encode('latin-1') + dados
+        )
+        await escritor.drain()
+
+    async def _tratar_conexao(self, leitor, escritor):
+        """HTTP/1.1 mínimo: uma requisição por vez, com keep-alive."""
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                partes = linha.decode('latin-1').split(' ', 2)
+                if len(partes) != 3:
+                    self.erros += 1
+                    await self._responder(escritor, 400, {'erro': 'Linha de requisição inválida.'}, False)
+                    break
+                metodo, caminho, _ = partes
+                cabecalhos = {}
+                while True:
+                    linha = await leitor.readline()
+                    if linha in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = linha.decode('latin-1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                tamanho = cabecalhos.get('content-length', '0')
+                if not tamanho.isdigit():
+                    # Sem saber onde o corpo termina, a conexão não pode continuar
+                    self.erros += 1
+                    await self._responder(escritor, 400, {'erro': f'Content-Length inválido: {tamanho!r}'}, False)
+                    break
+                if int(tamanho) > MAX_CORPO_BYTES:
+                    # Recusado antes de ler: o corpo não chega a ser guardado em memória
+                    self.erros += 1
+                    await self._responder(escritor, 413, {'erro': f'Corpo maior que {MAX_CORPO_BYTES} bytes.'}, False)
+                    break
+                corpo = await leitor.readexactly(int(tamanho))
+
+                status, resposta = await self._rotear(metodo, caminho.split('?')[0], corpo)
+                manter = cabecalhos.get('connection', '').lower() != 'close'
+                await self._responder(escritor, status, resposta, manter)
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Conexão encerrada pelo cliente ou linha longa demais para o buffer do leitor
+            pass
+        finally:
+            escritor.close()
+
+    async def executar(self, host=HOST_PADRAO, porta=PORTA_PADRAO):
+        self._fila = asyncio.Queue()
+        self._vagas = asyncio.Semaphore(self.processos)
+        self._executor = ProcessPoolExecutor(max_workers=self.processos, initializer=_iniciar_processo,
+                                             initargs=(self.caminho_modelo,))
+        agrupador = asyncio.create_task(self._agrupar())
+        servidor = await asyncio.start_server(self._tratar_conexao, host, porta)
+        print(f"✅ Servidor de previsão em http://{host}:{porta} ({self.processos} processos, "
+              f"lotes de até {self.max_lote} linhas / {self.espera_s * 1000:.0f} ms)")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            agrupador.cancel()
+            self._executor.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON de previsão de vendas com micro-lotes.")
+    parser.add_argument('--host', default=HOST_PADRAO)
+    parser.add_argument('--porta', type=int, default=PORTA_PADRAO)
+    parser.add_argument('--modelo', help="Pasta ou arquivo do modelo (padrão: FORECAST_MODELO ou a floresta "
+                                         "compacta do modelo ativo, ver localizar_modelo).")
+    parser.add_argument('--processos', type=int, help="Processos de previsão (padrão: todos os núcleos).")
+    parser.add_argument('--max-lote', type=int, default=MAX_LOTE_PADRAO, help="Linhas por micro-lote.")
+    parser.add_argument('--espera-ms', type=float, default=ESPERA_LOTE_MS_PADRAO,
+                        help="Tempo máximo que um pedido espera por outros para formar o lote.")
+    args = parser.parse_args()
+
+    print("--- Iniciando o servidor de previsão ---")
+    try:
+        servidor = ServidorPrevisao(args.modelo, args.processos, args.max_lote, args.espera_ms)
+    except FileNotFoundError as e:
+        print("❌ ERRO: Arquivo não encontrado. Execute os scripts 01 e 02 primeiro.")
+        print(f"   Detalhe do erro: {e}")
+        exit()
+
+    try:
+        asyncio.run(servidor.executar(args.host, args.porta))
+    except KeyboardInterrupt:
+        print(f"\n[INFO] Servidor encerrado. Métricas: {json.dumps(servidor.metricas())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# ==============================================================================
+# simulacao_cenarios.py
+# Cenários "e se" do simulador: uma grade de valores prevista em uma só chamada
+# ==============================================================================
+
+# O simulador prevê um ponto por clique (uma temperatura, feriado ou não). Para
+# ver a sensibilidade das vendas, o planejador quer curvas: vendas ao longo de
+# uma faixa de temperatura, feriado x semana normal, níveis de MarkDown1-5,
+# cenários de combustível/CPI, para uma loja ou para todas.
+#
+# A grade de cenários é um dicionário coluna -> valores. O produto cartesiano
+# dos valores é aplicado sobre as linhas de features base (montadas uma única
+# vez por montar_features_consultas) e a matriz resultante é prevista com um
+# único modelo.predict:
+#
+#     base (lojas)  x  cenários (Temperature 20..100, IsHoliday F/T)  ->  predict
+#
+# Exemplo:
+#     df_base = montar_features_consultas(df_consultas, indice, modelo.feature_names_in_)
+#     curvas = simular_cenarios(modelo, df_base, {'Temperature': np.linspace(20, 100, 50),
+#                                                 'IsHoliday': [False, True]})
+
+import numpy as np
+import pandas as pd
+from pipeline_preparacao import COLUNAS_MARKDOWN
+from intervalos_previsao import prever_com_intervalos
+
+# Features que podem ser alteradas nos cenários (as demais vêm da loja e da data)
+COLUNAS_CENARIO = ['Temperature', 'IsHoliday', *COLUNAS_MARKDOWN, 'Fuel_Price', 'CPI', 'Unemployment']
+# Colunas da base repetidas no resultado para identificar cada linha
+COLUNAS_IDENTIFICACAO = ['Store', 'Dept']
+PONTOS_PADRAO = 50
+# Faixa sugerida de temperatura (°F); as das demais colunas vêm do índice de lojas
+FAIXA_TEMPERATURA = (0.0, 100.0)
+
+
+def faixa_padrao(coluna, indice_lojas):
+    """Faixa (mínimo, máximo) sugerida para variar a coluna: a observada no índice de lojas."""
+    if coluna == 'Temperature':
+        return FAIXA_TEMPERATURA
+    return indice_lojas.faixa(coluna)
+
+
+def expandir_grade(grade):
+    """Produto cartesiano dos valores da grade: um dataframe com uma linha por cenário."""
+    colunas = list(grade)
+    malhas = np.meshgrid(*(np.asarray(valores) for valores in grade.values()), indexing='ij')
+    return pd.DataFrame({coluna: malha.ravel() for coluna, malha in zip(colunas, malhas)})
+
+
+def montar_matriz_cenarios(df_base, df_cenarios):
+    """
+    Repete cada linha da base uma vez por cenário e substitui as colunas da grade.
+    Devolve a matriz de features (mesmas colunas e tipos da base), com as linhas
+    agrupadas por linha da base.
+    """
+    colunas_invalidas = [coluna for coluna in df_cenarios if coluna not in df_base.columns]
+    if colunas_invalidas:
+        raise ValueError(f"Colunas de cenário que o modelo não usa: {colunas_invalidas}")
+
+    num_cenarios = len(df_cenarios)
+    X = df_base.iloc[np.repeat(np.arange(len(df_base)), num_cenarios)].reset_index(drop=True)
+    for coluna in df_cenarios:
+        X[coluna] = np.tile(df_cenarios[coluna].to_numpy(), len(df_base)).astype(X[coluna].dtype)
+    return X
+
+
+def simular_cenarios(modelo, df_base, grade, intervalos=False):
+    """
+    Prevê todas as combinações da grade para cada linha da base com uma única
+    chamada de modelo.predict. Devolve um dataframe com Store, Dept (se estão na
+    base), as colunas da grade e Weekly_Sales; com 'intervalos', também P10,
+    P50 e P90 das árvores (ver intervalos_previsao.py), no mesmo percurso.
+    """
+    df_cenarios = expandir_grade(grade)
+    X = montar_matriz_cenarios(df_base, df_cenarios)
+
+    identificacao = [coluna for coluna in COLUNAS_IDENTIFICACAO if coluna in df_base.columns]
+    df_resultado = X[identificacao + [coluna for coluna in df_cenarios if coluna not in identificacao]].copy()
+    if intervalos:
+        return df_resultado.join(prever_com_intervalos(modelo, X))
+    df_resultado['Weekly_Sales'] = modelo.predict(X)
+    return df_resultado
+
+
+def curvas_cenarios(df_resultado, coluna_x, coluna_serie=None):
+    """
+    Tabela pronta para st.line_chart: Weekly_Sales somado entre as linhas da base
+    (lojas) para cada valor de 'coluna_x', com uma coluna por valor de 'coluna_serie'.
+    """
+    if coluna_serie is None:
+        return df_resultado.groupby(coluna_x)['Weekly_Sales'].sum().to_frame()
+    return df_resultado.pivot_table(index=coluna_x, columns=coluna_serie, values='Weekly_Sales', aggfunc='sum')
@@ -0,0 +1,98 @@
+# ==============================================================================
+# treinamento.py
+# Funções de treino compartilhadas pelo script 02 e pelas ferramentas de medição
+# ==============================================================================
+
+# O script 02 é a linha de comando do treino; as etapas que outras ferramentas
+# também precisam repetir (separar X/y, montar o modelo com os parâmetros de
+# deploy e calcular as métricas) ficam aqui, para existir uma única definição.
+
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from modelo_histograma import GradientBoostingHistograma
+
+COLUNA_ALVO = 'Weekly_Sales'
+
+# Parâmetros do modelo otimizado para deploy (Bloco 16 do script 02)
+PARAMETROS_DEPLOY = {
+    'n_estimators': 50,     # Metade das árvores padrão
+    'max_depth': 20,        # Limite de profundidade (evita ficheiros gigantes)
+    'min_samples_leaf': 5,  # Ajuda a podar e a generalizar
+    'n_jobs': -1,
+    'random_state': 42,
+}
+
+# Backends de modelo disponíveis no treino (--backend do script 02)
+BACKEND_PADRAO = 'random_forest'
+BACKENDS = {
+    'random_forest': RandomForestRegressor,
+    'hist_gradient_boosting': GradientBoostingHistograma,
+}
+PARAMETROS_BACKENDS = {
+    'random_forest': PARAMETROS_DEPLOY,
+    'hist_gradient_boosting': {
+        'max_iter': 200,
+        'learning_rate': 0.1,
+        'max_leaf_nodes': 63,
+        'min_samples_leaf': 20,
+        'early_stopping': False,
+        'random_state': 42,
+    },
+}
+
+
+def separar_features_alvo(df, coluna_alvo=COLUNA_ALVO):
+    """Separa o dataframe processado em features (X) e alvo (y)."""
+    return df.drop(coluna_alvo, axis=1), df[coluna_alvo]
+
+
+def features_float32(X):
+    """
+    Features como um único bloco float32 contíguo por linhas, ainda com os nomes
+    das colunas. O scikit-learn treina e prevê com float32, então recebe o array
+    sem a cópia de conversão que faria a partir das colunas int8/bool/float32.
+    """
+    return pd.DataFrame(np.ascontiguousarray(X.to_numpy(dtype=np.float32)), columns=X.columns, index=X.index,
+                        copy=False)
+
+
+def criar_modelo(backend=BACKEND_PADRAO, **parametros):
+    """Modelo do backend com os parâmetros de deploy; 'parametros' sobrescreve algum deles."""
+    return BACKENDS[backend](**{**PARAMETROS_BACKENDS[backend], **parametros})
+
+
+def avaliar_previsoes(y_real, y_previsto):
+    """Devolve MAE, MSE e R² em um dicionário."""
+    return {
+        'mae': float(mean_absolute_error(y_real, y_previsto)),
+        'mse': float(mean_squared_error(y_real, y_previsto)),
+        'r2': float(r2_score(y_real, y_previsto)),
+    }
+
+
+def gravar_dados_compartilhados(df, pasta, coluna_alvo=COLUNA_ALVO):
+    """
+    Grava X (float32 contíguo) e y em .npy, para serem abertos por memory-mapping
+    em vários processos sem que cada um receba uma cópia dos dados.
+    """
+    pasta = Path(pasta)
+    X, y = separar_features_alvo(df, coluna_alvo)
+    np.save(pasta / 'X.npy', np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+    np.save(pasta / 'y.npy', y.to_numpy(dtype=np.float32))
+    (pasta / 'colunas.json').write_text(json.dumps(list(X.columns)), encoding='utf-8')
+    return pasta
+
+
+def abrir_dados_compartilhados(pasta):
+    """Abre os arrays gravados por 'gravar_dados_compartilhados' (somente leitura, sem cópia)."""
+    pasta = Path(pasta)
+    return {
+        'X': np.load(pasta / 'X.npy', mmap_mode='r'),
+        'y': np.load(pasta / 'y.npy', mmap_mode='r'),
+        'colunas': json.loads((pasta / 'colunas.json').read_text(encoding='utf-8')),
+    }
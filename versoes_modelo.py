@@ -0,0 +1,174 @@
+# ==============================================================================
+# versoes_modelo.py
+# Versões do modelo, marca d'água dos dados treinados e retreino incremental
+# ==============================================================================
+
+# Cada treino (completo ou incremental) grava uma versão numerada:
+#
+#     models/versoes/v001/modelo.joblib
+#     models/versoes/v001/metadados.json   origem, data, marca d'água, árvores, métricas
+#
+# No treino completo, as métricas são as do conjunto de teste do script 02; no
+# incremental, ficam em 'metricas_versao_anterior_semanas_novas' (ver abaixo).
+#
+# A marca d'água é a última semana de vendas que o modelo já viu. No retreino
+# incremental, só as semanas posteriores a ela são novidade: a floresta recebe
+# algumas árvores novas (warm_start), treinadas com uma janela recente que
+# inclui essas semanas, e as árvores mais antigas podem ser descartadas para
+# manter o tamanho do modelo. Antes do retreino, o modelo anterior é avaliado
+# nas semanas novas, que ele ainda não viu: é o erro real de previsão da versão.
+#
+# O modelo usado pelo app, pela previsão em lote e pelo servidor é o apontado
+# por models/versoes/ativo.json (caminho do artefato, da sua floresta compacta
+# e versão). Só o treino completo troca o ponteiro: o retreino atualiza o
+# .joblib e a compacta mas mantém, por exemplo, o registro por segmento como ativo.
+
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import pandas as pd
+
+from esquema_dados import CAMINHO_MODELO_ATIVO, CAMINHO_MODELO_COMPACTO_WALMART, CAMINHO_MODELO_WALMART
+from features_vendas import datas_das_linhas
+from modelo_compacto import exportar_floresta
+from treinamento import BACKENDS, avaliar_previsoes, features_float32, separar_features_alvo
+
+PASTA_VERSOES = Path('models/versoes')
+# Versões mais antigas que isso são apagadas ao registrar uma nova
+VERSOES_MANTIDAS = 5
+# Padrões do retreino incremental
+NOVAS_ARVORES_PADRAO = 10
+JANELA_RETREINO_SEMANAS = 13
+
+
+def listar_versoes(pasta=PASTA_VERSOES):
+    """Pastas das versões completas (com metadados), da mais antiga para a mais recente."""
+    pasta = Path(pasta)
+    if not pasta.exists():
+        return []
+    return sorted(p for p in pasta.glob('v[0-9]*') if (p / 'metadados.json').exists())
+
+
+def ler_metadados(pasta_versao):
+    return json.loads((Path(pasta_versao) / 'metadados.json').read_text(encoding='utf-8'))
+
+
+def ultima_versao(pasta=PASTA_VERSOES):
+    """Pasta da versão mais recente, ou None se nenhuma foi registrada."""
+    versoes = listar_versoes(pasta)
+    return versoes[-1] if versoes else None
+
+
+def backend_do_modelo(modelo):
+    """Nome do backend (chave de treinamento.BACKENDS) de um modelo treinado."""
+    return next(nome for nome, classe in BACKENDS.items() if isinstance(modelo, classe))
+
+
+def registrar_versao(modelo, marca_dagua, origem, metricas=None, pasta=PASTA_VERSOES, manter=VERSOES_MANTIDAS,
+                     **extras):
+    """Grava o modelo e seus metadados como uma nova versão e apaga as mais antigas."""
+    pasta = Path(pasta)
+    versoes = listar_versoes(pasta)
+    numero = int(versoes[-1].name[1:]) + 1 if versoes else 1
+    pasta_versao = pasta / f'v{numero:03d}'
+    pasta_versao.mkdir(parents=True)
+
+    joblib.dump(modelo, pasta_versao / 'modelo.joblib')
+    metadados = {
+        'versao': numero,
+        'origem': origem,
+        'data_treino': datetime.now().isoformat(timespec='seconds'),
+        'marca_dagua': str(pd.Timestamp(marca_dagua).date()),
+        'backend': backend_do_modelo(modelo),
+        # Árvores da floresta ou iterações do gradient boosting
+        'n_estimators': len(modelo.estimators_) if hasattr(modelo, 'estimators_') else int(modelo.n_iter_),
+        'metricas': metricas or {},
+        **extras,
+    }
+    # Gravado por último: uma versão sem metadados é ignorada por listar_versoes
+    (pasta_versao / 'metadados.json').write_text(json.dumps(metadados, indent=2), encoding='utf-8')
+
+    for antiga in listar_versoes(pasta)[:-manter] if manter else []:
+        shutil.rmtree(antiga)
+    return pasta_versao
+
+
+def publicar_modelo(modelo, caminho_modelo=CAMINHO_MODELO_WALMART, pasta_compacta=CAMINHO_MODELO_COMPACTO_WALMART):
+    """Substitui os artefatos lidos pelo app e pela previsão em lote (joblib e floresta compacta)."""
+    caminho_modelo.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(modelo, caminho_modelo)
+    return exportar_floresta(modelo, pasta_compacta)
+
+
+def ativar_modelo(caminho_modelo, versao=None, caminho_compacto=None, caminho_ativo=CAMINHO_MODELO_ATIVO):
+    """
+    Aponta o modelo ativo para 'caminho_modelo' (a troca do arquivo é atômica).
+    'caminho_compacto' é a floresta compacta do mesmo modelo, usada pelos
+    consumidores de lotes pequenos (app e servidor).
+    """
+    caminho_ativo = Path(caminho_ativo)
+    caminho_ativo.parent.mkdir(parents=True, exist_ok=True)
+    ponteiro = {
+        'caminho': Path(caminho_modelo).as_posix(),
+        'caminho_compacto': Path(caminho_compacto).as_posix() if caminho_compacto is not None else None,
+        'versao': versao,
+        'ativado_em': datetime.now().isoformat(timespec='seconds'),
+    }
+    temporario = caminho_ativo.with_suffix('.tmp')
+    temporario.write_text(json.dumps(ponteiro, indent=2), encoding='utf-8')
+    temporario.replace(caminho_ativo)
+    return ponteiro
+
+
+def retreinar_incremental(modelo, df, marca_dagua, novas_arvores=NOVAS_ARVORES_PADRAO,
+                          janela_semanas=JANELA_RETREINO_SEMANAS, max_arvores=None):
+    """
+    Acrescenta 'novas_arvores' à floresta usando só os dados recentes.
+
+    As árvores novas são treinadas com as semanas posteriores à marca d'água e
+    as 'janela_semanas' semanas anteriores à última data (para não aprenderem
+    com uma única semana). Com 'max_arvores', as árvores mais antigas são
+    descartadas. Devolve (modelo, nova marca d'água, resumo) ou None se não há
+    semanas novas.
+    """
+    colunas_modelo = list(modelo.feature_names_in_)
+    if sorted(colunas_modelo) != sorted(c for c in df.columns if c != 'Weekly_Sales'):
+        raise ValueError("As colunas dos dados mudaram desde o último treino; faça um treino completo.")
+
+    datas = datas_das_linhas(df)
+    marca_dagua = pd.Timestamp(marca_dagua)
+    novas = (datas > marca_dagua).to_numpy()
+    if not novas.any():
+        return None
+
+    # Erro do modelo atual nas semanas que ele ainda não viu (fora da amostra)
+    X_novas, y_novas = separar_features_alvo(df[novas])
+    metricas_anteriores = avaliar_previsoes(y_novas, modelo.predict(X_novas[colunas_modelo]))
+
+    ultima_data = datas.max()
+    recentes = (datas > min(marca_dagua, ultima_data - pd.Timedelta(weeks=janela_semanas))).to_numpy()
+    X_recentes, y_recentes = separar_features_alvo(df[recentes])
+
+    modelo.set_params(warm_start=True, n_estimators=len(modelo.estimators_) + novas_arvores)
+    modelo.fit(features_float32(X_recentes[colunas_modelo]), y_recentes)
+    modelo.set_params(warm_start=False)
+
+    removidas = 0
+    if max_arvores and len(modelo.estimators_) > max_arvores:
+        # As árvores ficam na ordem em que foram treinadas: as primeiras são as mais antigas
+        removidas = len(modelo.estimators_) - max_arvores
+        modelo.estimators_ = modelo.estimators_[removidas:]
+        modelo.set_params(n_estimators=len(modelo.estimators_))
+
+    resumo = {
+        'semanas_novas': int(datas[novas].nunique()),
+        'linhas_novas': int(novas.sum()),
+        'linhas_treino': int(recentes.sum()),
+        'arvores_novas': novas_arvores,
+        'arvores_removidas': removidas,
+        'metricas_versao_anterior_semanas_novas': metricas_anteriores,
+    }
+    return modelo, ultima_data, resumo